@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import tweeter_senti_analysis
+from sentiment_cache import SentimentCache
+
+#
+# Throughput of the offline sentiment pipeline on a synthetic corpus, serially
+# in one process and with the process pool at several worker counts.
+#
+#   python bench_senti_analysis.py --tweets 2000000 --retweet-share 0.4 --workers 1,2,4,8
+#
+# With --cache it also runs with a SentimentCache: a cold run, a re-run of the
+# same corpus, and a run of a corpus sharing only `--overlap` of its lines.
+#
+
+WORDS = ("good", "bad", "great", "terrible", "happy", "sad", "love", "hate", "india", "cricket",
+         "match", "today", "news", "amazing", "awful", "the", "is", "was", "very", "not")
+
+
+def write_corpus(path, tweets, retweet_share, seed=0):
+    rng = random.Random(seed)
+    originals = []
+    with open(path, "w") as file_descriptor:
+        for tweet_id in range(tweets):
+            if originals and rng.random() < retweet_share:
+                text = rng.choice(originals)
+            else:
+                text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 25)))
+                originals.append(text)
+            file_descriptor.write(json.dumps({"id": tweet_id, "text": text}))
+            file_descriptor.write("\n")
+
+
+def write_overlapping(path, source, overlap, seed=1):
+    """A corpus with the first `overlap` share of `source` and fresh tweets for the rest."""
+    with open(source) as file_descriptor:
+        lines = file_descriptor.readlines()
+    keep = int(len(lines) * overlap)
+    write_corpus(path, len(lines) - keep, 0.0, seed)
+    with open(path) as file_descriptor:
+        fresh = file_descriptor.readlines()
+    with open(path, "w") as file_descriptor:
+        file_descriptor.writelines(lines[:keep] + fresh)
+
+
+def cache_runs(directory, path, output, workers, chunk_size, overlap):
+    cache_path = os.path.join(directory, "sentiment.db")
+    other = os.path.join(directory, "overlapping.ndjson")
+    write_overlapping(other, path, overlap)
+    runs = (("cold", path), ("re-run", path), ("{:.0%} overlap".format(overlap), other))
+    for name, corpus in runs:
+        cache = SentimentCache(cache_path)
+        before = cache.stats()
+        started = time.perf_counter()
+        tweeter_senti_analysis.score_file(corpus, output, workers, chunk_size, cache)
+        seconds = time.perf_counter() - started
+        after = cache.stats()
+        hits, misses = after["hits"] - before["hits"], after["misses"] - before["misses"]
+        print("{:<12} {:>10.2f} {:>14} hit rate {:.1%}".format(
+            name, seconds, "", hits / (hits + misses) if hits + misses else 0.0))
+        cache.close()
+    for name in (cache_path, cache_path + "-wal", cache_path + "-shm", other):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def serial(path):
+    with open(path) as file_descriptor:
+        for _, text in tweeter_senti_analysis.iter_tweets(file_descriptor):
+            tweeter_senti_analysis.score_texts([text])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the offline sentiment pipeline.")
+    parser.add_argument("--tweets", type=int, default=200000)
+    parser.add_argument("--retweet-share", type=float, default=0.4)
+    parser.add_argument("--workers", default="1,2,4", help="Worker counts to run.")
+    parser.add_argument("--chunk-size", type=int, default=tweeter_senti_analysis.CHUNK_SIZE)
+    parser.add_argument("--skip-serial", action="store_true")
+    parser.add_argument("--cache", action="store_true", help="Also run with a persistent score cache.")
+    parser.add_argument("--overlap", type=float, default=0.5, help="Lines shared by the second corpus.")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "tweets.ndjson")
+    output = os.path.join(directory, "scores.ndjson")
+    write_corpus(path, args.tweets, args.retweet_share)
+
+    print("{:,} tweets, retweet share {:.0%}".format(args.tweets, args.retweet_share))
+    print("{:<12} {:>10} {:>14}".format("run", "seconds", "tweets/s"))
+    if not args.skip_serial:
+        started = time.perf_counter()
+        serial(path)
+        seconds = time.perf_counter() - started
+        print("{:<12} {:>10.2f} {:>14,.0f}".format("serial", seconds, args.tweets / seconds))
+    for workers in [int(count) for count in args.workers.split(",")]:
+        started = time.perf_counter()
+        tweeter_senti_analysis.score_file(path, output, workers, args.chunk_size)
+        seconds = time.perf_counter() - started
+        print("{:<12} {:>10.2f} {:>14,.0f}".format("{} workers".format(workers), seconds, args.tweets / seconds))
+    if args.cache:
+        cache_runs(directory, path, output, workers, args.chunk_size, args.overlap)
+
+    os.remove(path)
+    os.remove(output)
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
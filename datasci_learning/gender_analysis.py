@@ -1,6 +1,11 @@
-from sklearn import tree
+import argparse
+import sys
+import time
+import warnings
 
-clf = tree.ExtraTreeRegressor()
+import joblib
+import numpy as np
+from sklearn import tree
 
 # __all__ = ["DecisionTreeClassifier", "DecisionTreeRegressor",
 #            "ExtraTreeClassifier", "ExtraTreeRegressor", "export_graphviz"]
@@ -15,6 +20,121 @@ X = [[181, 80, 44], [177, 70, 43], [160, 60, 38], [154, 54, 37], [166, 65, 40],
 
 Y = [1, 1, 0, 0, 1, 1, 0, 0, 0, 1, 1]
 
-clf = clf.fit(X,Y)
-prediction = clf.predict([[190,70,42]])
-print prediction[0]
\ No newline at end of file
+# Rows read from a CSV file per prediction step
+CHUNK_ROWS = 1000000
+
+# sklearn trees compare features as float32, feeding that avoids a copy per call
+FEATURE_DTYPE = np.float32
+
+
+class GenderPredictor:
+    """
+    Train once, save, and predict in batches.
+
+    The model is saved with joblib. It is not memory mapped on load: sklearn
+    copies the tree arrays out of the file when it rebuilds the tree, so a
+    mapped load takes as much memory as a plain one.
+    """
+
+    def __init__(self, model=None):
+        self.model = model
+
+    def train(self, features=X, labels=Y, random_state=None):
+        self.model = tree.ExtraTreeRegressor(random_state=random_state)
+        self.model.fit(np.asarray(features, dtype=FEATURE_DTYPE), np.asarray(labels))
+        return self
+
+    def save(self, path):
+        joblib.dump(self.model, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        return cls(joblib.load(path))
+
+    def predict_batch(self, features):
+        """Predict a whole [n, 3] array (or list of rows) in one vectorized call."""
+        features = np.asarray(features, dtype=FEATURE_DTYPE)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        return self.model.predict(features)
+
+    def predict_csv(self, path, chunk_rows=CHUNK_ROWS, header=True):
+        """
+        Yield predictions for a CSV of height,weight,shoe_size rows, one array per chunk.
+        Only one chunk of the file is held in memory at a time.
+        """
+        with open(path) as file_descriptor:
+            if header:
+                file_descriptor.readline()
+            while True:
+                with warnings.catch_warnings():
+                    # The read after the last row warns about an empty input
+                    warnings.simplefilter("ignore", UserWarning)
+                    chunk = np.loadtxt(file_descriptor, delimiter=',', dtype=FEATURE_DTYPE,
+                                       max_rows=chunk_rows, ndmin=2)
+                if not len(chunk):
+                    return
+                yield self.predict_batch(chunk)
+
+
+def benchmark(rows, model_path, repeat=3):
+    """Retraining vs loading the saved model, and a per-sample loop vs predict_batch."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        predictor = GenderPredictor().train()
+    train_s = (time.perf_counter() - started) / repeat
+    predictor.save(model_path)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        loaded = GenderPredictor.load(model_path)
+    load_s = (time.perf_counter() - started) / repeat
+
+    rng = np.random.default_rng(0)
+    features = np.column_stack([rng.uniform(150, 200, rows), rng.uniform(45, 100, rows),
+                                rng.uniform(35, 48, rows)]).astype(FEATURE_DTYPE)
+
+    sample = features[:min(rows, 10000)]
+    started = time.perf_counter()
+    for row in sample:
+        loaded.model.predict([row])
+    loop_rows_s = len(sample) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    loaded.predict_batch(features)
+    batch_rows_s = rows / (time.perf_counter() - started)
+
+    print("train: {:.2f} ms, load: {:.2f} ms".format(train_s * 1000, load_s * 1000))
+    print("one sample per call: {:,.0f} rows/s".format(loop_rows_s))
+    print("predict_batch ({:,} rows): {:,.0f} rows/s".format(rows, batch_rows_s))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gender prediction from [height, weight, shoe_size].")
+    parser.add_argument("command", nargs="?", default="demo", choices=["demo", "train", "predict", "benchmark"])
+    parser.add_argument("--model", default="gender_model.joblib", help="Where the trained model is saved.")
+    parser.add_argument("--input", help="CSV with height,weight,shoe_size rows for predict.")
+    parser.add_argument("--output", help="Where predict writes one prediction per line, stdout by default.")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--rows", type=int, default=1000000, help="Rows used by benchmark.")
+    args = parser.parse_args()
+
+    if args.command == "demo":
+        prediction = GenderPredictor().train().predict_batch([[190, 70, 42]])
+        print(prediction[0])
+    elif args.command == "train":
+        print("Model saved to", GenderPredictor().train().save(args.model))
+    elif args.command == "predict":
+        predictor = GenderPredictor.load(args.model)
+        output = open(args.output, "w") if args.output else sys.stdout
+        for predictions in predictor.predict_csv(args.input, args.chunk_rows):
+            np.savetxt(output, predictions, fmt="%g")
+        if args.output:
+            output.close()
+    else:
+        benchmark(args.rows, args.model)
+
+
+if __name__ == "__main__":
+    main()
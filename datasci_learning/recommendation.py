@@ -0,0 +1,265 @@
+import argparse
+import csv
+import json
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from scipy import sparse
+
+#
+# Item-item recommendations from an interaction log.
+#
+# The log (user,item[,weight] per line, CSV) is streamed into a sparse
+# user-item matrix. Item vectors are normalized and item-item cosine
+# similarities are computed one block of items at a time, in worker
+# processes, keeping only the top k neighbours of every item. The index is a
+# directory of .npy files, so serving memory maps it and recommend() only
+# touches the rows of the items the user interacted with.
+#
+#   python recommendation.py build --input interactions.csv --index item_index --k 50 --workers 8
+#   python recommendation.py recommend --index item_index --user 42 --n 10
+#   python recommendation.py benchmark --users 1000000 --items 100000 --interactions 20000000
+#
+
+DEFAULT_K = 50
+DEFAULT_MEMORY_MB = 1024
+
+# Peak bytes per cell of a similarity block in _top_k_block: the sparse product
+# (float32 data + int32 indices once it is dense) next to the float32 dense
+# block, then the dense block next to argpartition's int64 indices, 12 bytes
+# either way. 16 leaves room for the sparse product's own work arrays.
+BYTES_PER_CELL = 16
+
+INDEX_FILES = ("neighbors", "scores", "user_indptr", "user_items", "user_weights")
+
+
+def read_interactions(path, delimiter=",", header=False):
+    """
+    Stream user,item[,weight] rows into compact arrays.
+
+    Returns (rows, cols, weights, users, items), where users and items list
+    the original ids in the order their integer index was assigned.
+    """
+    user_index, item_index = {}, {}
+    rows, cols, weights = array("i"), array("i"), array("f")
+    with open(path, newline="") as file_descriptor:
+        reader = csv.reader(file_descriptor, delimiter=delimiter)
+        if header:
+            next(reader, None)
+        for record in reader:
+            if not record:
+                continue
+            rows.append(user_index.setdefault(record[0], len(user_index)))
+            cols.append(item_index.setdefault(record[1], len(item_index)))
+            weights.append(float(record[2]) if len(record) > 2 and record[2] else 1.0)
+    return (np.frombuffer(rows, dtype=np.int32), np.frombuffer(cols, dtype=np.int32),
+            np.frombuffer(weights, dtype=np.float32), list(user_index), list(item_index))
+
+
+def build_matrix(rows, cols, weights, shape=None):
+    """Users x items CSR matrix, repeated interactions are summed."""
+    return sparse.csr_matrix((weights, (rows, cols)), shape=shape, dtype=np.float32)
+
+
+def normalized_items(matrix):
+    """Items x users CSR with every item row scaled to unit length."""
+    items = matrix.T.tocsr()
+    norms = np.sqrt(np.asarray(items.multiply(items).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(items).astype(np.float32).tocsr()
+
+
+def matrix_bytes(matrix):
+    """Memory held by a CSR or CSC matrix."""
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+
+def block_rows(items, workers, memory_mb, worker_bytes=0):
+    """
+    Item rows per block, so that every worker's dense block plus the
+    `worker_bytes` it holds anyway fit its share of the budget.
+    """
+    budget = memory_mb * 1024 * 1024 / max(workers, 1) - worker_bytes
+    return max(1, int(budget // (items * BYTES_PER_CELL)))
+
+
+# Set in every worker process by _init_worker
+_worker = {}
+
+
+def _init_worker(items, index_dir, k):
+    _worker.update(items=items, items_t=items.T.tocsc(), index_dir=index_dir, k=k)
+
+
+def _top_k_block(start, stop):
+    """Similarities of items [start, stop) to every item, top k written into the index files."""
+    items, k = _worker["items"], _worker["k"]
+    product = items[start:stop] @ _worker["items_t"]
+    similarity = product.toarray()
+    del product
+    # Negated in place rather than copied for argpartition, the item itself last
+    np.negative(similarity, out=similarity)
+    similarity[np.arange(stop - start), np.arange(start, stop)] = np.inf
+    # Only k columns of argpartition's int64 indices are kept
+    top = np.argpartition(similarity, k - 1, axis=1)[:, :k].copy()
+    top_scores = -np.take_along_axis(similarity, top, axis=1)
+    del similarity
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1).astype(np.int32)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    # Items sharing no user are not neighbours
+    top[top_scores <= 0] = -1
+    top_scores[top_scores <= 0] = 0
+
+    neighbors = np.load(os.path.join(_worker["index_dir"], "neighbors.npy"), mmap_mode="r+")
+    scores = np.load(os.path.join(_worker["index_dir"], "scores.npy"), mmap_mode="r+")
+    neighbors[start:stop] = top
+    scores[start:stop] = top_scores
+    neighbors.flush()
+    scores.flush()
+    return stop - start
+
+
+def build_index(matrix, index_dir, k=DEFAULT_K, workers=None, memory_mb=DEFAULT_MEMORY_MB, users=None, items=None):
+    """
+    Write the top-k neighbour index of `matrix` (users x items CSR) to `index_dir`.
+
+    Workers each hold the normalized item matrix twice (CSR and CSC) plus one
+    dense block of similarities, the block size keeps all of it, for all the
+    workers, within `memory_mb`.
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(index_dir, exist_ok=True)
+    n_items = matrix.shape[1]
+    k = max(1, min(k, n_items - 1))
+    open_memmap(os.path.join(index_dir, "neighbors.npy"), mode="w+", dtype=np.int32, shape=(n_items, k))
+    open_memmap(os.path.join(index_dir, "scores.npy"), mode="w+", dtype=np.float32, shape=(n_items, k))
+
+    normalized = normalized_items(matrix)
+    step = block_rows(n_items, workers, memory_mb, 2 * matrix_bytes(normalized))
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(normalized, index_dir, k)) as pool:
+        blocks = [pool.submit(_top_k_block, start, min(start + step, n_items)) for start in range(0, n_items, step)]
+        for block in blocks:
+            block.result()
+
+    np.save(os.path.join(index_dir, "user_indptr.npy"), matrix.indptr.astype(np.int64))
+    np.save(os.path.join(index_dir, "user_items.npy"), matrix.indices.astype(np.int32))
+    np.save(os.path.join(index_dir, "user_weights.npy"), matrix.data.astype(np.float32))
+    with open(os.path.join(index_dir, "ids.json"), "w") as file_descriptor:
+        json.dump({"users": users, "items": items, "k": k}, file_descriptor)
+    return index_dir
+
+
+class ItemRecommender:
+    """Serves recommendations from an index written by build_index."""
+
+    def __init__(self, index_dir, mmap=True):
+        mode = "r" if mmap else None
+        for name in INDEX_FILES:
+            setattr(self, name, np.load(os.path.join(index_dir, name + ".npy"), mmap_mode=mode))
+        with open(os.path.join(index_dir, "ids.json")) as file_descriptor:
+            ids = json.load(file_descriptor)
+        self.users = ids["users"]
+        self.items = ids["items"]
+        self.user_index = {user: index for index, user in enumerate(self.users)} if self.users else None
+
+    def _user(self, user):
+        return self.user_index[user] if self.user_index is not None else int(user)
+
+    def recommend_index(self, user, n=10):
+        """Top n (item index, score) for a user index, items the user already has are left out."""
+        start, stop = self.user_indptr[user], self.user_indptr[user + 1]
+        seen = np.asarray(self.user_items[start:stop])
+        if not len(seen):
+            return []
+        candidates = np.asarray(self.neighbors[seen]).ravel()
+        weights = (np.asarray(self.scores[seen]) * np.asarray(self.user_weights[start:stop])[:, None]).ravel()
+        keep = (candidates >= 0) & ~np.isin(candidates, seen)
+        candidates, weights = candidates[keep], weights[keep]
+        if not len(candidates):
+            return []
+        # Sum the scores of every candidate over the user's items
+        unique, inverse = np.unique(candidates, return_inverse=True)
+        totals = np.bincount(inverse, weights=weights)
+        n = min(n, len(unique))
+        top = np.argpartition(-totals, n - 1)[:n]
+        top = top[np.argsort(-totals[top])]
+        return list(zip(unique[top].tolist(), totals[top].tolist()))
+
+    def recommend(self, user, n=10):
+        """Top n (item id, score) for a user id, as it appears in the interaction file."""
+        recommendations = self.recommend_index(self._user(user), n)
+        if self.items:
+            return [(self.items[item], score) for item, score in recommendations]
+        return recommendations
+
+
+def synthetic_interactions(users, items, interactions, seed=0):
+    """Users with a taste for one of a few item groups, item popularity skewed."""
+    rng = np.random.default_rng(seed)
+    groups = max(1, items // 1000)
+    rows = rng.integers(0, users, interactions, dtype=np.int32)
+    group = rows % groups
+    offsets = np.minimum(rng.zipf(1.3, interactions), items // groups) - 1
+    cols = ((group * (items // groups) + offsets) % items).astype(np.int32)
+    return rows, cols, np.ones(interactions, dtype=np.float32)
+
+
+def benchmark(users, items, interactions, index_dir, k, workers, memory_mb, queries=10000):
+    started = time.perf_counter()
+    matrix = build_matrix(*synthetic_interactions(users, items, interactions), shape=(users, items))
+    print("matrix: {:,} x {:,}, {:,} non-zeros in {:.2f}s".format(
+        users, items, matrix.nnz, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    build_index(matrix, index_dir, k, workers, memory_mb)
+    print("index (k={}, {} workers): {:.2f}s".format(k, workers or os.cpu_count(), time.perf_counter() - started))
+
+    recommender = ItemRecommender(index_dir)
+    sample = np.random.default_rng(1).integers(0, users, queries)
+    latencies = []
+    for user in sample:
+        started = time.perf_counter()
+        recommender.recommend_index(int(user), 10)
+        latencies.append(time.perf_counter() - started)
+    latencies = np.array(latencies) * 1000
+    print("recommend: p50 {:.3f} ms, p99 {:.3f} ms over {:,} users".format(
+        np.percentile(latencies, 50), np.percentile(latencies, 99), queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Item-item recommendations from an interaction log.")
+    parser.add_argument("command", choices=["build", "recommend", "benchmark"])
+    parser.add_argument("--input", help="CSV of user,item[,weight] rows.")
+    parser.add_argument("--header", action="store_true", help="The input starts with a header row.")
+    parser.add_argument("--index", default="item_index", help="Index directory.")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="Neighbours kept per item.")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB,
+                        help="Memory budget of all the workers, matrix copies and similarity blocks.")
+    parser.add_argument("--user")
+    parser.add_argument("--n", type=int, default=10)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--interactions", type=int, default=2000000)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        rows, cols, weights, users, items = read_interactions(args.input, header=args.header)
+        matrix = build_matrix(rows, cols, weights, shape=(len(users), len(items)))
+        build_index(matrix, args.index, args.k, args.workers, args.memory_mb, users, items)
+        print("Indexed {:,} users, {:,} items in {:.2f}s".format(len(users), len(items), time.perf_counter() - started))
+    elif args.command == "recommend":
+        for item, score in ItemRecommender(args.index).recommend(args.user, args.n):
+            print(item, round(score, 4))
+    else:
+        benchmark(args.users, args.items, args.interactions, args.index, args.k, args.workers, args.memory_mb)
+
+
+if __name__ == "__main__":
+    main()
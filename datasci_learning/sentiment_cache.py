@@ -0,0 +1,119 @@
+import hashlib
+import re
+import sqlite3
+import time
+
+#
+# Persistent cache of TextBlob sentiment scores for tweeter_senti_analysis.py.
+#
+# Keys are a 16 byte hash of the normalized text, values the polarity and
+# subjectivity, one fixed-width row per text in a WITHOUT ROWID SQLite table.
+# The cache holds at most `max_entries` texts and evicts the least recently
+# used ones. Hit and miss counters are stored in the same file, so the hit
+# rate adds up over every run.
+#
+
+DEFAULT_MAX_ENTRIES = 5000000
+
+# SQLite's default limit on the number of bound parameters is 999
+LOOKUP_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    key BLOB PRIMARY KEY,
+    polarity REAL NOT NULL,
+    subjectivity REAL NOT NULL,
+    last_access REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS scores_last_access ON scores (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+COUNTERS = ("hits", "misses", "evictions")
+
+# "RT @user: " in front of a retweet does not change the sentiment of the text
+RETWEET_PREFIX = re.compile(r"^(RT @\w+:\s*)+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text):
+    return RETWEET_PREFIX.sub("", WHITESPACE.sub(" ", text).strip())
+
+
+def text_key(text):
+    return hashlib.blake2b(normalize(text).encode("utf-8"), digest_size=16).digest()
+
+
+class SentimentCache:
+    """Maps text_key(text) to (polarity, subjectivity), bounded with LRU eviction."""
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        # Not bound to the creating thread, tweet_ingestion calls it from a cache thread (one call at a time)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.executemany("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)",
+                            [(name,) for name in COUNTERS])
+        self.entries = self.db.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        # A smaller max_entries than the file was filled with takes effect at once
+        self._evict()
+
+    def _count(self, name, amount):
+        if amount:
+            self.db.execute("UPDATE counters SET value = value + ? WHERE name = ?", (amount, name))
+
+    def get_many(self, keys):
+        """Scores of the cached keys as {key: (polarity, subjectivity)}, missing keys are left out."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), LOOKUP_BATCH):
+            batch = keys[start:start + LOOKUP_BATCH]
+            rows = self.db.execute("SELECT key, polarity, subjectivity FROM scores WHERE key IN ({})".format(
+                ",".join("?" * len(batch))), batch)
+            found.update((key, (polarity, subjectivity)) for key, polarity, subjectivity in rows)
+        now = time.time()
+        self.db.execute("BEGIN")
+        self.db.executemany("UPDATE scores SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+        self._count("hits", len(found))
+        self._count("misses", len(keys) - len(found))
+        self.db.execute("COMMIT")
+        return found
+
+    def set_many(self, scores):
+        """Store {key: (polarity, subjectivity)}, then evict the least recently used keys above max_entries."""
+        if not scores:
+            return
+        now = time.time()
+        self.db.execute("BEGIN")
+        before = self.db.total_changes
+        self.db.executemany("INSERT OR IGNORE INTO scores (key, polarity, subjectivity, last_access) "
+                            "VALUES (?, ?, ?, ?)",
+                            [(key, polarity, subjectivity, now) for key, (polarity, subjectivity) in scores.items()])
+        self.entries += self.db.total_changes - before
+        self._evict()
+        self.db.execute("COMMIT")
+
+    def _evict(self):
+        if self.entries <= self.max_entries:
+            return
+        evicted = self.db.execute("DELETE FROM scores WHERE key IN "
+                                  "(SELECT key FROM scores ORDER BY last_access LIMIT ?)",
+                                  (self.entries - self.max_entries,)).rowcount
+        self.entries -= evicted
+        self._count("evictions", evicted)
+
+    def stats(self):
+        stats = dict(self.db.execute("SELECT name, value FROM counters").fetchall())
+        stats["entries"] = self.entries
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        self.db.close()
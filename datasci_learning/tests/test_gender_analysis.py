@@ -0,0 +1,27 @@
+import numpy as np
+
+from gender_analysis import X, Y, GenderPredictor
+
+
+def test_saved_model_predicts_like_the_trained_one(tmp_path):
+    predictor = GenderPredictor().train(random_state=0)
+    loaded = GenderPredictor.load(predictor.save(str(tmp_path / "model.joblib")))
+
+    assert list(loaded.predict_batch(X)) == list(predictor.predict_batch(X))
+    # The training rows are learned exactly by a fully grown tree
+    assert list(loaded.predict_batch(X)) == Y
+    assert loaded.predict_batch([190, 70, 42]).shape == (1,)
+
+
+def test_predict_csv_yields_one_array_per_chunk(tmp_path):
+    path = str(tmp_path / "people.csv")
+    rows = X * 3
+    with open(path, "w") as file_descriptor:
+        file_descriptor.write("height,weight,shoe_size\n")
+        file_descriptor.writelines("{},{},{}\n".format(*row) for row in rows)
+    predictor = GenderPredictor().train(random_state=0)
+
+    chunks = list(predictor.predict_csv(path, chunk_rows=10))
+
+    assert [len(chunk) for chunk in chunks] == [10, 10, 10, 3]
+    assert list(np.concatenate(chunks)) == list(predictor.predict_batch(rows))
@@ -0,0 +1,38 @@
+import numpy as np
+
+from gender_training import count_rows, holdout_split, load_csv, make_data, train_ensemble
+
+
+def test_load_csv_fills_preallocated_arrays(tmp_path):
+    path = str(tmp_path / "people.csv")
+    make_data(path, 2500, chunk_rows=1000)
+
+    features, labels = load_csv(path, chunk_rows=700)
+
+    assert count_rows(path) == 2500
+    assert features.shape == (2500, 3) and features.dtype == np.float32
+    assert set(np.unique(labels).tolist()) == {0, 1}
+    assert len(load_csv(path, max_rows=100)[1]) == 100
+
+
+def test_string_labels_are_mapped(tmp_path):
+    path = str(tmp_path / "people.csv")
+    with open(path, "w") as file_descriptor:
+        file_descriptor.write("height,weight,shoe_size,gender\n180,80,44,male\n160,55,37,F\n")
+
+    assert load_csv(path)[1].tolist() == [1, 0]
+
+
+def test_trees_are_limited_in_size(tmp_path):
+    path = str(tmp_path / "people.csv")
+    make_data(path, 5000)
+    train_x, train_y, test_x, test_y = holdout_split(*load_csv(path))
+
+    full = train_ensemble(train_x, train_y, jobs=1, estimators=5, min_samples_leaf=1, max_leaf_nodes=None)
+    limited = train_ensemble(train_x, train_y, jobs=1, estimators=5, min_samples_leaf=20, max_leaf_nodes=32,
+                             max_samples=0.5)
+
+    assert all(estimator.get_n_leaves() <= 32 for estimator in limited.estimators_)
+    assert sum(estimator.tree_.node_count for estimator in limited.estimators_) < \
+        sum(estimator.tree_.node_count for estimator in full.estimators_) / 5
+    assert (limited.predict(test_x) == test_y).mean() > 0.9
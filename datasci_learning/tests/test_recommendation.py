@@ -0,0 +1,73 @@
+import os
+import tracemalloc
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+import recommendation
+from recommendation import (ItemRecommender, block_rows, build_index, build_matrix, matrix_bytes, normalized_items,
+                            synthetic_interactions)
+
+
+def brute_force_neighbors(matrix, k):
+    items = normalized_items(matrix).toarray()
+    similarity = items @ items.T
+    np.fill_diagonal(similarity, -np.inf)
+    neighbors = []
+    for row in similarity:
+        top = np.argsort(-row)[:k]
+        neighbors.append(set(top[row[top] > 0].tolist()))
+    return neighbors
+
+
+def test_block_rows_leaves_room_for_the_worker_matrices():
+    mib = 1024 * 1024
+    assert block_rows(1000, 4, 64) == 16 * mib // (1000 * recommendation.BYTES_PER_CELL)
+    assert block_rows(1000, 4, 64, 8 * mib) == 8 * mib // (1000 * recommendation.BYTES_PER_CELL)
+    # Never less than a row
+    assert block_rows(1000, 4, 64, 32 * mib) == 1
+
+
+def test_block_peak_memory_stays_within_the_budget(tmp_path):
+    n_items, k, memory_mb = 4000, 20, 32
+    matrix = build_matrix(*synthetic_interactions(5000, n_items, 100000), shape=(5000, n_items))
+    normalized = normalized_items(matrix)
+    open_memmap(str(tmp_path / "neighbors.npy"), mode="w+", dtype=np.int32, shape=(n_items, k))
+    open_memmap(str(tmp_path / "scores.npy"), mode="w+", dtype=np.float32, shape=(n_items, k))
+
+    tracemalloc.start()
+    try:
+        recommendation._init_worker(normalized, str(tmp_path), k)
+        step = block_rows(n_items, 1, memory_mb, 2 * matrix_bytes(normalized))
+        recommendation._top_k_block(0, step)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        recommendation._worker.clear()
+    assert step > 1
+    assert peak <= memory_mb * 1024 * 1024
+
+
+def test_index_matches_brute_force_similarities(tmp_path):
+    rng = np.random.default_rng(3)
+    users, items, k = 200, 60, 5
+    rows = rng.integers(0, users, 1500, dtype=np.int32)
+    cols = rng.integers(0, items, 1500, dtype=np.int32)
+    # Weights keep the similarities apart, ties would make the top k ambiguous
+    weights = rng.random(1500, dtype=np.float32) + 0.5
+    matrix = build_matrix(rows, cols, weights, shape=(users, items))
+
+    # A tiny budget splits the items in many blocks
+    build_index(matrix, str(tmp_path), k=k, workers=2, memory_mb=0)
+    neighbors = np.load(os.path.join(str(tmp_path), "neighbors.npy"))
+    expected = brute_force_neighbors(matrix, k)
+    for item in range(items):
+        assert set(neighbors[item][neighbors[item] >= 0].tolist()) == expected[item]
+
+    recommender = ItemRecommender(str(tmp_path))
+    seen = set(matrix[7].indices.tolist())
+    recommendations = recommender.recommend_index(7, 5)
+    assert recommendations
+    assert not seen & {item for item, _ in recommendations}
+    scores = [score for _, score in recommendations]
+    assert scores == sorted(scores, reverse=True)
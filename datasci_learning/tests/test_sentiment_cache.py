@@ -0,0 +1,50 @@
+from sentiment_cache import SentimentCache, normalize, text_key
+from tweeter_senti_analysis import SentimentPipeline
+
+
+def test_retweets_and_spacing_share_a_key():
+    assert normalize("RT @a: RT @b:  so   good ") == "so good"
+    assert text_key("RT @someone: so good") == text_key("so  good")
+    assert len(text_key("so good")) == 16
+
+
+def test_scores_persist_and_count_hits(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SentimentCache(path)
+    cache.set_many({text_key("a"): (0.5, 0.1), text_key("b"): (-0.5, 0.9)})
+    cache.close()
+
+    cache = SentimentCache(path)
+    assert cache.get_many([text_key("a"), text_key("c")]) == {text_key("a"): (0.5, 0.1)}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 2)
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SentimentCache(str(tmp_path / "cache.db"), max_entries=2)
+    cache.set_many({text_key("old"): (0.0, 0.0)})
+    cache.set_many({text_key("used"): (0.1, 0.1)})
+    # Reading "used" again makes "old" the least recently used
+    cache.db.execute("UPDATE scores SET last_access = last_access - 10 WHERE key = ?", (text_key("old"),))
+    cache.get_many([text_key("used")])
+
+    cache.set_many({text_key("new"): (0.2, 0.2)})
+
+    assert set(cache.get_many([text_key(text) for text in ("old", "used", "new")])) == {
+        text_key("used"), text_key("new")}
+    assert cache.stats()["evictions"] == 1
+    cache.close()
+
+
+def test_pipeline_skips_texts_found_in_the_cache(tmp_path):
+    cache = SentimentCache(str(tmp_path / "cache.db"))
+    tweets = [(number, "text {}".format(number % 5)) for number in range(20)]
+
+    first = SentimentPipeline(workers=1, chunk_size=4, cache=cache)
+    first_results = list(first.run(tweets))
+    second = SentimentPipeline(workers=1, chunk_size=4, cache=cache)
+
+    assert list(second.run(tweets)) == first_results
+    assert (first.scored, second.scored, second.cached) == (5, 0, 5)
+    cache.close()
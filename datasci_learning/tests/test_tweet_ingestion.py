@@ -0,0 +1,88 @@
+import asyncio
+import io
+import json
+
+from sentiment_cache import SentimentCache
+from tweet_ingestion import FileReplayer, HTTPSource, IngestStats, OrderedWriter, RateLimiter, ingest, serve_stub
+
+TEXTS = ["I love this", "I hate this", "RT @someone: I love this", "It is a table"]
+
+
+def write_tweets(path, count):
+    with open(path, "w") as file_descriptor:
+        for number in range(count):
+            file_descriptor.write(json.dumps({"id": number, "text": TEXTS[number % len(TEXTS)]}) + "\n")
+    return path
+
+
+def scored(output):
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_pages_are_written_in_source_order_and_cached(tmp_path):
+    path = write_tweets(str(tmp_path / "tweets.ndjson"), 95)
+    cache = SentimentCache(str(tmp_path / "cache.db"))
+
+    output = io.StringIO()
+    stats = asyncio.run(ingest(FileReplayer(path, page_size=10), output, workers=2, cache=cache))
+    misses = cache.stats()["misses"]
+    again = io.StringIO()
+    asyncio.run(ingest(FileReplayer(path, page_size=10), again, workers=2, cache=cache))
+
+    results = scored(output)
+    assert [result["id"] for result in results] == list(range(95))
+    assert stats.tweets == 95 and stats.pages == 10
+    assert results[0]["polarity"] > 0 > results[1]["polarity"]
+    # The retweet is normalized to the same key as the original
+    assert results[2]["polarity"] == results[0]["polarity"]
+    assert scored(again) == results
+    # Every lookup of the second run hit
+    assert cache.stats()["misses"] == misses
+    assert cache.stats()["entries"] == 3
+    cache.close()
+
+
+def test_pages_ahead_of_a_slow_one_are_bounded():
+    async def run():
+        output, stats = io.StringIO(), IngestStats()
+        writer = OrderedWriter(output, stats, limit=2)
+        ahead = [asyncio.ensure_future(writer.put(seq, [(seq, 0.0, 0.0)])) for seq in range(1, 6)]
+        await asyncio.sleep(0.01)
+        # Pages 1 and 2 are held, 3 to 5 wait with their scorers
+        held, waiting = len(writer.done), sum(not task.done() for task in ahead)
+        await writer.put(0, [(0, 0.0, 0.0)])
+        await asyncio.gather(*ahead)
+        return held, waiting, output, stats
+
+    held, waiting, output, stats = asyncio.run(run())
+
+    assert (held, waiting) == (2, 3)
+    assert [result["id"] for result in scored(output)] == [0, 1, 2, 3, 4, 5]
+    assert stats.max_reordered == 2
+
+
+def test_stub_source_pages_through_the_endpoint(tmp_path):
+    path = write_tweets(str(tmp_path / "tweets.ndjson"), 25)
+    server, url = serve_stub(path, page_size=10)
+
+    async def pages():
+        return [page async for page in HTTPSource(url, calls=1000, period=1).pages()]
+
+    try:
+        assert [len(page) for page in asyncio.run(pages())] == [10, 10, 5]
+    finally:
+        server.shutdown()
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(calls=20, period=1)
+
+    async def calls():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(5):
+            await limiter.wait()
+        return loop.time() - started
+
+    # The first call goes at once, the next four 50 ms apart
+    assert asyncio.run(calls()) >= 0.19
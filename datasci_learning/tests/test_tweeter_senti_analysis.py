@@ -0,0 +1,40 @@
+import json
+
+from textblob import TextBlob
+
+from tweeter_senti_analysis import SentimentPipeline, iter_tweets, score_file
+
+TEXTS = ["What a great day", "This is awful", "Nothing to say", "What a great day"]
+
+
+def test_file_is_scored_in_order_and_each_text_once(tmp_path):
+    input_path, output_path = str(tmp_path / "tweets.ndjson"), str(tmp_path / "scores.ndjson")
+    with open(input_path, "w") as file_descriptor:
+        for number in range(50):
+            tweet = {"id": number, "full_text" if number % 2 else "text": TEXTS[number % len(TEXTS)]}
+            file_descriptor.write(json.dumps(tweet) + "\n\n")
+
+    pipeline = score_file(input_path, output_path, workers=2, chunk_size=7)
+
+    with open(output_path) as file_descriptor:
+        scores = [json.loads(line) for line in file_descriptor]
+    assert [score["id"] for score in scores] == list(range(50))
+    for score in scores:
+        polarity, subjectivity = TextBlob(TEXTS[score["id"] % len(TEXTS)]).sentiment
+        assert (score["polarity"], score["subjectivity"]) == (polarity, subjectivity)
+    assert pipeline.tweets == 50
+    # Three distinct texts, each sent to a worker once
+    assert pipeline.scored == 3
+
+
+def test_iter_tweets_skips_blank_lines_and_missing_text():
+    lines = ['{"id": 1, "text": "a"}', "", '{"id": 2, "full_text": "b", "text": "short"}', '{"id": 3}']
+
+    assert list(iter_tweets(lines)) == [(1, "a"), (2, "b"), (3, "")]
+
+
+def test_pipeline_accepts_any_iterable():
+    results = list(SentimentPipeline(workers=1, chunk_size=2).run(iter([(10, "good"), (11, "bad"), (12, "good")])))
+
+    assert [result[0] for result in results] == [10, 11, 12]
+    assert results[0][1:] == results[2][1:] == tuple(TextBlob("good").sentiment)
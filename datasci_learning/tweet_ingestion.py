@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import tweeter_senti_analysis
+from sentiment_cache import SentimentCache, text_key
+
+#
+# Asyncio ingestion stage for the sentiment pipeline.
+#
+# A source yields pages of tweets, a producer task puts them in a bounded
+# queue, and scorer tasks take pages off the queue and score them in a process
+# pool. When scoring falls behind the queue fills up and the producer waits on
+# it, so at most `queue_size` pages are held no matter how fast the source is.
+# Scored pages are written in source order; pages scored ahead of a slow one
+# wait for it, and past `reorder_pages` of them their scorers wait too, so that
+# buffer is bounded as well. Sentiment cache lookups and writes run on a thread
+# of their own, SQLite never blocks the event loop. Sources pace their own
+# requests to stay within their rate limit.
+#
+#   python tweet_ingestion.py --source twitter --query india
+#   python tweet_ingestion.py --source file --input tweets.ndjson --rate 50000
+#   python tweet_ingestion.py --source stub --input tweets.ndjson
+#
+
+PAGE_SIZE = 100
+QUEUE_SIZE = 32
+
+# Standard Twitter API v1.1 search limit, requests per 15 minute window
+SEARCH_REQUESTS = 180
+SEARCH_WINDOW = 15 * 60
+
+
+class RateLimiter:
+    """At most `calls` per `period` seconds, spaced evenly instead of in bursts."""
+
+    def __init__(self, calls, period):
+        self.interval = period / calls if calls else 0
+        self.next_at = 0.0
+
+    def defer(self, seconds):
+        """Push the next call back, used when the server says the window is used up."""
+        self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+    async def wait(self):
+        now = time.monotonic()
+        if self.next_at > now:
+            await asyncio.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+class TwitterSource:
+    """Pages of a Twitter search, walking back with max_id, one blocking call at a time in a thread."""
+
+    def __init__(self, query, max_pages=10, page_size=PAGE_SIZE, api=None):
+        self.query = query
+        self.max_pages = max_pages
+        self.page_size = page_size
+        self.api = api
+        self.limiter = RateLimiter(SEARCH_REQUESTS, SEARCH_WINDOW)
+
+    def _api(self):
+        if self.api is None:
+            import tweepy
+
+            auth = tweepy.OAuthHandler(tweeter_senti_analysis.consumer_key, tweeter_senti_analysis.consumer_secret)
+            auth.set_access_token(tweeter_senti_analysis.access_token, tweeter_senti_analysis.access_token_secret)
+            self.api = tweepy.API(auth)
+        return self.api
+
+    def _search(self, max_id):
+        api = self._api()
+        # Renamed search_tweets in tweepy 4
+        search = getattr(api, "search_tweets", None) or api.search
+        return [{"id": tweet.id, "text": tweet.text}
+                for tweet in search(self.query, count=self.page_size, max_id=max_id)]
+
+    async def pages(self):
+        max_id = None
+        for _ in range(self.max_pages):
+            await self.limiter.wait()
+            page = await asyncio.get_running_loop().run_in_executor(None, self._search, max_id)
+            if not page:
+                return
+            yield page
+            max_id = min(tweet["id"] for tweet in page) - 1
+
+
+class FileReplayer:
+    """Replays an NDJSON file of tweets in pages, at up to `rate` tweets per second (unpaced when None)."""
+
+    def __init__(self, path, page_size=PAGE_SIZE, rate=None):
+        self.path = path
+        self.page_size = page_size
+        self.limiter = RateLimiter(rate, page_size) if rate else None
+
+    async def pages(self):
+        with open(self.path) as file_descriptor:
+            tweets = tweeter_senti_analysis.iter_tweets(file_descriptor)
+            while True:
+                page = [{"id": tweet_id, "text": text} for tweet_id, text in _take(tweets, self.page_size)]
+                if not page:
+                    return
+                if self.limiter is not None:
+                    await self.limiter.wait()
+                else:
+                    # Let the scorers run between pages
+                    await asyncio.sleep(0)
+                yield page
+
+
+class HTTPSource:
+    """
+    Pages from an HTTP endpoint returning {"tweets": [...], "next": url or null}.
+    Honours the x-rate-limit-remaining / x-rate-limit-reset headers and 429 Retry-After.
+    """
+
+    def __init__(self, url, calls=SEARCH_REQUESTS, period=SEARCH_WINDOW):
+        self.url = url
+        self.limiter = RateLimiter(calls, period)
+
+    def _get(self, url):
+        try:
+            with urllib.request.urlopen(url) as response:
+                return response.status, dict(response.headers), json.load(response)
+        except urllib.error.HTTPError as error:
+            if error.code != 429:
+                raise
+            return error.code, dict(error.headers), None
+
+    async def pages(self):
+        url = self.url
+        loop = asyncio.get_running_loop()
+        while url:
+            await self.limiter.wait()
+            status, headers, body = await loop.run_in_executor(None, self._get, url)
+            if status == 429:
+                self.limiter.defer(float(headers.get("Retry-After", 1)))
+                continue
+            if headers.get("x-rate-limit-remaining") == "0":
+                self.limiter.defer(max(0.0, float(headers.get("x-rate-limit-reset", 0)) - time.time()))
+            if body["tweets"]:
+                yield body["tweets"]
+            url = body.get("next")
+
+
+def _take(iterator, size):
+    page = []
+    for item in iterator:
+        page.append(item)
+        if len(page) == size:
+            break
+    return page
+
+
+class IngestStats:
+    def __init__(self):
+        self.pages = 0
+        self.tweets = 0
+        self.max_queued = 0
+        # Most scored pages held back waiting for an earlier one
+        self.max_reordered = 0
+        # Time the producer spent waiting for room in the queue
+        self.backpressure = 0.0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def report(self):
+        return ("{:,} tweets in {:,} pages, {:.2f}s, {:,.0f} tweets/s, max {} pages queued, "
+                "max {} pages reordered, {:.2f}s backpressure").format(
+            self.tweets, self.pages, self.seconds, self.tweets / self.seconds if self.seconds else 0,
+            self.max_queued, self.max_reordered, self.backpressure)
+
+
+async def _produce(source, queue, stats, scorers):
+    async for page in source.pages():
+        started = time.perf_counter()
+        await queue.put((stats.pages, page))
+        stats.backpressure += time.perf_counter() - started
+        stats.pages += 1
+        stats.max_queued = max(stats.max_queued, queue.qsize())
+    for _ in range(scorers):
+        await queue.put(None)
+
+
+class OrderedWriter:
+    """
+    Writes scored pages to `output` in source order. At most `limit` pages
+    scored ahead of the next one to write are held, `put` of a page further
+    ahead waits until the pages before it are written.
+    """
+
+    def __init__(self, output, stats, limit):
+        self.output = output
+        self.stats = stats
+        self.limit = limit
+        self.done = {}
+        self.next_seq = 0
+        self._ready = asyncio.Condition()
+
+    async def put(self, seq, results):
+        async with self._ready:
+            # The page next_seq is always with a scorer that doesn't wait here, so this can't stall
+            await self._ready.wait_for(lambda: seq - self.next_seq <= self.limit)
+            self.done[seq] = results
+            while self.next_seq in self.done:
+                results = self.done.pop(self.next_seq)
+                tweeter_senti_analysis.write_scores(results, self.output)
+                self.stats.tweets += len(results)
+                self.next_seq += 1
+            self.stats.max_reordered = max(self.stats.max_reordered, len(self.done))
+            self._ready.notify_all()
+
+
+async def _score(queue, pool, cache, cache_thread, writer):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        seq, page = item
+        texts = list(dict.fromkeys(tweet["text"] for tweet in page))
+        scores = {}
+        if cache is not None:
+            keys = {text: text_key(text) for text in texts}
+            found = await loop.run_in_executor(cache_thread, cache.get_many, list(keys.values()))
+            scores = {text: found[key] for text, key in keys.items() if key in found}
+            texts = [text for text in texts if text not in scores]
+        if texts:
+            fresh = await loop.run_in_executor(pool, tweeter_senti_analysis.score_texts, texts)
+            scores.update(zip(texts, fresh))
+            if cache is not None:
+                await loop.run_in_executor(cache_thread, cache.set_many,
+                                           {text_key(text): score for text, score in zip(texts, fresh)})
+        await writer.put(seq, [(tweet["id"],) + tuple(scores[tweet["text"]]) for tweet in page])
+
+
+async def ingest(source, output, workers=None, queue_size=QUEUE_SIZE, cache=None, reorder_pages=None):
+    """
+    Score every page of `source` and write the scores to `output` in source
+    order, holding at most `reorder_pages` (one per scorer by default) pages
+    scored ahead of order.
+    """
+    workers = workers or os.cpu_count() or 1
+    queue = asyncio.Queue(queue_size)
+    stats = IngestStats()
+    # One page per worker being scored and one waiting, the rest stays in the queue
+    scorers = 2 * workers
+    writer = OrderedWriter(output, stats, reorder_pages or scorers)
+
+    # One thread for the cache, its SQLite connection is used by one call at a time
+    with ProcessPoolExecutor(workers) as pool, ThreadPoolExecutor(1, thread_name_prefix="cache") as cache_thread:
+        await asyncio.gather(_produce(source, queue, stats, scorers),
+                             *[_score(queue, pool, cache, cache_thread, writer) for _ in range(scorers)])
+    stats.seconds = time.perf_counter() - stats.started
+    return stats
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves `server.tweets` in pages of `server.page_size` with rate-limit headers."""
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        start = int(query.get("start", ["0"])[0])
+        tweets = self.server.tweets[start:start + self.server.page_size]
+        end = start + len(tweets)
+        next_url = None
+        if end < len(self.server.tweets):
+            next_url = "http://{}:{}/search?start={}".format(*self.server.server_address, end)
+        body = json.dumps({"tweets": tweets, "next": next_url}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("x-rate-limit-remaining", "1000")
+        self.send_header("x-rate-limit-reset", str(int(time.time()) + SEARCH_WINDOW))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_stub(path, page_size=PAGE_SIZE):
+    """Start a local search endpoint over an NDJSON file, returns (server, url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    with open(path) as file_descriptor:
+        server.tweets = [{"id": tweet_id, "text": text}
+                         for tweet_id, text in tweeter_senti_analysis.iter_tweets(file_descriptor)]
+    server.page_size = page_size
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://{}:{}/search?start=0".format(*server.server_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest tweets from a source and score them as they arrive.")
+    parser.add_argument("--source", choices=["twitter", "file", "stub"], default="file")
+    parser.add_argument("--query", default="india", help="Search query for the twitter source.")
+    parser.add_argument("--pages", type=int, default=10, help="Pages fetched from the twitter source.")
+    parser.add_argument("--input", help="NDJSON tweets for the file and stub sources.")
+    parser.add_argument("--output", help="NDJSON scores, stdout by default.")
+    parser.add_argument("--rate", type=float, help="Tweets per second replayed by the file source.")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="Pages held between the stages.")
+    parser.add_argument("--reorder-pages", type=int,
+                        help="Scored pages held for an earlier one, 2 x workers by default.")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--cache", help="SQLite sentiment cache, see sentiment_cache.py.")
+    args = parser.parse_args()
+
+    server = None
+    if args.source == "twitter":
+        source = TwitterSource(args.query, args.pages, args.page_size)
+    elif args.source == "file":
+        source = FileReplayer(args.input, args.page_size, args.rate)
+    else:
+        server, url = serve_stub(args.input, args.page_size)
+        # The stub has no real limit, pace it like a generous one
+        source = HTTPSource(url, calls=1000, period=1)
+
+    cache = SentimentCache(args.cache) if args.cache else None
+    output = open(args.output, "w") if args.output else sys.stdout
+    stats = asyncio.run(ingest(source, output, args.workers, args.queue_size, cache, args.reorder_pages))
+    if args.output:
+        output.close()
+    if cache is not None:
+        cache.close()
+    if server is not None:
+        server.shutdown()
+    print(stats.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
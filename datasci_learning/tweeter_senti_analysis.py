@@ -1,20 +1,196 @@
-import tweepy
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
 from textblob import TextBlob
 
+from sentiment_cache import DEFAULT_MAX_ENTRIES, SentimentCache, text_key
+
 consumer_key = "AfYZxxxxxxxxxxxxxxxxxx4yUFC"
 consumer_secret = "1KEa6Zxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxhk1TMny"
 
 access_token = "144xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxHyiS"
 access_token_secret = "BuoBxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxkExJin"
 
-auth = tweepy.OAuthHandler(consumer_key, consumer_secret)
-auth.set_access_token(access_token, access_token_secret)
+#
+# Live mode searches the Twitter API and prints every tweet with its sentiment.
+# Offline mode scores a local NDJSON file of tweets (one JSON object per line
+# with a "text" or "full_text" field) in a process pool:
+#
+#   python tweeter_senti_analysis.py search india
+#   python tweeter_senti_analysis.py score --input tweets.ndjson --output scores.ndjson --workers 8
+#   python tweeter_senti_analysis.py score --input tweets.ndjson --cache sentiment.db
+#
+# The input is read as a stream in chunks. Texts already seen (retweets) are
+# scored once, and the scores are written in input order, one line per tweet.
+# With --cache, scores are also kept across runs (see sentiment_cache.py).
+# tweet_ingestion.py feeds the scorer from the API or a replayer as pages arrive.
+#
+
+# Tweets per work unit sent to a worker process
+CHUNK_SIZE = 2000
+
+# Work units in flight per worker, keeps every core busy while the oldest chunk is written
+INFLIGHT_PER_WORKER = 4
+
+
+def search(query):
+    import tweepy
+
+    auth = tweepy.OAuthHandler(consumer_key, consumer_secret)
+    auth.set_access_token(access_token, access_token_secret)
+
+    api = tweepy.API(auth)
+
+    public_tweets = api.search(query)
+
+    for tweet in public_tweets:
+        print(tweet.text)
+        analysis = TextBlob(tweet.text)
+        print(analysis.sentiment)
+
+
+def iter_tweets(file_descriptor):
+    """Yield (id, text) for every tweet of an NDJSON stream, blank lines are skipped."""
+    for line in file_descriptor:
+        if not line.strip():
+            continue
+        tweet = json.loads(line)
+        yield tweet.get("id"), tweet.get("full_text") or tweet.get("text") or ""
+
+
+def score_texts(texts):
+    """Runs in a worker process: (polarity, subjectivity) for every text."""
+    return [tuple(TextBlob(text).sentiment) for text in texts]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class SentimentPipeline:
+    """
+    Scores a stream of (id, text) in a process pool and yields
+    (id, polarity, subjectivity) in input order.
+
+    Each chunk of the input only sends the texts not seen before to a worker,
+    so identical texts are scored once per run. With a SentimentCache, texts
+    scored by an earlier run are taken from the cache instead. At most
+    `workers * INFLIGHT_PER_WORKER` chunks are in flight, so memory stays
+    bounded by the in-flight chunks plus one score per distinct text.
+    """
+
+    def __init__(self, workers=None, chunk_size=CHUNK_SIZE, cache=None):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.scores = {}
+        self.tweets = 0
+        self.scored = 0
+        self.cached = 0
+
+    def _submit(self, pool, chunk, submitted):
+        new = []
+        for _, text in chunk:
+            if text not in self.scores and text not in submitted:
+                submitted.add(text)
+                new.append(text)
+        if self.cache is not None and new:
+            new = self._from_cache(new, submitted)
+        self.tweets += len(chunk)
+        self.scored += len(new)
+        return chunk, new, pool.submit(score_texts, new) if new else None
+
+    def _from_cache(self, texts, submitted):
+        keys = [text_key(text) for text in texts]
+        found = self.cache.get_many(keys)
+        self.cached += len(found)
+        missing = []
+        for text, key in zip(texts, keys):
+            if key in found:
+                self.scores[text] = found[key]
+                submitted.discard(text)
+            else:
+                missing.append(text)
+        return missing
+
+    def _finish(self, chunk, new, future, submitted):
+        if future is not None:
+            scores = future.result()
+            self.scores.update(zip(new, scores))
+            submitted.difference_update(new)
+            if self.cache is not None:
+                self.cache.set_many({text_key(text): score for text, score in zip(new, scores)})
+        for tweet_id, text in chunk:
+            polarity, subjectivity = self.scores[text]
+            yield tweet_id, polarity, subjectivity
+
+    def run(self, tweets):
+        # Texts sent to a worker whose scores are not back yet
+        submitted = set()
+        limit = (self.workers or os.cpu_count() or 1) * INFLIGHT_PER_WORKER
+        with ProcessPoolExecutor(self.workers) as pool:
+            pending = deque()
+            for chunk in _chunks(tweets, self.chunk_size):
+                pending.append(self._submit(pool, chunk, submitted))
+                if len(pending) >= limit:
+                    yield from self._finish(*pending.popleft(), submitted)
+            while pending:
+                yield from self._finish(*pending.popleft(), submitted)
+
+
+def write_scores(results, output):
+    for tweet_id, polarity, subjectivity in results:
+        output.write(json.dumps({"id": tweet_id, "polarity": polarity, "subjectivity": subjectivity}))
+        output.write("\n")
+
+
+def score_file(input_path, output_path=None, workers=None, chunk_size=CHUNK_SIZE, cache=None):
+    pipeline = SentimentPipeline(workers, chunk_size, cache)
+    output = open(output_path, "w") if output_path else sys.stdout
+    with open(input_path) as file_descriptor:
+        write_scores(pipeline.run(iter_tweets(file_descriptor)), output)
+    if output_path:
+        output.close()
+    return pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sentiment of tweets, live from the API or from a local file.")
+    subparsers = parser.add_subparsers(dest="command")
+    search_parser = subparsers.add_parser("search", help="Search the Twitter API.")
+    search_parser.add_argument("query", nargs="?", default="india")
+    score_parser = subparsers.add_parser("score", help="Score a local NDJSON file of tweets.")
+    score_parser.add_argument("--input", required=True)
+    score_parser.add_argument("--output", help="NDJSON scores, stdout by default.")
+    score_parser.add_argument("--workers", type=int, help="Worker processes, one per core by default.")
+    score_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    score_parser.add_argument("--cache", help="SQLite file keeping scores across runs.")
+    score_parser.add_argument("--cache-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                              help="Most texts kept in the cache.")
+    args = parser.parse_args()
 
-api = tweepy.API(auth)
+    if args.command == "score":
+        cache = SentimentCache(args.cache, args.cache_entries) if args.cache else None
+        pipeline = score_file(args.input, args.output, args.workers, args.chunk_size, cache)
+        print("{:,} tweets, {:,} distinct texts scored, {:,} from the cache".format(
+            pipeline.tweets, pipeline.scored, pipeline.cached), file=sys.stderr)
+        if cache is not None:
+            print("cache: {entries:,} entries, hit rate {hit_rate:.1%} over all runs".format(**cache.stats()),
+                  file=sys.stderr)
+            cache.close()
+    else:
+        search(getattr(args, "query", "india"))
 
-public_tweets = api.search('india')
 
-for tweet in public_tweets:
-    print(tweet.text)
-    analysis = TextBlob(tweet.text)
-    print(analysis.sentiment)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import my_requests
+
+#
+# Peak RSS and decode time of MyRequestClass.fetch_json for a large JSON
+# array served by a local HTTP server. Every mode runs in its own process so
+# the peak RSS of one mode does not hide the next one.
+#
+#   python bench_fetch_json.py --elements 2000000
+#
+
+MODES = ('json', 'orjson', 'stream')
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def write_payload(path, elements):
+    with open(path, 'w') as file_descriptor:
+        file_descriptor.write('[')
+        for i in range(elements):
+            if i:
+                file_descriptor.write(',')
+            json.dump({'id': i, 'userId': i % 100, 'title': 'todo number {}'.format(i),
+                       'completed': i % 3 == 0, 'tags': ['a', 'b', 'c']}, file_descriptor)
+        file_descriptor.write(']')
+
+
+def run_mode(mode, url):
+    """Runs inside the worker process, prints its measurements as JSON."""
+    client = my_requests.MyRequestClass()
+    started = time.perf_counter()
+    if mode == 'stream':
+        count = sum(1 for _ in client.fetch_json(url, stream=True))
+    else:
+        count = len(client.fetch_json(url, decoder=mode))
+    seconds = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    print(json.dumps({'mode': mode, 'elements': count, 'seconds': seconds, 'peak_rss_mb': peak_mb}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fetch_json decoding modes.')
+    parser.add_argument('--elements', type=int, default=500000)
+    parser.add_argument('--worker', nargs=2, metavar=('MODE', 'URL'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_mode(*args.worker)
+        return
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'todos.json')
+    write_payload(path, args.elements)
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/todos.json'.format(server.server_address[1])
+
+    print('payload: {} elements, {:.1f} MB'.format(args.elements, size_mb))
+    print('{:<8} {:>10} {:>14}'.format('mode', 'seconds', 'peak RSS MB'))
+    for mode in MODES:
+        if mode == 'orjson' and my_requests.orjson is None:
+            print('{:<8} {:>10}'.format(mode, 'n/a'))
+            continue
+        output = subprocess.check_output([sys.executable, __file__, '--worker', mode, url])
+        result = json.loads(output)
+        print('{mode:<8} {seconds:>10.2f} {peak_rss_mb:>14.1f}'.format(**result))
+
+    server.shutdown()
+    os.remove(path)
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,10 @@
+import asyncio
+import json
 import requests
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 import my_requests
 
@@ -12,14 +17,24 @@ def mocked_requests_get(*args, **kwargs):
         def __init__(self, json_data, status_code):
             self.json_data = json_data
             self.status_code = status_code
+            self.content = json.dumps(json_data).encode('utf-8')
 
         def json(self):
             return self.json_data
 
+        def iter_content(self, chunk_size=1):
+            for start in range(0, len(self.content), chunk_size):
+                yield self.content[start:start + chunk_size]
+
+        def close(self):
+            pass
+
     if args[0] == 'http://someurl.com/test.json':
         return MockResponse({"key1": "value1"}, 200)
     elif args[0] == 'http://someotherurl.com/anothertest.json':
         return MockResponse({"key2": "value2"}, 200)
+    elif args[0] == 'http://someurl.com/array.json':
+        return MockResponse([{"id": i, "title": "todo, [{}]".format(i)} for i in range(50)], 200)
 
     return MockResponse(None, 404)
 
@@ -48,6 +63,183 @@ class MyGreatClassTestCase(unittest.TestCase):
 
         self.assertEqual(len(mock_get.call_args_list), 3)
 
+    @mock.patch('my_requests.requests.get', side_effect=mocked_requests_get)
+    def test_fetch_decoders(self, mock_get):
+        mgc = my_requests.MyRequestClass()
+        expected = [{"id": i, "title": "todo, [{}]".format(i)} for i in range(50)]
+        self.assertEqual(mgc.fetch_json('http://someurl.com/array.json', decoder='json'), expected)
+        if my_requests.orjson is not None:
+            self.assertEqual(mgc.fetch_json('http://someurl.com/array.json', decoder='orjson'), expected)
+
+    @mock.patch('my_requests.STREAM_CHUNK_SIZE', 7)
+    @mock.patch('my_requests.requests.get', side_effect=mocked_requests_get)
+    def test_fetch_stream(self, mock_get):
+        mgc = my_requests.MyRequestClass()
+        elements = mgc.fetch_json('http://someurl.com/array.json', stream=True)
+
+        # Elements come one by one, even when they span several 7 byte chunks.
+        self.assertEqual(next(elements), {"id": 0, "title": "todo, [0]"})
+        self.assertEqual(len(list(elements)), 49)
+        self.assertIn(mock.call('http://someurl.com/array.json', stream=True), mock_get.call_args_list)
+
+        self.assertIsNone(mgc.fetch_json('http://nonexistenturl.com/cantfindme.json', stream=True))
+        with self.assertRaises(ValueError):
+            list(mgc.fetch_json('http://someurl.com/test.json', stream=True))
+
+    def test_stream_numbers_split_at_every_offset(self):
+        values = [1.5, 3e10, -0.25, 12345, 6.02e-23, 0]
+        payload = json.dumps(values).encode('utf-8')
+        for split in range(1, len(payload)):
+            chunks = [payload[:split], payload[split:]]
+            self.assertEqual(list(my_requests.iter_json_array(chunks)), values, split)
+
+    def test_stream_many_floats(self):
+        values = [i + 0.5 for i in range(300000)]
+        payload = json.dumps(values).encode('utf-8')
+        chunks = (payload[start:start + 64 * 1024] for start in range(0, len(payload), 64 * 1024))
+        self.assertEqual(list(my_requests.iter_json_array(chunks)), values)
+
+    @mock.patch('my_requests.requests.get', side_effect=mocked_requests_get)
+    def test_fetch_with_cache(self, mock_get):
+        class DictCache:
+            def __init__(self):
+                self.values = {}
+
+            def get_or_fetch(self, key, fetch):
+                if key not in self.values:
+                    self.values[key] = fetch()
+                return self.values[key]
+
+        mgc = my_requests.MyRequestClass(cache=DictCache())
+        for _ in range(3):
+            self.assertEqual(mgc.fetch_json('http://someurl.com/test.json'), {"key1": "value1"})
+            self.assertIsNone(mgc.fetch_json('http://nonexistenturl.com/cantfindme.json'))
+
+        # Only the first round goes to the network.
+        self.assertEqual(len(mock_get.call_args_list), 2)
+
+    def test_concurrent_fetches_share_one_request(self):
+        calls = []
+
+        def slow_get(url):
+            calls.append(url)
+            time.sleep(0.3)
+            return mocked_requests_get(url)
+
+        session = mock.Mock()
+        session.get.side_effect = slow_get
+        mgc = my_requests.MyRequestClass(session=session)
+        url = 'http://someurl.com/test.json'
+
+        async def coroutines():
+            return await asyncio.gather(*[mgc.fetch_json_async(url) for _ in range(10)])
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            threaded = [executor.submit(mgc.fetch_json, url) for _ in range(10)]
+            from_coroutines = asyncio.run(coroutines())
+            from_threads = [future.result() for future in threaded]
+
+        # 10 threads and 10 coroutines, one upstream request
+        self.assertEqual(from_threads + from_coroutines, [{"key1": "value1"}] * 20)
+        self.assertEqual(calls, [url])
+
+        # Once it is done, the next call makes a new request
+        mgc.fetch_json(url)
+        self.assertEqual(len(calls), 2)
+
+    def test_concurrent_fetches_share_errors(self):
+        def failing_get(url):
+            time.sleep(0.2)
+            raise requests.exceptions.ConnectionError()
+
+        session = mock.Mock()
+        session.get.side_effect = failing_get
+        mgc = my_requests.MyRequestClass(session=session)
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(mgc.fetch_json, 'http://someurl.com/test.json') for _ in range(5)]
+            for future in futures:
+                self.assertIsInstance(future.exception(), requests.exceptions.ConnectionError)
+        self.assertEqual(session.get.call_count, 1)
+
+    def test_fetch_many(self):
+        # A shared session stands in for the network, with the same answers as requests.get above.
+        session = mock.Mock()
+        session.get.side_effect = mocked_requests_get
+        mgc = my_requests.MyRequestClass(session=session)
+        urls = ['http://someotherurl.com/anothertest.json',
+                'http://nonexistenturl.com/cantfindme.json',
+                'http://someurl.com/test.json']
+
+        results = mgc.fetch_many(urls)
+
+        # Same order as the input, 404 is None like fetch_json.
+        self.assertEqual(results, [{"key2": "value2"}, None, {"key1": "value1"}])
+        self.assertEqual(session.get.call_count, 3)
+
+    @mock.patch('my_requests.requests.Session')
+    def test_fetch_many_uses_the_cache(self, session_class):
+        class DictCache:
+            def __init__(self, values):
+                self.values = values
+
+            def get_or_fetch(self, key, fetch):
+                if key not in self.values:
+                    self.values[key] = fetch()
+                return self.values[key]
+
+        session_class.return_value.get.side_effect = mocked_requests_get
+        mgc = my_requests.MyRequestClass(cache=DictCache({'http://someurl.com/test.json': b'{"key1": "value1"}'}))
+
+        results = mgc.fetch_many(['http://someurl.com/test.json'] * 3 + ['http://someotherurl.com/anothertest.json'])
+
+        self.assertEqual(results, [{"key1": "value1"}] * 3 + [{"key2": "value2"}])
+        # Only the URL missing from the cache goes to the network, through the batch session
+        self.assertEqual(session_class.return_value.get.call_count, 1)
+
+    def test_fetch_many_keeps_per_url_errors(self):
+        def flaky_get(url):
+            if 'slow' in url:
+                raise requests.exceptions.Timeout()
+            return mocked_requests_get(url)
+
+        session = mock.Mock()
+        session.get.side_effect = flaky_get
+        mgc = my_requests.MyRequestClass(session=session)
+
+        results = mgc.fetch_many(['http://someurl.com/test.json', 'http://slow.com/x.json'])
+        self.assertEqual(results[0], {"key1": "value1"})
+        self.assertIsInstance(results[1], requests.exceptions.Timeout)
+
+        with self.assertRaises(requests.exceptions.Timeout):
+            mgc.fetch_many(['http://someurl.com/test.json', 'http://slow.com/x.json'], return_exceptions=False)
+
+    def test_fetch_many_runs_concurrently_within_host_limit(self):
+        active = {'now': 0, 'max': 0}
+        lock = threading.Lock()
+
+        def slow_get(url):
+            with lock:
+                active['now'] += 1
+                active['max'] = max(active['max'], active['now'])
+            time.sleep(0.1)
+            with lock:
+                active['now'] -= 1
+            return mocked_requests_get('http://someurl.com/test.json')
+
+        session = mock.Mock()
+        session.get.side_effect = slow_get
+        mgc = my_requests.MyRequestClass(session=session)
+
+        started = time.perf_counter()
+        results = mgc.fetch_many(['http://samehost.com/{}'.format(i) for i in range(8)], per_host=4)
+        elapsed = time.perf_counter() - started
+
+        # 8 calls of 100ms with 4 at a time take about 200ms, not 800ms.
+        self.assertEqual(len(results), 8)
+        self.assertLessEqual(active['max'], 4)
+        self.assertLess(elapsed, 0.6)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,124 @@
+# Standard library imports...
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Third-party imports...
+import requests
+
+# Local imports...
+from project.http_client import CachingClient
+
+#
+# Benchmark for project.http_client.CachingClient against a local stub server.
+#
+# Compares a plain `requests.get` per call (what get_todos used to do) with
+# the pooled client without a TTL (every call is a conditional GET answered
+# with 304) and with a TTL (calls are served from memory). The stub server
+# counts the TCP connections and requests it receives.
+#
+#   python bench_todos.py --calls 500 --todos 200
+#
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, body):
+        super().__init__(address, StubHandler)
+        self.body = body
+        self.etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        self.connections = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.counter_lock = threading.Lock()
+
+    def reset(self):
+        with self.counter_lock:
+            self.connections = self.requests = self.not_modified = 0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep the connection alive
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.counter_lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.counter_lock:
+            self.server.requests += 1
+        if self.headers.get('If-None-Match') == self.server.etag:
+            with self.server.counter_lock:
+                self.server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', self.server.etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_todos(count):
+    return json.dumps([{'userId': i % 10, 'id': i, 'title': 'todo {}'.format(i), 'completed': i % 2 == 0}
+                       for i in range(count)]).encode('utf-8')
+
+
+def run(server, url, calls, get):
+    server.reset()
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        response = get(url)
+        response.json()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        'mean_ms': 1000 * sum(latencies) / len(latencies),
+        'p50_ms': 1000 * latencies[len(latencies) // 2],
+        'p99_ms': 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        'connections': server.connections,
+        'requests': server.requests,
+        'not_modified': server.not_modified,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the todos HTTP client against a local stub.')
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--todos', type=int, default=200, help='Todos in the stub payload.')
+    args = parser.parse_args()
+
+    server = StubServer(('127.0.0.1', 0), make_todos(args.todos))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/todos'.format(server.server_address[1])
+
+    scenarios = [
+        ('requests.get per call', requests.get),
+        ('pooled session, ttl=0 (304s)', CachingClient(ttl=0).get),
+        ('pooled session, ttl=60 (memory)', CachingClient(ttl=60).get),
+    ]
+    print('{:<34} {:>9} {:>9} {:>9} {:>6} {:>9} {:>6}'.format(
+        'scenario', 'mean ms', 'p50 ms', 'p99 ms', 'conns', 'requests', '304s'))
+    for name, get in scenarios:
+        result = run(server, url, args.calls, get)
+        print('{:<34} {mean_ms:>9.3f} {p50_ms:>9.3f} {p99_ms:>9.3f} {connections:>6} {requests:>9} {not_modified:>6}'.format(
+            name, **result))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
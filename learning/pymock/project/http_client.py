@@ -0,0 +1,153 @@
+# Standard library imports...
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Third-party imports...
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Local imports...
+try:
+    from project.response_cache import cache_key
+except ImportError:
+    from response_cache import cache_key
+
+# Default pool sizes, bump pool_maxsize when many threads share one client.
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 10
+
+# Seconds a cached response is served from memory before it is revalidated.
+DEFAULT_TTL = 60
+
+# Responses kept in memory, the least recently used ones are dropped first.
+DEFAULT_MAX_ENTRIES = 256
+
+
+class CachingClient(object):
+    """
+    A small HTTP client that keeps one pooled `requests.Session` alive and
+    caches successful GET responses.
+
+    Within `ttl` seconds a cached response is returned without touching the
+    network. After that the request is sent with `If-None-Match` /
+    `If-Modified-Since` taken from the cached `ETag` / `Last-Modified`, and a
+    `304 Not Modified` answer reuses the cached response. At most
+    `max_entries` responses are kept, least recently used first out.
+
+    With a `store` (a response_cache.ResponseCache) responses are kept on
+    disk instead, shared across processes and restarts, with the store's
+    TTL, LRU eviction and stale-while-revalidate behaviour.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE, session=None, store=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.store = store
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        self.session.close()
+
+    def get(self, url, **kwargs):
+        if self.store is not None:
+            return self._get_stored(url, **kwargs)
+
+        # Keyed like the store, the same URL with other params or headers is another response
+        key = cache_key(url, kwargs.get('headers'), params=kwargs.get('params'))
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry:
+                self._cache.move_to_end(key)
+            if entry and time.monotonic() - entry['stored_at'] < self.ttl:
+                self.hits += 1
+                return entry['response']
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self.session.get(url, headers=headers, **kwargs)
+
+        if entry and response.status_code == 304:
+            with self._lock:
+                self.revalidations += 1
+                entry['stored_at'] = time.monotonic()
+            return entry['response']
+
+        with self._lock:
+            self.misses += 1
+            if response.ok:
+                self._cache[key] = {
+                    'response': response,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'stored_at': time.monotonic(),
+                }
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return response
+
+    def _get_stored(self, url, **kwargs):
+        def fetch():
+            response = self.session.get(url, **kwargs)
+            if not response.ok:
+                raise NotCacheable(response)
+            return dump_response(response)
+
+        try:
+            key = cache_key(url, kwargs.get('headers'), params=kwargs.get('params'))
+            return load_response(self.store.get_or_fetch(key, fetch))
+        except NotCacheable as error:
+            return error.response
+
+
+class NotCacheable(Exception):
+    """Raised from a fetch so error responses reach the caller without being stored."""
+
+    def __init__(self, response):
+        super(NotCacheable, self).__init__(response.status_code)
+        self.response = response
+
+
+def dump_response(response):
+    """Serialize a response as one JSON header line followed by the raw body."""
+    header = {
+        'url': response.url,
+        'status_code': response.status_code,
+        'headers': dict(response.headers),
+        'encoding': response.encoding,
+    }
+    return json.dumps(header).encode('utf-8') + b'\n' + response.content
+
+
+def load_response(blob):
+    """Rebuild a `requests.Response` from dump_response's output."""
+    header, _, content = blob.partition(b'\n')
+    header = json.loads(header)
+    response = requests.Response()
+    response.url = header['url']
+    response.status_code = header['status_code']
+    response.headers = CaseInsensitiveDict(header['headers'])
+    response.encoding = header['encoding']
+    response._content = content
+    return response
@@ -0,0 +1,245 @@
+# Standard library imports...
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+# Defaults, all of them can be changed per cache.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 300
+DEFAULT_STALE_TTL = 3600
+
+# Hits only rewrite `last_access` when it is older than this (seconds), so a
+# hot entry does not turn every read into a write.
+ACCESS_RESOLUTION = 1.0
+
+# How long one refresher holds the claim on a stale entry before another
+# thread or process may try again.
+REFRESH_CLAIM = 30.0
+
+# Request headers that change the response and so are part of the key.
+VARY_HEADERS = ('Accept', 'Accept-Encoding', 'Authorization')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    last_access REAL NOT NULL,
+    refreshing_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+COUNTERS = ('hits', 'stale_hits', 'misses', 'evictions', 'refreshes', 'refresh_errors')
+
+
+def cache_key(url, headers=None, vary=VARY_HEADERS, params=None):
+    """
+    Key of a GET request: the URL, its query `params` (as passed to requests)
+    and the request headers the response varies on.
+    """
+    headers = {name.lower(): value for name, value in (headers or {}).items()}
+    parts = [url] + ['{}={}'.format(name.lower(), headers.get(name.lower(), '')) for name in sorted(vary)]
+    if params:
+        if not isinstance(params, (str, bytes)):
+            # Sorted, so the order of a dict or list of pairs doesn't change the key
+            items = params.items() if hasattr(params, 'items') else params
+            params = urlencode(sorted(items, key=str), doseq=True)
+        parts.append('params={}'.format(params))
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+class ResponseCache(object):
+    """
+    A persistent response cache in a SQLite file, safe to share between
+    threads and processes.
+
+    - Entries are fresh for `ttl` seconds and served directly.
+    - After that, and for up to `stale_ttl` more seconds, get_or_fetch serves
+      the stale entry at once and refreshes it in a background thread
+      (stale-while-revalidate). Only one thread or process refreshes a given
+      entry at a time.
+    - When the stored values exceed `max_bytes`, the least recently used
+      entries are evicted.
+    - Hit, miss, eviction and refresh counters are kept in the same file, so
+      they add up over every process using it (see `stats()`).
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, stale_ttl=DEFAULT_STALE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._local = threading.local()
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        # Counter increments not written to the file yet, flushed with the next write
+        self._pending = dict.fromkeys(COUNTERS, 0)
+        self._pending_lock = threading.Lock()
+        self._flushed_at = time.time()
+        self._connection().executescript(SCHEMA)
+        with self._transaction() as db:
+            db.executemany('INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)',
+                           [(name,) for name in COUNTERS])
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads, nor survive a fork
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def _count(self, name, amount=1):
+        with self._pending_lock:
+            self._pending[name] += amount
+
+    def _flush_counters(self, db):
+        with self._pending_lock:
+            pending = [(amount, name) for name, amount in self._pending.items() if amount]
+            self._pending = dict.fromkeys(COUNTERS, 0)
+            self._flushed_at = time.time()
+        db.executemany('UPDATE counters SET value = value + ? WHERE name = ?', pending)
+
+    def get(self, key):
+        """Return (value, state) where state is 'fresh', 'stale' or None for a miss."""
+        now = time.time()
+        db = self._connection()
+        row = db.execute('SELECT value, fresh_until, stale_until, last_access FROM entries WHERE key = ?',
+                         (key,)).fetchone()
+        if row is None or row[2] <= now:
+            self._count('misses')
+            return None, None
+        value, fresh_until, _, last_access = row
+        state = 'fresh' if fresh_until > now else 'stale'
+        self._count('hits' if state == 'fresh' else 'stale_hits')
+        if now - last_access > ACCESS_RESOLUTION or now - self._flushed_at > ACCESS_RESOLUTION:
+            with self._transaction() as db:
+                db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+                self._flush_counters(db)
+        return value, state
+
+    def set(self, key, value, ttl=None, stale_ttl=None):
+        """Store `value` (bytes), then evict least recently used entries above max_bytes."""
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        with self._transaction() as db:
+            db.execute('INSERT OR REPLACE INTO entries '
+                       '(key, value, size, stored_at, fresh_until, stale_until, last_access, refreshing_until) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?, 0)',
+                       (key, value, len(value), now, now + ttl, now + ttl + stale_ttl, now))
+            self._evict(db)
+            self._flush_counters(db)
+
+    def _evict(self, db):
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in db.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        self._count('evictions', evicted)
+
+    def delete(self, key):
+        with self._transaction() as db:
+            db.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def get_or_fetch(self, key, fetch, ttl=None, stale_ttl=None):
+        """
+        Return the cached value for `key`, calling `fetch()` (which returns bytes) when needed.
+        Stale entries are returned at once and refreshed in the background.
+        """
+        value, state = self.get(key)
+        if state == 'fresh':
+            return value
+        if state == 'stale':
+            self._refresh_in_background(key, fetch, ttl, stale_ttl)
+            return value
+
+        value = fetch()
+        self.set(key, value, ttl, stale_ttl)
+        return value
+
+    def _claim_refresh(self, key):
+        # Conditional update, so only one process wins the claim on this entry
+        now = time.time()
+        with self._transaction() as db:
+            claimed = db.execute('UPDATE entries SET refreshing_until = ? WHERE key = ? AND refreshing_until < ?',
+                                 (now + REFRESH_CLAIM, key, now)).rowcount
+        return claimed == 1
+
+    def _refresh_in_background(self, key, fetch, ttl, stale_ttl):
+        with self._refreshing_lock:
+            if key in self._refreshing or not self._claim_refresh(key):
+                return
+            self._refreshing.add(key)
+        thread = threading.Thread(target=self._refresh, args=(key, fetch, ttl, stale_ttl), daemon=True)
+        thread.start()
+        return thread
+
+    def _refresh(self, key, fetch, ttl, stale_ttl):
+        try:
+            value = fetch()
+        except Exception:
+            # Keep serving the stale entry, the next stale hit tries again once the claim expires
+            self._count('refresh_errors')
+        else:
+            self._count('refreshes')
+            self.set(key, value, ttl, stale_ttl)
+        finally:
+            with self._refreshing_lock:
+                self._refreshing.discard(key)
+
+    def stats(self):
+        """Counters plus the current number of entries and stored bytes."""
+        with self._transaction() as db:
+            self._flush_counters(db)
+        stats = dict(db.execute('SELECT name, value FROM counters').fetchall())
+        stats['entries'], stats['bytes'] = db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['stale_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            with self._transaction() as db:
+                self._flush_counters(db)
+            db.close()
+            self._local.db = None
+
+
+class _Transaction(object):
+    """`BEGIN IMMEDIATE` ... `COMMIT`, so concurrent writers queue on the file lock instead of failing."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
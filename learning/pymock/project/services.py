@@ -1,23 +1,91 @@
 # Standard library imports...
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 try:
     from urllib.parse import urljoin
 except ImportError:
     from urlparse import urljoin
 
-# Third-party imports...
-import requests
-
+# Local imports...
 try:
     from project.constants import BASE_URL
+    from project.http_client import CachingClient
+    from project.response_cache import ResponseCache
+    from project.singleflight import SingleFlight
 except ImportError:
     BASE_URL = 'http://jsonplaceholder.typicode.com'
+    from http_client import CachingClient
+    from response_cache import ResponseCache
+    from singleflight import SingleFlight
 
 TODOS_URL = urljoin(BASE_URL, 'todos')
 
+# Items requested per page by iter_todos
+PAGE_SIZE = 50
 
-def get_todos():
-    response = requests.get(TODOS_URL)
+# Set to a file path to keep the todos in a persistent on-disk cache,
+# shared by every process and kept across restarts.
+CACHE_PATH = os.environ.get('TODOS_CACHE_PATH')
+
+# One client for the module, so every call reuses the same keep-alive
+# connections and the cached todos (see http_client.CachingClient).
+client = CachingClient(store=ResponseCache(CACHE_PATH) if CACHE_PATH else None)
+
+# Concurrent callers (threads or coroutines) share one in-flight request.
+flight = SingleFlight()
+
+
+def _fetch_todos():
+    response = client.get(TODOS_URL)
     if response.ok:
         return response
     else:
         return None
+
+
+def get_todos():
+    return flight.do(TODOS_URL, _fetch_todos)
+
+
+async def get_todos_async():
+    return await flight.do_async(TODOS_URL, _fetch_todos)
+
+
+def _fetch_page(url, start, limit):
+    # Straight through the pooled session, pages are read once and must not
+    # pile up in the client's response cache
+    response = client.session.get(url, params={'_start': start, '_limit': limit})
+    response.raise_for_status()
+    return response.json()
+
+
+def iter_todos(page_size=PAGE_SIZE, prefetch=True, url=TODOS_URL):
+    """
+    Yield todos one by one, fetching them a page at a time with `_start`/`_limit`.
+
+    While the caller works through a page, the next one is already being
+    fetched in the background (unless `prefetch` is off). Iteration stops at
+    the first short page, and when the caller stops iterating no further
+    pages are requested.
+    """
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    start = 0
+    pending = executor.submit(_fetch_page, url, start, page_size) if prefetch else None
+    try:
+        while True:
+            page = pending.result() if prefetch else _fetch_page(url, start, page_size)
+            pending = None
+            last_page = len(page) < page_size
+            if prefetch and not last_page:
+                pending = executor.submit(_fetch_page, url, start + page_size, page_size)
+            for todo in page:
+                yield todo
+            if last_page:
+                return
+            start += page_size
+    finally:
+        if pending is not None:
+            pending.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
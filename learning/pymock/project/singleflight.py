@@ -0,0 +1,61 @@
+# Standard library imports...
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls for the same key into one.
+
+    The first caller for a key runs the function, every caller that arrives
+    while it is in flight waits for that same result (or exception) instead of
+    running it again. Threaded callers use `do`, asyncio callers `do_async`;
+    both share the same in-flight calls, so a thread and a coroutine asking for
+    the same key at the same time also end up with one call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # Number of callers that got a shared result instead of making a call
+        self.shared = 0
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _run(self, key, future, fn):
+        try:
+            result = fn()
+        except BaseException as error:
+            self._forget(key)
+            future.set_exception(error)
+        else:
+            self._forget(key)
+            future.set_result(result)
+
+    def _forget(self, key):
+        # Drop the call before publishing its result, later callers start a fresh one
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def do(self, key, fn):
+        """Call `fn()` unless a call for `key` is already in flight, and return its result."""
+        future, leader = self._join(key)
+        if leader:
+            self._run(key, future, fn)
+        return future.result()
+
+    async def do_async(self, key, fn, executor=None):
+        """Like `do` for coroutines, `fn` is a blocking callable that runs in `executor`."""
+        future, leader = self._join(key)
+        if leader:
+            asyncio.get_running_loop().run_in_executor(executor, self._run, key, future, fn)
+        # Shielded, so a caller that is cancelled does not cancel the call for the others
+        return await asyncio.shield(asyncio.wrap_future(future))
@@ -0,0 +1,84 @@
+# Standard library imports...
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Third-party imports...
+import pytest
+
+# Local imports...
+from project import services
+
+TOTAL_TODOS = 95
+
+
+class TodosHandler(BaseHTTPRequestHandler):
+    # A local stand-in for the todos endpoint, with _start/_limit paging
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        start = int(query.get('_start', ['0'])[0])
+        limit = int(query.get('_limit', [str(TOTAL_TODOS)])[0])
+        self.server.requests.append((start, limit))
+        time.sleep(self.server.delay)
+        todos = [{'id': i + 1, 'title': 'todo {}'.format(i + 1)}
+                 for i in range(start, min(start + limit, TOTAL_TODOS))]
+        body = json.dumps(todos).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def todos_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TodosHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.delay = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, 'http://127.0.0.1:{}/todos'.format(server.server_address[1])
+    server.shutdown()
+
+
+def test_iterates_every_page(todos_url):
+    server, url = todos_url
+    cached = len(services.client._cache)
+    todos = list(services.iter_todos(page_size=10, url=url))
+
+    assert [todo['id'] for todo in todos] == list(range(1, TOTAL_TODOS + 1))
+    assert [start for start, _ in server.requests] == list(range(0, 100, 10))
+    # Pages are not kept in the client's response cache
+    assert len(services.client._cache) == cached
+
+
+def test_stops_fetching_when_the_consumer_stops(todos_url):
+    server, url = todos_url
+    todos = services.iter_todos(page_size=10, url=url)
+    first = [next(todos) for _ in range(3)]
+    todos.close()
+    time.sleep(0.1)
+
+    assert [todo['id'] for todo in first] == [1, 2, 3]
+    # The first page and at most the prefetched second one
+    assert len(server.requests) <= 2
+
+
+def test_next_page_is_prefetched_while_the_current_one_is_consumed(todos_url):
+    server, url = todos_url
+    server.delay = 0.2
+    started = time.perf_counter()
+    for todo in services.iter_todos(page_size=20, url=url):
+        # Work per item that overlaps with the next page's request
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    # 5 pages of 0.2s plus 95 x 0.01s of work would take ~1.95s without prefetching
+    assert elapsed < 1.6
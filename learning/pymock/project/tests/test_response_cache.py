@@ -0,0 +1,111 @@
+# Standard library imports...
+import multiprocessing
+import time
+from unittest.mock import Mock, patch
+
+# Local imports...
+from project import response_cache
+from project.http_client import CachingClient
+from project.response_cache import ResponseCache, cache_key
+
+
+def test_miss_then_hit(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'))
+    fetch = Mock(return_value=b'[1, 2, 3]')
+
+    assert cache.get_or_fetch('todos', fetch) == b'[1, 2, 3]'
+    assert cache.get_or_fetch('todos', fetch) == b'[1, 2, 3]'
+
+    assert fetch.call_count == 1
+    stats = cache.stats()
+    assert (stats['misses'], stats['hits'], stats['entries']) == (1, 1, 1)
+
+
+def test_entries_survive_a_new_cache_instance(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    ResponseCache(path).set('todos', b'cached')
+
+    # A new instance, as after a process restart
+    assert ResponseCache(path).get_or_fetch('todos', Mock(side_effect=AssertionError)) == b'cached'
+
+
+def test_stale_entry_is_served_and_refreshed_in_background(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'), ttl=0, stale_ttl=60)
+    cache.set('todos', b'old')
+
+    refreshed = []
+
+    def fetch():
+        refreshed.append(True)
+        return b'new'
+
+    # The stale value comes back right away, the refresh runs behind it
+    assert cache.get_or_fetch('todos', fetch) == b'old'
+    deadline = time.time() + 5
+    while cache.get('todos')[0] != b'new' and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert cache.get('todos')[0] == b'new'
+    assert refreshed == [True]
+    assert cache.stats()['refreshes'] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'), max_bytes=25)
+    with patch.object(response_cache, 'ACCESS_RESOLUTION', 0):
+        cache.set('a', b'x' * 10)
+        time.sleep(0.01)
+        cache.set('b', b'x' * 10)
+        time.sleep(0.01)
+        cache.get('a')
+        time.sleep(0.01)
+        cache.set('c', b'x' * 10)
+
+    assert cache.get('a')[1] == 'fresh'
+    assert cache.get('b') == (None, None)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_cache_key_varies_on_relevant_headers_only():
+    url = 'http://localhost/todos'
+    assert cache_key(url) == cache_key(url, {'User-Agent': 'x'})
+    assert cache_key(url) != cache_key(url, {'Accept': 'application/xml'})
+    assert cache_key(url, params={'a': 1, 'b': 2}) == cache_key(url, params=[('b', 2), ('a', 1)])
+    assert cache_key(url, params={'a': 1}) != cache_key(url, params={'a': 2})
+
+
+def _write_entries(path, worker):
+    cache = ResponseCache(path)
+    for i in range(50):
+        cache.get_or_fetch('key-{}'.format(i % 10), lambda: 'worker-{}'.format(worker).encode('utf-8'))
+    cache.close()
+
+
+def test_concurrent_processes(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    ResponseCache(path)
+    processes = [multiprocessing.Process(target=_write_entries, args=(path, i)) for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert all(process.exitcode == 0 for process in processes)
+    stats = ResponseCache(path).stats()
+    assert stats['entries'] == 10
+    assert stats['hits'] + stats['misses'] == 200
+
+
+def test_client_with_store_rebuilds_responses(tmp_path):
+    session = Mock()
+    session.get.return_value = Mock(ok=True, status_code=200, url='http://localhost/todos',
+                                    headers={'Content-Type': 'application/json'},
+                                    encoding='utf-8', content=b'[{"id": 1}]')
+    client = CachingClient(session=session, store=ResponseCache(str(tmp_path / 'cache.db')))
+
+    client.get('http://localhost/todos')
+    response = client.get('http://localhost/todos')
+
+    assert response.json() == [{'id': 1}]
+    assert response.headers['content-type'] == 'application/json'
+    assert session.get.call_count == 1
@@ -0,0 +1,105 @@
+# Standard library imports...
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+# Third-party imports...
+import pytest
+
+# Local imports...
+from project import services
+from project.singleflight import SingleFlight
+
+CALLERS = 20
+
+
+def slow_upstream(calls, result='todos', error=None, delay=0.2):
+    # Stands in for the network, slow enough for every caller to pile up behind it
+    def fetch(*args, **kwargs):
+        calls.append(args)
+        time.sleep(delay)
+        if error:
+            raise error
+        return result
+    return fetch
+
+
+def test_threaded_callers_share_one_call():
+    flight, calls = SingleFlight(), []
+    fetch = slow_upstream(calls)
+    barrier = threading.Barrier(CALLERS)
+
+    def caller():
+        barrier.wait()
+        return flight.do('todos', fetch)
+
+    with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+        results = list(executor.map(lambda _: caller(), range(CALLERS)))
+
+    assert results == ['todos'] * CALLERS
+    assert len(calls) == 1
+    assert flight.shared == CALLERS - 1
+
+
+def test_errors_are_shared_too():
+    flight, calls = SingleFlight(), []
+    fetch = slow_upstream(calls, error=ValueError('upstream down'))
+
+    def caller():
+        with pytest.raises(ValueError):
+            flight.do('todos', fetch)
+
+    threads = [threading.Thread(target=caller) for _ in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+
+
+def test_asyncio_callers_share_one_call():
+    flight, calls = SingleFlight(), []
+    fetch = slow_upstream(calls)
+
+    async def main():
+        return await asyncio.gather(*[flight.do_async('todos', fetch) for _ in range(CALLERS)])
+
+    assert asyncio.run(main()) == ['todos'] * CALLERS
+    assert len(calls) == 1
+
+
+def test_call_after_completion_is_not_coalesced():
+    flight, calls = SingleFlight(), []
+    fetch = slow_upstream(calls)
+    flight.do('todos', fetch)
+    flight.do('todos', fetch)
+    assert len(calls) == 2
+
+
+def test_get_todos_sends_one_upstream_request_for_concurrent_callers():
+    services.client.clear()
+    calls = []
+    upstream = slow_upstream(calls, result=FakeResponse(), delay=0.5)
+    with patch.object(services.client.session, 'get', side_effect=upstream):
+        with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+            threaded = [executor.submit(services.get_todos) for _ in range(CALLERS)]
+
+            async def main():
+                return await asyncio.gather(*[services.get_todos_async() for _ in range(CALLERS)])
+
+            coroutines = asyncio.run(main())
+            threaded = [future.result() for future in threaded]
+    services.client.clear()
+
+    # Threads and coroutines all joined the same in-flight request
+    assert all(response is not None for response in threaded + coroutines)
+    assert len(calls) == 1
+
+
+class FakeResponse(object):
+    ok = True
+    status_code = 200
+    headers = {}
@@ -2,11 +2,15 @@
 from unittest.mock import Mock, patch
 
 # Local imports...
+from project import services
+from project.http_client import CachingClient
 from project.services import get_todos
 
 
-@patch('project.services.requests.get')
+@patch('project.services.client.session.get')
 def test_getting_todos(mock_get):
+    services.client.clear()
+
     # Configure the mock to return a response with an OK status code.
     mock_get.return_value.ok = True
 
@@ -15,3 +19,66 @@ def test_getting_todos(mock_get):
 
     # If the request is sent successfully, then I expect a response to be returned.
     assert response is not None, "Response should not be None."
+
+
+def test_cached_response_is_served_within_ttl():
+    session = Mock()
+    session.get.return_value.ok = True
+    client = CachingClient(ttl=60, session=session)
+
+    first = client.get('http://localhost/todos')
+    second = client.get('http://localhost/todos')
+
+    # The second call is an in-memory hit, only one request goes out.
+    assert first is second
+    assert session.get.call_count == 1
+    assert client.hits == 1
+
+
+def test_expired_entry_is_revalidated_with_etag():
+    session = Mock()
+    ok_response = Mock(ok=True, status_code=200, headers={'ETag': '"v1"'})
+    not_modified = Mock(ok=False, status_code=304, headers={})
+    session.get.side_effect = [ok_response, not_modified]
+    client = CachingClient(ttl=0, session=session)
+
+    client.get('http://localhost/todos')
+    response = client.get('http://localhost/todos')
+
+    # A 304 answer reuses the cached body.
+    assert response is ok_response
+    assert session.get.call_args_list[1][1]['headers'] == {'If-None-Match': '"v1"'}
+    assert client.revalidations == 1
+
+
+def test_cache_is_keyed_on_params_and_vary_headers():
+    session = Mock()
+    session.get.return_value.ok = True
+    client = CachingClient(ttl=60, session=session)
+
+    client.get('http://localhost/todos', params={'page': 1})
+    client.get('http://localhost/todos', params={'page': 2})
+    client.get('http://localhost/todos', params={'page': 1}, headers={'Accept': 'application/xml'})
+    client.get('http://localhost/todos', params=[('page', 1)])
+
+    # Three different requests, the last one is the first again
+    assert session.get.call_count == 3
+    assert client.hits == 1
+
+
+def test_least_recently_used_responses_are_dropped():
+    session = Mock()
+    session.get.return_value.ok = True
+    client = CachingClient(ttl=60, session=session, max_entries=2)
+
+    client.get('http://localhost/todos/1')
+    client.get('http://localhost/todos/2')
+    client.get('http://localhost/todos/1')
+    client.get('http://localhost/todos/3')
+
+    # todos/2 was the least recently used, todos/1 is still served from memory
+    assert len(client._cache) == 2
+    client.get('http://localhost/todos/1')
+    client.get('http://localhost/todos/2')
+    assert session.get.call_count == 4
+    assert client.hits == 2
@@ -0,0 +1,315 @@
+import argparse
+import base64
+import datetime
+import gzip
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.cloud.datastore.query import PropertyFilter
+
+#
+# Dump a Datastore kind to local files, reading key ranges in parallel.
+#
+# A single `query.fetch()` walks the whole kind with one cursor. Here the kind
+# is split into key ranges first: a keys-only query ordered by the reserved
+# `__scatter__` property returns a small random sample of keys, and every
+# `OVERSAMPLING`-th sampled key becomes a range boundary (the same approach
+# the Datastore query splitters use). Each range is then fetched by its own
+# worker thread and written to its own part file, through a writer that only
+# buffers `batch_rows` entities, so memory stays flat whatever the kind size.
+#
+#   python ds_kind_dump.py --project my-project --kind TestData --shards 32 --workers 16 \
+#       --format parquet --output /tmp/TestData
+#
+# Projections (--projection name,age) need a matching composite index, like
+# any Datastore projection query.
+#
+
+OVERSAMPLING = 32
+BATCH_ROWS = 1000
+FORMATS = ("ndjson", "parquet")
+
+
+def key_order(key):
+    """Sort key matching Datastore key order: path elements in turn, ids before names."""
+    order = []
+    for index in range(0, len(key.flat_path), 2):
+        kind = key.flat_path[index]
+        id_or_name = key.flat_path[index + 1] if index + 1 < len(key.flat_path) else None
+        order.append((kind, isinstance(id_or_name, str), id_or_name))
+    return order
+
+
+def split_points(client, kind, shards, namespace=None):
+    """Up to `shards - 1` keys splitting the kind into ranges of about the same size."""
+    if shards <= 1:
+        return []
+    query = client.query(kind=kind, namespace=namespace, order=["__scatter__"])
+    query.keys_only()
+    sample = sorted((entity.key for entity in query.fetch(limit=shards * OVERSAMPLING)), key=key_order)
+    if not sample:
+        return []
+    step = len(sample) / shards
+    points = []
+    for shard in range(1, shards):
+        point = sample[min(int(round(shard * step)), len(sample) - 1)]
+        if not points or key_order(point) > key_order(points[-1]):
+            points.append(point)
+    return points
+
+
+def key_ranges(points):
+    """[(None, p1), (p1, p2), ..., (pn, None)], lower bound included, upper bound excluded."""
+    bounds = [None] + list(points) + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def fetch_range(client, kind, start, end, namespace=None, projection=()):
+    query = client.query(kind=kind, namespace=namespace, projection=list(projection), order=["__key__"])
+    if start is not None:
+        query.add_filter(filter=PropertyFilter("__key__", ">=", start))
+    if end is not None:
+        query.add_filter(filter=PropertyFilter("__key__", "<", end))
+    # The client fetches pages lazily as the iterator is consumed
+    return query.fetch()
+
+
+def entity_row(entity):
+    """Entity as a flat dict, the key path in `__key__`."""
+    row = {"__key__": "/".join(str(part) for part in entity.key.flat_path)}
+    row.update(entity)
+    return row
+
+
+def _plain(value):
+    # Values json can't write as is
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if hasattr(value, "flat_path"):
+        return "/".join(str(part) for part in value.flat_path)
+    if hasattr(value, "latitude"):
+        return {"latitude": value.latitude, "longitude": value.longitude}
+    return str(value)
+
+
+class NDJSONWriter(object):
+    """Gzipped newline delimited JSON, written through a buffer of `batch_rows` lines."""
+
+    extension = ".ndjson.gz"
+
+    def __init__(self, path, batch_rows=BATCH_ROWS):
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.batch_rows = batch_rows
+        self.buffer = []
+
+    def write(self, row):
+        self.buffer.append(json.dumps(row, default=_plain))
+        if len(self.buffer) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write("\n".join(self.buffer) + "\n")
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class ParquetWriter(object):
+    """
+    Parquet, one row group per `batch_rows` entities. Entities of a kind don't
+    share a schema: a property can be null in the first entities and set later,
+    or appear only in later ones. So every batch is spilled to a temporary
+    Arrow file as it fills (a new one whenever the inferred schema changes) and
+    `close` writes them out under the union of all their schemas. Memory stays
+    at one batch. No file is written for an empty range.
+    """
+
+    extension = ".parquet"
+
+    def __init__(self, path, batch_rows=BATCH_ROWS):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.batch_rows = batch_rows
+        self.buffer = []
+        self.spills = []
+        self.spill = None
+
+    def write(self, row):
+        self.buffer.append({name: _parquet_value(value) for name, value in row.items()})
+        if len(self.buffer) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        table = batch_table(self.pa, self.buffer)
+        if self.spill is None or not table.schema.equals(self.spills[-1][1]):
+            self._close_spill()
+            spill_path = "{}.spill-{:05d}".format(self.path, len(self.spills))
+            self.spill = self.pa.ipc.new_file(spill_path, table.schema)
+            self.spills.append((spill_path, table.schema))
+        self.spill.write_table(table)
+        self.buffer = []
+
+    def _close_spill(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+    def close(self):
+        self.flush()
+        self._close_spill()
+        if not self.spills:
+            return
+        schema = unify_schemas(self.pa, [schema for _, schema in self.spills])
+        with self.pq.ParquetWriter(self.path, schema, compression="snappy") as writer:
+            for spill_path, _ in self.spills:
+                with self.pa.memory_map(spill_path) as source:
+                    reader = self.pa.ipc.open_file(source)
+                    for index in range(reader.num_record_batches):
+                        batch = self.pa.Table.from_batches([reader.get_batch(index)])
+                        writer.write_table(conform(self.pa, batch, schema))
+                os.remove(spill_path)
+
+
+def batch_table(pa, rows):
+    """
+    `rows` as a table with every property seen in them. A property with
+    incompatible types within the batch becomes a string, as in unify_schemas.
+    """
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    columns = []
+    for name in names:
+        values = [row.get(name) for row in rows]
+        try:
+            columns.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            columns.append(pa.array([_string_value(value) for value in values], pa.string()))
+    return pa.Table.from_arrays(columns, names=names)
+
+
+def unify_schemas(pa, schemas):
+    """
+    One schema holding every field of `schemas`. Types are promoted where Arrow
+    can (null to anything, int to float); a property with incompatible types in
+    different entities becomes a string, with the values that aren't strings
+    JSON encoded.
+    """
+    fields = {}
+    for schema in schemas:
+        for field in schema:
+            fields.setdefault(field.name, []).append(field)
+    unified = []
+    for name, candidates in fields.items():
+        try:
+            field = pa.unify_schemas([pa.schema([field]) for field in candidates],
+                                     promote_options="permissive").field(name)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            field = pa.field(name, pa.string())
+        unified.append(field)
+    return pa.schema(unified)
+
+
+def conform(pa, table, schema):
+    """`table` with the columns of `schema`, in its order and types, missing ones null."""
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(table.num_rows, field.type))
+            continue
+        column = table.column(field.name)
+        if column.type.equals(field.type):
+            columns.append(column)
+        elif field.type.equals(pa.string()) and not pa.types.is_string(column.type):
+            columns.append(pa.array([_string_value(value) for value in column.to_pylist()], pa.string()))
+        else:
+            columns.append(column.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _string_value(value):
+    # Strings stay as they are, other values are JSON encoded
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, default=_plain)
+
+
+def _parquet_value(value):
+    if hasattr(value, "flat_path") or hasattr(value, "latitude"):
+        return _plain(value)
+    return value
+
+
+WRITERS = {"ndjson": NDJSONWriter, "parquet": ParquetWriter}
+
+
+def dump_range(client, kind, start, end, path, writer_class, namespace=None, projection=(), batch_rows=BATCH_ROWS):
+    """Write one key range to `path`, returns (entities, seconds)."""
+    started = time.perf_counter()
+    writer = writer_class(path, batch_rows)
+    count = 0
+    try:
+        for entity in fetch_range(client, kind, start, end, namespace, projection):
+            writer.write(entity_row(entity))
+            count += 1
+    finally:
+        writer.close()
+    return count, time.perf_counter() - started
+
+
+def dump_kind(client, kind, output, shards=8, workers=8, output_format="ndjson", namespace=None, projection=(),
+              batch_rows=BATCH_ROWS):
+    """
+    Dump `kind` into `output`/part-NNNNN files, one per key range, fetched by
+    `workers` threads. Returns one (path, entities, seconds) per range.
+    """
+    writer_class = WRITERS[output_format]
+    os.makedirs(output, exist_ok=True)
+    ranges = key_ranges(split_points(client, kind, shards, namespace))
+    paths = [os.path.join(output, "part-{:05d}{}".format(index, writer_class.extension))
+             for index in range(len(ranges))]
+    with ThreadPoolExecutor(workers) as pool:
+        futures = [pool.submit(dump_range, client, kind, start, end, path, writer_class, namespace, projection,
+                               batch_rows)
+                   for (start, end), path in zip(ranges, paths)]
+        return [(path,) + future.result() for path, future in zip(paths, futures)]
+
+
+def main():
+    from google.cloud import datastore
+
+    parser = argparse.ArgumentParser(description="Dump a Datastore kind to local NDJSON or Parquet files.")
+    parser.add_argument("--project")
+    parser.add_argument("--namespace")
+    parser.add_argument("--kind", required=True)
+    parser.add_argument("--output", required=True, help="Directory for the part files.")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--shards", type=int, default=8, help="Key ranges the kind is split in.")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--projection", help="Comma separated properties, all by default.")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    args = parser.parse_args()
+
+    client = datastore.Client(project=args.project, namespace=args.namespace)
+    started = time.perf_counter()
+    results = dump_kind(client, args.kind, args.output, args.shards, args.workers, args.format, args.namespace,
+                        args.projection.split(",") if args.projection else (), args.batch_rows)
+    seconds = time.perf_counter() - started
+    total = sum(count for _, count, _ in results)
+    for path, count, range_seconds in results:
+        print("{}: {} entities in {:.1f}s".format(path, count, range_seconds))
+    print("{} entities in {:.1f}s, {:.0f} entities/s".format(total, seconds, total / seconds if seconds else 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import datetime
+import json
+import math
+import random
+import statistics
+import string
+
+from google.cloud.datastore.query import PropertyFilter
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+#
+# Size and cost profiler for Datastore kinds and Firestore collections.
+#
+# Rather than reading everything, the profiler reads `windows` short runs of
+# `window` consecutive documents, each starting at a random point of the key
+# space (auto-allocated Datastore ids and Firestore auto ids are spread
+# uniformly over it). How far a run has to go to collect its documents gives
+# an estimate of the total count, and the documents themselves give the size
+# distribution, property presence and cardinality, and index entries. Every
+# estimate comes with a 95% confidence interval over the runs.
+#
+# The count assumes auto-allocated ids; for kinds keyed by name only the size
+# and property estimates hold.
+#
+# Sizes follow the storage size rules of Firestore, which Datastore mode
+# shares: https://cloud.google.com/firestore/docs/storage-size
+#
+#   python ds_profiler.py datastore --kind TestData --windows 50 --window 20
+#   python ds_profiler.py firestore --collection TestData
+#
+
+WINDOWS = 50
+WINDOW = 20
+Z_95 = 1.96
+
+# Scattered auto-allocated Datastore ids fall in (2**52, 2**52 + 2**51]
+DATASTORE_ID_START = 2 ** 52
+DATASTORE_ID_SPAN = 2 ** 51
+
+# Firestore auto ids: 20 characters out of these 62
+FIRESTORE_ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+FIRESTORE_ID_LENGTH = 20
+
+# Fixed overheads from the storage size rules
+DOCUMENT_OVERHEAD = 32
+INDEX_ENTRY_OVERHEAD = 32
+
+
+def value_size(value):
+    """Storage size of one value."""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime.datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(len(str(name).encode("utf-8")) + 1 + value_size(item) for name, item in value.items())
+    if hasattr(value, "latitude"):
+        return 16
+    if hasattr(value, "flat_path"):
+        return name_size(value.flat_path)
+    if hasattr(value, "path"):
+        return name_size(value.path.split("/"))
+    return len(str(value).encode("utf-8")) + 1
+
+
+def name_size(path):
+    """Size of a document name / key from its path elements."""
+    return sum(8 if isinstance(part, int) else len(str(part).encode("utf-8")) + 1 for part in path) + 16
+
+
+def document_size(path, data):
+    return name_size(path) + sum(len(name.encode("utf-8")) + 1 + value_size(value)
+                                 for name, value in data.items()) + DOCUMENT_OVERHEAD
+
+
+def index_entries(path, data, excluded=()):
+    """
+    (entries, bytes) of the built-in single-field indexes: an ascending and a
+    descending entry per indexed value, list values index each element.
+    """
+    entries = size = 0
+    base = name_size(path) + INDEX_ENTRY_OVERHEAD
+    for name, value in data.items():
+        if name in excluded:
+            continue
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            entries += 2
+            size += 2 * (base + len(name.encode("utf-8")) + 1 + value_size(item))
+    return entries, size
+
+
+def interval(values):
+    """(mean, low, high) of a 95% normal confidence interval for the mean of `values`."""
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, mean, mean
+    margin = Z_95 * statistics.stdev(values) / math.sqrt(len(values))
+    return mean, mean - margin, mean + margin
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def chao1(counts):
+    """Estimated number of distinct values from how often each was seen in the sample."""
+    seen_once = sum(1 for count in counts.values() if count == 1)
+    seen_twice = sum(1 for count in counts.values() if count == 2)
+    if seen_twice == 0:
+        return len(counts) + seen_once * (seen_once - 1) / 2
+    return len(counts) + seen_once ** 2 / (2 * seen_twice)
+
+
+class DatastoreSampler(object):
+    """Runs of consecutive entities of a kind from random points of the numeric id space."""
+
+    def __init__(self, client, kind, namespace=None, id_start=DATASTORE_ID_START, id_span=DATASTORE_ID_SPAN):
+        self.client = client
+        self.kind = kind
+        self.namespace = namespace
+        # Ids in (id_start, id_start + id_span]
+        self.id_start = id_start
+        self.id_span = id_span
+
+    def run(self, start, size):
+        """(documents, share of the key space covered); documents are (path, properties)."""
+        query = self.client.query(kind=self.kind, namespace=self.namespace, order=["__key__"])
+        query.add_filter(filter=PropertyFilter("__key__", ">=", self.client.key(self.kind, start)))
+        entities = list(query.fetch(limit=size))
+        documents = [(entity.key.flat_path, dict(entity)) for entity in entities]
+        if len(entities) < size or not isinstance(entities[-1].key.id_or_name, int):
+            # Reached the end of the numeric ids
+            return documents, (self.id_start + self.id_span - start + 1) / self.id_span
+        return documents, (entities[-1].key.id_or_name - start + 1) / self.id_span
+
+    def random_start(self, rng):
+        return rng.randint(self.id_start + 1, self.id_start + self.id_span)
+
+
+class FirestoreSampler(object):
+    """Runs of consecutive documents of a collection from random points of the auto id space."""
+
+    def __init__(self, client, collection):
+        self.client = client
+        self.collection = client.collection(collection)
+        # The collection id is part of every document name, and so of its size
+        self.collection_id = self.collection.id
+
+    @staticmethod
+    def position(document_id):
+        """Where an auto id lies in [0, 1) of the id space."""
+        position, scale = 0.0, 1.0
+        for char in document_id[:10]:
+            scale /= len(FIRESTORE_ALPHABET)
+            index = FIRESTORE_ALPHABET.find(char)
+            position += max(index, 0) * scale
+        return position
+
+    def run(self, start, size):
+        query = (self.collection.where(filter=FieldFilter("__name__", ">=", self.collection.document(start)))
+                 .order_by("__name__").limit(size))
+        snapshots = list(query.stream())
+        documents = [([self.collection_id, snapshot.id], snapshot.to_dict() or {}) for snapshot in snapshots]
+        begin = self.position(start)
+        if len(snapshots) < size:
+            return documents, 1.0 - begin
+        return documents, max(self.position(snapshots[-1].id) - begin, 1e-12)
+
+    def random_start(self, rng):
+        return "".join(rng.choice(FIRESTORE_ALPHABET) for _ in range(FIRESTORE_ID_LENGTH))
+
+
+def profile(sampler, windows=WINDOWS, window=WINDOW, seed=None, excluded=()):
+    """Estimates for the whole kind or collection from `windows` runs of `window` documents."""
+    rng = random.Random(seed)
+    counts, sizes, entries, entry_bytes = [], [], [], []
+    presence, values = {}, {}
+    sampled = 0
+    for _ in range(windows):
+        documents, share = sampler.run(sampler.random_start(rng), window)
+        # The run saw len(documents) documents in `share` of the key space. A run cut
+        # short by the limit ends on a document, counting it would overestimate.
+        counted = len(documents) - 1 if len(documents) == window else len(documents)
+        counts.append(counted / share if share > 0 else 0.0)
+        for path, data in documents:
+            sampled += 1
+            sizes.append(document_size(path, data))
+            document_entries, document_entry_bytes = index_entries(path, data, excluded)
+            entries.append(document_entries)
+            entry_bytes.append(document_entry_bytes)
+            for name, value in data.items():
+                presence[name] = presence.get(name, 0) + 1
+                seen = values.setdefault(name, {})
+                key = json.dumps(value, sort_keys=True, default=str)
+                seen[key] = seen.get(key, 0) + 1
+
+    count = interval(counts)
+    result = {"windows": windows, "documents_read": sampled, "count": _rounded(count)}
+    if not sampled:
+        return result
+    size = interval(sizes)
+    index_size = interval(entry_bytes)
+    result.update({
+        "document_bytes": {"mean": _rounded(size), "p50": percentile(sizes, 0.5), "p90": percentile(sizes, 0.9),
+                           "p99": percentile(sizes, 0.99), "max": max(sizes)},
+        "index_entries_per_document": _rounded(interval(entries)),
+        "index_bytes_per_document": _rounded(index_size),
+        # Products of the intervals, a conservative range for the totals
+        "total_document_bytes": [round(count[0] * size[0]), round(max(count[1], 0) * size[1]),
+                                 round(count[2] * size[2])],
+        "total_index_bytes": [round(count[0] * index_size[0]), round(max(count[1], 0) * index_size[1]),
+                              round(count[2] * index_size[2])],
+        "properties": {
+            name: {"presence": round(presence[name] / sampled, 4), "distinct_in_sample": len(values[name]),
+                   "estimated_distinct": round(min(chao1(values[name]), count[0] * presence[name] / sampled))}
+            for name in sorted(presence)
+        },
+    })
+    return result
+
+
+def _rounded(estimate):
+    return [round(value, 1) for value in estimate]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate the size of a Datastore kind or Firestore collection.")
+    parser.add_argument("database", choices=["datastore", "firestore"])
+    parser.add_argument("--project")
+    parser.add_argument("--namespace")
+    parser.add_argument("--kind")
+    parser.add_argument("--collection")
+    parser.add_argument("--windows", type=int, default=WINDOWS, help="Random runs read.")
+    parser.add_argument("--window", type=int, default=WINDOW, help="Documents per run.")
+    parser.add_argument("--exclude", default="", help="Comma separated properties excluded from indexes.")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.database == "datastore":
+        from google.cloud import datastore
+        sampler = DatastoreSampler(datastore.Client(project=args.project, namespace=args.namespace), args.kind,
+                                   args.namespace)
+    else:
+        from google.cloud import firestore
+        sampler = FirestoreSampler(firestore.Client(project=args.project), args.collection)
+    excluded = [name for name in args.exclude.split(",") if name]
+    print(json.dumps(profile(sampler, args.windows, args.window, args.seed, excluded), indent=2))
+
+
+if __name__ == "__main__":
+    main()
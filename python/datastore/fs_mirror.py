@@ -0,0 +1,260 @@
+import argparse
+import base64
+import datetime
+import json
+import sqlite3
+import threading
+import time
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+#
+# Local SQLite mirror of Firestore collections.
+#
+# Instead of streaming a whole collection every time it is needed, the mirror
+# loads it once into SQLite and then applies only the changes:
+#
+# - `listen` attaches an on_snapshot listener. Its first snapshot is the
+#   initial load and holds the whole collection, so mirrored documents missing
+#   from it (deleted while nothing listened) are dropped. Every later snapshot
+#   only carries the added, modified and removed documents.
+# - `poll` is for jobs that can't keep a listener open. It pages through the
+#   collection once, then queries only the documents whose `updated_field`
+#   (a timestamp the writers set, e.g. firestore.SERVER_TIMESTAMP) is newer
+#   than the newest one already mirrored. Deletes are not visible to a query,
+#   run `reconcile` now and then to drop documents that are gone.
+#
+# Reads from the mirror (`get`, `documents`) never touch Firestore.
+#
+#   python fs_mirror.py --collection TestData --db mirror.db listen
+#   python fs_mirror.py --collection TestData --db mirror.db poll --interval 60 --updated-field updated_at
+#
+
+PAGE_SIZE = 500
+POLL_INTERVAL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    update_time TEXT,
+    PRIMARY KEY (collection, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_state (
+    collection TEXT PRIMARY KEY,
+    last_updated TEXT,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+def _plain(value):
+    # Firestore values json can't write as is
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    if hasattr(value, "path"):
+        return value.path
+    if hasattr(value, "latitude"):
+        return {"latitude": value.latitude, "longitude": value.longitude}
+    return str(value)
+
+
+def _timestamp(value):
+    return value.isoformat() if value is not None else None
+
+
+class FirestoreMirror(object):
+    """
+    Mirrors collections of `client` (a firestore.Client) into the SQLite file at
+    `path`. `reads` counts the documents read from Firestore.
+    """
+
+    def __init__(self, client, path, page_size=PAGE_SIZE):
+        self.client = client
+        self.path = path
+        self.page_size = page_size
+        self.reads = 0
+        # Listener callbacks run on a Firestore thread, so one connection behind a lock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._watches = {}
+
+    # Local reads
+
+    def get(self, collection, document_id):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM documents WHERE collection = ? AND id = ?",
+                                   (collection, document_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def documents(self, collection):
+        """{id: data} of every mirrored document of the collection."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, data FROM documents WHERE collection = ?", (collection,)).fetchall()
+        return {document_id: json.loads(data) for document_id, data in rows}
+
+    def _ids(self, collection):
+        with self._lock:
+            rows = self._db.execute("SELECT id FROM documents WHERE collection = ?", (collection,)).fetchall()
+        return {row[0] for row in rows}
+
+    def count(self, collection):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def last_updated(self, collection):
+        with self._lock:
+            row = self._db.execute("SELECT last_updated FROM sync_state WHERE collection = ?",
+                                   (collection,)).fetchone()
+        return row[0] if row else None
+
+    # Writes to the mirror
+
+    def _apply(self, collection, upserts=(), deletes=(), last_updated=None):
+        upserts = [(collection, snapshot.id, json.dumps(snapshot.to_dict(), default=_plain),
+                    _timestamp(snapshot.update_time)) for snapshot in upserts]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO documents (collection, id, data, update_time) "
+                                 "VALUES (?, ?, ?, ?)", upserts)
+            self._db.executemany("DELETE FROM documents WHERE collection = ? AND id = ?",
+                                 [(collection, document_id) for document_id in deletes])
+            self._db.execute("INSERT INTO sync_state (collection, last_updated, synced_at) VALUES (?, ?, ?) "
+                             "ON CONFLICT (collection) DO UPDATE SET synced_at = excluded.synced_at, "
+                             "last_updated = COALESCE(excluded.last_updated, sync_state.last_updated)",
+                             (collection, last_updated, time.time()))
+            self._db.execute("COMMIT")
+
+    def _pages(self, query):
+        # Paged by document name, so a large collection is never held in one response
+        last = None
+        while True:
+            page_query = query.order_by("__name__").limit(self.page_size)
+            if last is not None:
+                page_query = page_query.start_after(last)
+            page = list(page_query.stream())
+            self.reads += len(page)
+            if page:
+                yield page
+            if len(page) < self.page_size:
+                return
+            last = page[-1]
+
+    # Polling
+
+    def initial_load(self, collection, updated_field=None):
+        """Load every document of the collection, returns the number loaded."""
+        loaded, newest = 0, None
+        for page in self._pages(self.client.collection(collection)):
+            if updated_field:
+                newest = _newest(page, updated_field, newest)
+            self._apply(collection, upserts=page, last_updated=_timestamp(newest))
+            loaded += len(page)
+        return loaded
+
+    def poll(self, collection, updated_field):
+        """Apply the documents changed since the last sync, returns the number applied."""
+        since = self.last_updated(collection)
+        if since is None:
+            return self.initial_load(collection, updated_field)
+        # >= so writes sharing the newest timestamp are not missed, applying one twice is harmless
+        query = self.client.collection(collection).where(
+            filter=FieldFilter(updated_field, ">=", datetime.datetime.fromisoformat(since)))
+        changed = list(query.stream())
+        self.reads += len(changed)
+        newest = _newest(changed, updated_field, None)
+        self._apply(collection, upserts=changed, last_updated=_timestamp(newest))
+        return len(changed)
+
+    def reconcile(self, collection):
+        """Drop mirrored documents that no longer exist upstream, reads only document ids."""
+        upstream = set()
+        for page in self._pages(self.client.collection(collection).select([])):
+            upstream.update(snapshot.id for snapshot in page)
+        gone = self._ids(collection) - upstream
+        self._apply(collection, deletes=gone)
+        return len(gone)
+
+    # Listening
+
+    def listen(self, collection):
+        """Mirror the collection with an on_snapshot listener until `stop` is called."""
+        first = [True]
+
+        def on_snapshot(snapshots, changes, read_time):
+            upserts, deletes = [], []
+            for change in changes:
+                self.reads += 1
+                if change.type.name == "REMOVED":
+                    deletes.append(change.document.id)
+                else:
+                    upserts.append(change.document)
+            if first:
+                # The first snapshot is the whole collection, what else is mirrored is gone
+                first.clear()
+                deletes.extend(self._ids(collection) - {snapshot.id for snapshot in snapshots})
+            self._apply(collection, upserts, deletes)
+
+        self._watches[collection] = self.client.collection(collection).on_snapshot(on_snapshot)
+        return self._watches[collection]
+
+    def stop(self, collection=None):
+        for name in [collection] if collection else list(self._watches):
+            self._watches.pop(name).unsubscribe()
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._db.close()
+
+
+def _newest(snapshots, field, newest):
+    for snapshot in snapshots:
+        value = (snapshot.to_dict() or {}).get(field)
+        if isinstance(value, datetime.datetime) and (newest is None or value > newest):
+            newest = value
+    return newest
+
+
+def main():
+    from google.cloud import firestore
+
+    parser = argparse.ArgumentParser(description="Mirror Firestore collections into a local SQLite file.")
+    parser.add_argument("mode", choices=["listen", "poll", "reconcile"])
+    parser.add_argument("--collection", action="append", required=True)
+    parser.add_argument("--db", default="firestore_mirror.db")
+    parser.add_argument("--project")
+    parser.add_argument("--updated-field", default="updated_at", help="Timestamp field used by poll.")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL)
+    args = parser.parse_args()
+
+    mirror = FirestoreMirror(firestore.Client(project=args.project), args.db)
+    try:
+        if args.mode == "reconcile":
+            for collection in args.collection:
+                print("{}: {} removed".format(collection, mirror.reconcile(collection)))
+        elif args.mode == "listen":
+            for collection in args.collection:
+                mirror.listen(collection)
+            while True:
+                time.sleep(args.interval)
+                print("{} documents read".format(mirror.reads))
+        else:
+            while True:
+                for collection in args.collection:
+                    applied = mirror.poll(collection, args.updated_field)
+                    print("{}: {} changes, {} mirrored".format(collection, applied, mirror.count(collection)))
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mirror.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import random
+
+from google.cloud import datastore
+
+OPERATORS = {
+    "=": lambda a, b: a == b, "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+}
+
+
+def key_order(key):
+    return [(isinstance(part, str), part) if index % 2 else (False, part) for index, part in enumerate(key.flat_path)]
+
+
+class FakeQuery(object):
+    """The parts of datastore.Query the readers use, over an in-memory list of entities."""
+
+    def __init__(self, client, kind=None, namespace=None, projection=(), order=(), filters=()):
+        self.client = client
+        self.kind = kind
+        self.projection = list(projection)
+        self.order = list(order)
+        self.filters = list(filters)
+        self.only_keys = False
+
+    def keys_only(self):
+        self.only_keys = True
+
+    def add_filter(self, property_name=None, operator=None, value=None, *, filter=None):
+        if filter is not None:
+            property_name, operator, value = filter.property_name, filter.operator, filter.value
+        self.filters.append((property_name, operator, value))
+        return self
+
+    def _matches(self, entity):
+        for name, operator, value in self.filters:
+            if name == "__key__":
+                if not OPERATORS[operator](key_order(entity.key), key_order(value)):
+                    return False
+            elif name not in entity or not OPERATORS[operator](entity[name], value):
+                return False
+        return True
+
+    def fetch(self, limit=None, **kwargs):
+        self.client.queries.append(self)
+        entities = [entity for entity in self.client.entities.get(self.kind, []) if self._matches(entity)]
+        if self.order == ["__scatter__"]:
+            random.Random(len(entities)).shuffle(entities)
+        elif self.order:
+            name = self.order[0].lstrip("-")
+            entities.sort(key=(lambda entity: key_order(entity.key)) if name == "__key__" else
+                          (lambda entity: entity.get(name)), reverse=self.order[0].startswith("-"))
+        for entity in entities[:limit]:
+            self.client.reads += 1
+            if self.only_keys:
+                yield datastore.Entity(entity.key)
+            elif self.projection:
+                projected = datastore.Entity(entity.key)
+                projected.update({name: entity[name] for name in self.projection if name in entity})
+                yield projected
+            else:
+                yield entity
+
+
+class FakeClient(object):
+    """In-memory stand-in for datastore.Client, `reads` counts entities returned."""
+
+    def __init__(self, project="fake-project"):
+        self.project = project
+        self.entities = {}
+        self.queries = []
+        self.reads = 0
+
+    def key(self, kind, id_or_name):
+        return datastore.Key(kind, id_or_name, project=self.project)
+
+    def put(self, kind, id_or_name, **properties):
+        entity = datastore.Entity(self.key(kind, id_or_name))
+        entity.update(properties)
+        self.entities.setdefault(kind, []).append(entity)
+        return entity
+
+    def query(self, kind=None, namespace=None, projection=(), order=(), filters=()):
+        return FakeQuery(self, kind, namespace, projection, order, filters)
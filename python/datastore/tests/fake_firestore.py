@@ -0,0 +1,148 @@
+import datetime
+import operator
+
+OPERATORS = {"==": operator.eq, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+class ChangeType(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class Change(object):
+    def __init__(self, name, document):
+        self.type = ChangeType(name)
+        self.document = document
+
+
+class Snapshot(object):
+    def __init__(self, document_id, data, update_time):
+        self.id = document_id
+        self._data = data
+        self.update_time = update_time
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class Watch(object):
+    def __init__(self, collection, callback):
+        self.collection = collection
+        self.callback = callback
+
+    def unsubscribe(self):
+        self.collection.watches.remove(self)
+
+
+class DocumentReference(object):
+    def __init__(self, document_id):
+        self.id = document_id
+
+
+class FakeQuery(object):
+    """
+    The query features the mirror and profiler use: where (also on "__name__"),
+    order_by("__name__"), limit, start_after, select, stream.
+    """
+
+    def __init__(self, collection, filters=(), limit=None, after=None, fields=None):
+        self.collection = collection
+        self.filters = list(filters)
+        self._limit = limit
+        self.after = after
+        self.fields = fields
+
+    def _copy(self, **changes):
+        values = dict(filters=self.filters, limit=self._limit, after=self.after, fields=self.fields)
+        values.update(changes)
+        return FakeQuery(self.collection, **values)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self.filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path):
+        assert field_path == "__name__"
+        return self
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot.id)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def stream(self):
+        self.collection.client.queries += 1
+        results = []
+        for document_id in sorted(self.collection.docs):
+            snapshot = self.collection.docs[document_id]
+            if self.after is not None and document_id <= self.after:
+                continue
+            data = dict(snapshot.to_dict(), __name__=document_id)
+            if all(name in data and OPERATORS[op](data[name], value.id if name == "__name__" else value)
+                   for name, op, value in self.filters):
+                if self.fields is not None:
+                    snapshot = Snapshot(document_id, {name: data[name] for name in self.fields if name in data},
+                                        snapshot.update_time)
+                results.append(snapshot)
+            if self._limit is not None and len(results) == self._limit:
+                break
+        return iter(results)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, name):
+        FakeQuery.__init__(self, self)
+        self.client = client
+        self.name = self.id = name
+        self.docs = {}
+        self.watches = []
+
+    def document(self, document_id):
+        return DocumentReference(document_id)
+
+    def on_snapshot(self, callback):
+        watch = Watch(self, callback)
+        self.watches.append(watch)
+        # Like Firestore, the first snapshot holds every document as ADDED
+        callback(list(self.docs.values()), [Change("ADDED", doc) for doc in self.docs.values()], self.client.now())
+        return watch
+
+    def _notify(self, change):
+        for watch in list(self.watches):
+            watch.callback(list(self.docs.values()), [change], self.client.now())
+
+
+class FakeFirestore(object):
+    """In-memory stand-in for firestore.Client with a clock that moves one second per write."""
+
+    def __init__(self):
+        self.collections = {}
+        self.queries = 0
+        self.clock = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def now(self):
+        return self.clock
+
+    def collection(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name)
+        return self.collections[name]
+
+    def set(self, collection, document_id, data):
+        """Write a document, `updated_at` is set like a SERVER_TIMESTAMP would."""
+        self.clock += datetime.timedelta(seconds=1)
+        collection = self.collection(collection)
+        existed = document_id in collection.docs
+        snapshot = Snapshot(document_id, dict(data, updated_at=self.clock), self.clock)
+        collection.docs[document_id] = snapshot
+        collection._notify(Change("MODIFIED" if existed else "ADDED", snapshot))
+
+    def delete(self, collection, document_id):
+        collection = self.collection(collection)
+        snapshot = collection.docs.pop(document_id)
+        collection._notify(Change("REMOVED", snapshot))
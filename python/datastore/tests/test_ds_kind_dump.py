@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+
+import pyarrow.parquet as pq
+import pytest
+
+import ds_kind_dump
+from fake_datastore import FakeClient
+
+
+@pytest.fixture
+def client():
+    client = FakeClient()
+    for number in range(1, 1001):
+        client.put("TestData", number, name="user {}".format(number), age=number % 90, data=b"\x00\x01")
+    for name in ("alpha", "beta"):
+        client.put("TestData", name, name=name, age=1, data=b"")
+    return client
+
+
+def read_ndjson(paths):
+    rows = []
+    for path in paths:
+        with gzip.open(path, "rt") as file_descriptor:
+            rows.extend(json.loads(line) for line in file_descriptor)
+    return rows
+
+
+def test_split_points_are_sorted_and_cover_the_kind(client):
+    points = ds_kind_dump.split_points(client, "TestData", 8)
+
+    assert 1 <= len(points) <= 7
+    orders = [ds_kind_dump.key_order(point) for point in points]
+    assert orders == sorted(orders)
+    # Only a sample of the keys is read to find them
+    assert client.reads == 8 * ds_kind_dump.OVERSAMPLING
+
+
+def test_dump_kind_ndjson_reads_every_entity_once(client, tmp_path):
+    results = ds_kind_dump.dump_kind(client, "TestData", str(tmp_path), shards=8, workers=4)
+
+    rows = read_ndjson([path for path, _, _ in results])
+    assert len(results) > 1
+    assert sum(count for _, count, _ in results) == 1002
+    assert sorted(row["__key__"] for row in rows) == sorted(
+        ["TestData/{}".format(number) for number in range(1, 1001)] + ["TestData/alpha", "TestData/beta"])
+    assert rows[0]["data"] == "AAE="
+
+
+def test_dump_kind_parquet_with_projection(client, tmp_path):
+    results = ds_kind_dump.dump_kind(client, "TestData", str(tmp_path), shards=4, workers=2,
+                                     output_format="parquet", projection=["age"], batch_rows=100)
+
+    tables = [pq.read_table(path) for path, count, _ in results if count]
+    assert all(table.schema.names == ["__key__", "age"] for table in tables)
+    assert sum(table.num_rows for table in tables) == 1002
+    # Row groups are written every batch_rows entities
+    assert max(pq.ParquetFile(path).metadata.num_row_groups for path, count, _ in results if count) > 1
+
+
+def test_empty_kind(tmp_path):
+    results = ds_kind_dump.dump_kind(FakeClient(), "Nothing", str(tmp_path), shards=4, output_format="parquet")
+
+    assert [(os.path.basename(path), count) for path, count, _ in results] == [("part-00000.parquet", 0)]
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_parquet_with_heterogeneous_entities(tmp_path):
+    client = FakeClient()
+    for number in range(1, 301):
+        properties = {"name": "user {}".format(number)}
+        # Null in the first batch and set later, only in later batches, int then float, int then text
+        properties["email"] = "u{}@example.com".format(number) if number > 150 else None
+        if number > 250:
+            properties["nickname"] = "nick {}".format(number)
+        properties["score"] = number if number <= 100 else number + 0.5
+        properties["code"] = number if number <= 200 else "c{}".format(number)
+        client.put("Mixed", number, **properties)
+
+    results = ds_kind_dump.dump_kind(client, "Mixed", str(tmp_path), shards=1, output_format="parquet",
+                                     batch_rows=50)
+
+    table = pq.read_table(results[0][0])
+    assert table.num_rows == 300
+    rows = {row["__key__"]: row for row in table.to_pylist()}
+    assert rows["Mixed/1"]["email"] is None and rows["Mixed/300"]["email"] == "u300@example.com"
+    assert rows["Mixed/1"]["nickname"] is None and rows["Mixed/300"]["nickname"] == "nick 300"
+    assert rows["Mixed/1"]["score"] == 1.0 and rows["Mixed/300"]["score"] == 300.5
+    assert rows["Mixed/1"]["code"] == "1" and rows["Mixed/300"]["code"] == "c300"
+    # The temporary spill files are gone
+    assert os.listdir(str(tmp_path)) == ["part-00000.parquet"]
+
+
+def test_parquet_with_mixed_types_within_a_batch(tmp_path):
+    client = FakeClient()
+    for number in range(1, 21):
+        # code alternates int and text, and tag first appears in the middle of the batch
+        properties = {"code": number if number % 2 else "x{}".format(number)}
+        if number > 5:
+            properties["tag"] = "t{}".format(number)
+        client.put("Schemaless", number, **properties)
+
+    results = ds_kind_dump.dump_kind(client, "Schemaless", str(tmp_path), shards=1, output_format="parquet",
+                                     batch_rows=10)
+
+    rows = {row["__key__"]: row for row in pq.read_table(results[0][0]).to_pylist()}
+    assert len(rows) == 20
+    assert [rows["Schemaless/{}".format(number)]["code"] for number in (1, 2, 20)] == ["1", "x2", "x20"]
+    assert rows["Schemaless/1"]["tag"] is None and rows["Schemaless/6"]["tag"] == "t6"
@@ -0,0 +1,82 @@
+import random
+
+from ds_profiler import (DATASTORE_ID_SPAN, DATASTORE_ID_START, FIRESTORE_ALPHABET, DatastoreSampler,
+                         FirestoreSampler, chao1, document_size, index_entries, profile)
+from fake_datastore import FakeClient
+from fake_firestore import FakeFirestore
+
+
+def test_sizes_follow_the_storage_size_rules():
+    # "users" + "alice": 6 + 6 + 16 for the name, "age" 4 + 8, "tags" 5 + "a" 2 + "bc" 3, 32 overhead
+    assert document_size(["users", "alice"], {"age": 30, "tags": ["a", "bc"]}) == 28 + 12 + 10 + 32
+    entries, size = index_entries(["users", "alice"], {"age": 30, "tags": ["a", "bc"]}, excluded=["age"])
+    # Ascending and descending entry per list element
+    assert entries == 4
+    assert size == 2 * (28 + 32 + 5 + 2) + 2 * (28 + 32 + 5 + 3)
+
+
+def test_chao1_adds_unseen_values_from_the_singletons():
+    assert chao1({"a": 5, "b": 5}) == 2
+    assert chao1({"a": 1, "b": 1, "c": 2}) == 3 + 4 / 2
+
+
+def test_datastore_profile_reads_a_fraction_of_the_kind():
+    client = FakeClient()
+    rng = random.Random(1)
+    # Scattered ids, like Datastore allocates them
+    for entity_id in rng.sample(range(DATASTORE_ID_START + 1, DATASTORE_ID_START + DATASTORE_ID_SPAN + 1), 5000):
+        client.put("Event", entity_id, action=rng.choice(["click", "view", "buy"]), user=rng.randrange(1000),
+                   payload="x" * rng.randrange(10, 200))
+
+    result = profile(DatastoreSampler(client, "Event"), windows=40, window=10, seed=2)
+
+    assert result["documents_read"] <= 400
+    # Runs start all over the id range, not on the same first entities
+    assert result["properties"]["payload"]["distinct_in_sample"] > 150
+    assert client.reads == result["documents_read"]
+    estimate, low, high = result["count"]
+    assert low <= 5000 <= high
+    assert high - low < 5000
+    assert result["properties"]["action"]["presence"] == 1.0
+    assert result["properties"]["action"]["estimated_distinct"] == 3
+    assert result["properties"]["user"]["estimated_distinct"] > result["properties"]["user"]["distinct_in_sample"]
+    mean, low, high = result["document_bytes"]["mean"]
+    assert low < mean < high
+    assert result["document_bytes"]["p50"] <= result["document_bytes"]["p99"] <= result["document_bytes"]["max"]
+    assert result["index_entries_per_document"][0] == 6
+
+
+def test_firestore_profile_estimates_the_collection_count():
+    firestore = FakeFirestore()
+    rng = random.Random(4)
+    for number in range(3000):
+        document_id = "".join(rng.choice(FIRESTORE_ALPHABET) for _ in range(20))
+        firestore.set("users", document_id, {"name": "user {}".format(number)})
+
+    result = profile(FirestoreSampler(firestore, "users"), windows=30, window=10, seed=5)
+
+    assert firestore.queries == 30
+    estimate, low, high = result["count"]
+    assert low <= 3000 <= high
+    # Every name is distinct, runs may overlap a little
+    assert result["properties"]["name"]["distinct_in_sample"] > 0.9 * result["documents_read"]
+    # name and updated_at, ascending and descending
+    assert result["index_entries_per_document"][0] == 4
+
+
+def test_firestore_documents_are_sized_with_the_collection_id():
+    firestore = FakeFirestore()
+    firestore.set("user_profiles", "a" * 20, {"name": "ann"})
+
+    documents, _ = FirestoreSampler(firestore, "user_profiles").run("0" * 20, 10)
+
+    assert [path for path, _ in documents] == [["user_profiles", "a" * 20]]
+    path, data = documents[0]
+    # 13 characters of collection id plus its terminator, then 21 for the document id
+    assert document_size(path, data) - document_size([], data) == 14 + 21
+
+
+def test_empty_kind():
+    result = profile(DatastoreSampler(FakeClient(), "Missing"), windows=5, window=10, seed=1)
+    assert result["count"] == [0.0, 0.0, 0.0]
+    assert result["documents_read"] == 0
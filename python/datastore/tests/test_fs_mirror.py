@@ -0,0 +1,96 @@
+import pytest
+
+from fake_firestore import FakeFirestore
+from fs_mirror import FirestoreMirror
+
+
+@pytest.fixture
+def firestore():
+    client = FakeFirestore()
+    for number in range(120):
+        client.set("users", "user-{:03d}".format(number), {"name": "user {}".format(number), "score": number})
+    return client
+
+
+@pytest.fixture
+def mirror(firestore, tmp_path):
+    mirror = FirestoreMirror(firestore, str(tmp_path / "mirror.db"), page_size=50)
+    yield mirror
+    mirror.close()
+
+
+def test_initial_load_pages_through_the_collection(firestore, mirror):
+    assert mirror.initial_load("users", "updated_at") == 120
+
+    assert mirror.count("users") == 120
+    assert mirror.reads == 120
+    # Pages of 50, 50 and 20 documents
+    assert firestore.queries == 3
+    assert mirror.get("users", "user-007") == {"name": "user 7", "score": 7, "updated_at": "2024-01-01T00:00:08+00:00"}
+
+
+def test_poll_reads_only_changed_documents(firestore, mirror):
+    mirror.initial_load("users", "updated_at")
+    firestore.set("users", "user-001", {"name": "renamed", "score": 1})
+    firestore.set("users", "new-user", {"name": "new", "score": 500})
+    mirror.reads = 0
+
+    applied = mirror.poll("users", "updated_at")
+
+    # The two changes plus the newest document of the last sync, read again by >=
+    assert applied == 3
+    assert mirror.reads == 3
+    assert mirror.get("users", "user-001")["name"] == "renamed"
+    assert mirror.get("users", "new-user")["score"] == 500
+    assert mirror.count("users") == 121
+
+
+def test_poll_without_a_previous_sync_loads_everything(mirror):
+    assert mirror.poll("users", "updated_at") == 120
+    assert mirror.last_updated("users") == "2024-01-01T00:02:00+00:00"
+
+
+def test_reconcile_removes_deleted_documents(firestore, mirror):
+    mirror.initial_load("users")
+    firestore.delete("users", "user-005")
+
+    assert mirror.reconcile("users") == 1
+    assert mirror.get("users", "user-005") is None
+    assert mirror.count("users") == 119
+
+
+def test_listener_applies_deltas(firestore, mirror):
+    mirror.listen("users")
+    assert mirror.count("users") == 120
+    mirror.reads = 0
+
+    firestore.set("users", "user-002", {"name": "changed", "score": 2})
+    firestore.delete("users", "user-003")
+    firestore.set("users", "late", {"name": "late", "score": 9})
+
+    assert mirror.reads == 3
+    assert mirror.get("users", "user-002")["name"] == "changed"
+    assert mirror.get("users", "user-003") is None
+    assert mirror.count("users") == 120
+
+    mirror.stop("users")
+    firestore.set("users", "after-stop", {"name": "ignored"})
+    assert mirror.get("users", "after-stop") is None
+
+
+def test_listener_drops_documents_deleted_while_offline(firestore, mirror):
+    mirror.initial_load("users")
+    firestore.delete("users", "user-004")
+    firestore.delete("users", "user-100")
+    firestore.set("users", "user-005", {"name": "changed offline", "score": 5})
+
+    mirror.listen("users")
+
+    assert mirror.get("users", "user-004") is None
+    assert mirror.get("users", "user-100") is None
+    assert mirror.get("users", "user-005")["name"] == "changed offline"
+    assert mirror.count("users") == 118
+
+    # Only the first snapshot is complete, later ones carry just their change
+    firestore.set("users", "user-006", {"name": "changed online", "score": 6})
+    assert mirror.count("users") == 118
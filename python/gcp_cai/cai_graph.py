@@ -0,0 +1,470 @@
+import argparse
+import gzip
+import json
+import os
+import time
+
+import numpy as np
+
+#
+# Graph index over Cloud Asset Inventory exports.
+#
+# The export (the NDJSON files `export_assets` writes to a GCS bucket, copied
+# locally) is read once into integer arrays:
+#
+# - every asset, folder, project, organization and IAM member is a node id,
+#   ids follow the sorted names so a name is found by binary search;
+# - the resource hierarchy from `ancestors` is a `parent` array, and an Euler
+#   tour gives every node an interval [tin, tout) that holds exactly the
+#   intervals of its descendants. "Is a under b" is two comparisons and
+#   "everything under this folder" is one slice of `order`;
+# - RELATIONSHIP content and IAM_POLICY bindings (member -> resource, the role
+#   as the edge type) are edges in CSR form, both directions.
+#
+# The index is a directory of .npy files that is memory mapped on load, so
+# opening it costs nothing and queries only touch the pages they read.
+#
+#   python cai_graph.py build --input export.json --index cai_index
+#   python cai_graph.py query --index cai_index --under folders/123
+#   python cai_graph.py query --index cai_index --touches serviceAccount:sa@my-project.iam.gserviceaccount.com
+#   python cai_graph.py benchmark --nodes 1000000
+#
+
+CONTAINER_TYPES = {
+    "cloudresourcemanager.googleapis.com/Organization",
+    "cloudresourcemanager.googleapis.com/Folder",
+    "cloudresourcemanager.googleapis.com/Project",
+}
+MEMBER_TYPE = "iam.googleapis.com/Member"
+
+INDEX_FILES = ("name_bytes", "name_offsets", "node_types", "parent", "tin", "tout", "order",
+               "out_indptr", "out_targets", "out_types", "in_indptr", "in_sources", "in_types")
+
+
+def _field(record, name):
+    # Exports use snake_case, the REST API camelCase
+    if name in record:
+        return record[name]
+    head, *rest = name.split("_")
+    return record.get(head + "".join(part.title() for part in rest))
+
+
+def read_export(paths):
+    """Yield the assets of NDJSON export files (gzipped when the name ends with .gz)."""
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as file_descriptor:
+            for line in file_descriptor:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def node_name(name, asset_type, ancestors):
+    """Projects, folders and organizations are named like in `ancestors` (projects/123)."""
+    if asset_type in CONTAINER_TYPES and ancestors:
+        return ancestors[0]
+    return name
+
+
+class GraphBuilder:
+    """Collects nodes, parents and edges by name, `build` turns them into a GraphIndex."""
+
+    def __init__(self):
+        self.ids = {}
+        self.types = []
+        self.parents = {}
+        self.edges = []
+        self.edge_types = {}
+
+    def node(self, name, asset_type=None):
+        node = self.ids.get(name)
+        if node is None:
+            node = self.ids[name] = len(self.types)
+            self.types.append(asset_type)
+        elif asset_type and not self.types[node]:
+            self.types[node] = asset_type
+        return node
+
+    def chain(self, name, asset_type, ancestors):
+        """The node and its ancestors, each the child of the next."""
+        node = self.node(node_name(name, asset_type, ancestors), asset_type)
+        path = [node] + [self.node(ancestor) for ancestor in ancestors]
+        for child, parent in zip(path, path[1:]):
+            if child != parent:
+                self.parents[child] = parent
+        return node
+
+    def edge(self, source, target, edge_type):
+        self.edges.append((source, target, self.edge_types.setdefault(edge_type, len(self.edge_types))))
+
+    def add_asset(self, asset):
+        asset_type = _field(asset, "asset_type")
+        node = self.chain(asset["name"], asset_type, _field(asset, "ancestors") or [])
+
+        related = _field(asset, "related_asset")
+        if related:
+            target = self.chain(related["asset"], _field(related, "asset_type"), _field(related, "ancestors") or [])
+            self.edge(node, target, _field(related, "relationship_type") or "RELATED")
+        related = _field(asset, "related_assets")
+        if related:
+            edge_type = (_field(related, "relationship_attributes") or {}).get("type") or "RELATED"
+            for item in related.get("assets", []):
+                target = self.chain(item["asset"], _field(item, "asset_type"), _field(item, "ancestors") or [])
+                self.edge(node, target, edge_type)
+
+        for binding in (_field(asset, "iam_policy") or {}).get("bindings", []):
+            for member in binding.get("members", []):
+                self.edge(self.node(member, MEMBER_TYPE), node, binding["role"])
+
+    def build(self):
+        names = np.array(list(self.ids), dtype=object)
+        parent = np.full(len(names), -1, dtype=np.int64)
+        parent[list(self.parents)] = list(self.parents.values())
+        edges = np.array(self.edges, dtype=np.int64).reshape(-1, 3)
+        return GraphIndex.from_arrays(names, self.types, parent, edges[:, 0], edges[:, 1], edges[:, 2],
+                                      list(self.edge_types))
+
+
+def euler_intervals(parent):
+    """
+    (tin, tout, order) of a preorder walk of the forest given by `parent`
+    (-1 for roots): the descendants of v are order[tin[v]:tout[v]]. Computed
+    one depth level at a time, so the Python loop runs only as often as the
+    hierarchy is deep.
+    """
+    n = len(parent)
+    depth = np.zeros(n, dtype=np.int32)
+    ancestor = parent.copy()
+    for _ in range(n):
+        above = ancestor >= 0
+        if not above.any():
+            break
+        depth[above] += 1
+        ancestor[above] = parent[ancestor[above]]
+    else:
+        raise ValueError("The hierarchy has a cycle")
+
+    # Subtree sizes, bottom up
+    size = np.ones(n, dtype=np.int64)
+    children = np.flatnonzero(parent >= 0)
+    for level in range(int(depth.max(initial=0)), 0, -1):
+        nodes = children[depth[children] == level]
+        size += np.bincount(parent[nodes], weights=size[nodes], minlength=n).astype(np.int64)
+
+    # Siblings follow each other, each one after the subtrees of the previous ones
+    tin = np.zeros(n, dtype=np.int64)
+    roots = np.flatnonzero(parent < 0)
+    tin[roots] = np.cumsum(size[roots]) - size[roots]
+    children = children[np.argsort(parent[children], kind="stable")]
+    before = np.cumsum(size[children]) - size[children]
+    first = np.searchsorted(parent[children], parent[children])
+    offset = before - before[first]
+    for level in range(1, int(depth.max(initial=0)) + 1):
+        at_level = depth[children] == level
+        nodes = children[at_level]
+        tin[nodes] = tin[parent[nodes]] + 1 + offset[at_level]
+
+    order = np.empty(n, dtype=np.int64)
+    order[tin] = np.arange(n)
+    return tin, tin + size, order
+
+
+def csr(sources, targets, types, n):
+    """(indptr, targets, types) with the edges of node v at indptr[v]:indptr[v + 1]."""
+    by_source = np.argsort(sources, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    return indptr, targets[by_source].astype(np.int32), types[by_source].astype(np.int16)
+
+
+class Names:
+    """The node names as a read-only sequence over the concatenated UTF-8 bytes."""
+
+    def __init__(self, data, offsets):
+        self.data = memoryview(data)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.encoded(index).decode("utf-8")
+
+    def encoded(self, index):
+        return self.data[int(self.offsets[index]):int(self.offsets[index + 1])].tobytes()
+
+    def find(self, name):
+        """Index of `name`, binary search on the UTF-8 bytes (which sort like the names), -1 when missing."""
+        encoded = name.encode("utf-8")
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.encoded(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self) and self.encoded(low) == encoded else -1
+
+
+class GraphIndex:
+    """Hierarchy and relationship queries over integer node ids."""
+
+    def __init__(self, arrays, asset_types, edge_types):
+        for name in INDEX_FILES:
+            # Plain ndarray views of the maps, indexing a np.memmap is slower
+            setattr(self, name, np.asarray(arrays[name]))
+        self.asset_types = asset_types
+        self.edge_types = edge_types
+        self.names = Names(self.name_bytes, self.name_offsets)
+
+    @classmethod
+    def from_arrays(cls, names, types, parent, sources, targets, edge_types, edge_type_names):
+        """Ids are renumbered in sorted name order, `names` may come in any order."""
+        n = len(names)
+        ranked = np.argsort(names, kind="stable")
+        rank = np.empty(n, dtype=np.int64)
+        rank[ranked] = np.arange(n)
+        names = names[ranked]
+
+        asset_types = sorted({asset_type for asset_type in types if asset_type})
+        type_ids = {asset_type: index for index, asset_type in enumerate(asset_types)}
+        node_types = np.array([type_ids.get(asset_type, -1) for asset_type in types], dtype=np.int16)[ranked]
+
+        parent = np.asarray(parent)[ranked]
+        parent = np.where(parent >= 0, rank[np.maximum(parent, 0)], -1)
+        sources, targets = rank[np.asarray(sources, dtype=np.int64)], rank[np.asarray(targets, dtype=np.int64)]
+        edge_types = np.asarray(edge_types, dtype=np.int64)
+
+        encoded = [name.encode("utf-8") for name in names]
+        arrays = {"name_bytes": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                  "name_offsets": np.zeros(n + 1, dtype=np.int64),
+                  "node_types": node_types, "parent": parent.astype(np.int32)}
+        np.cumsum([len(name) for name in encoded], out=arrays["name_offsets"][1:])
+        arrays["tin"], arrays["tout"], arrays["order"] = [values.astype(np.int32) for values in euler_intervals(parent)]
+        arrays["out_indptr"], arrays["out_targets"], arrays["out_types"] = csr(sources, targets, edge_types, n)
+        arrays["in_indptr"], arrays["in_sources"], arrays["in_types"] = csr(targets, sources, edge_types, n)
+        return cls(arrays, asset_types, edge_type_names)
+
+    @classmethod
+    def from_export(cls, paths):
+        builder = GraphBuilder()
+        for asset in read_export(paths):
+            builder.add_asset(asset)
+        return builder.build()
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        for name in INDEX_FILES:
+            np.save(os.path.join(index_dir, name + ".npy"), getattr(self, name))
+        with open(os.path.join(index_dir, "types.json"), "w") as file_descriptor:
+            json.dump({"asset_types": self.asset_types, "edge_types": self.edge_types}, file_descriptor)
+        return index_dir
+
+    @classmethod
+    def load(cls, index_dir, mmap=True):
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(index_dir, name + ".npy"), mmap_mode=mode) for name in INDEX_FILES}
+        with open(os.path.join(index_dir, "types.json")) as file_descriptor:
+            types = json.load(file_descriptor)
+        return cls(arrays, types["asset_types"], types["edge_types"])
+
+    def __len__(self):
+        return len(self.names)
+
+    # Nodes
+
+    def node(self, name):
+        """Id of a node name, KeyError when it is not in the index."""
+        index = self.names.find(name)
+        if index < 0:
+            raise KeyError(name)
+        return index
+
+    def asset_type(self, node):
+        type_id = self.node_types[node]
+        return self.asset_types[type_id] if type_id >= 0 else None
+
+    # Hierarchy
+
+    def ancestors(self, node):
+        found = []
+        node = self.parent[node]
+        while node >= 0:
+            found.append(int(node))
+            node = self.parent[node]
+        return found
+
+    def is_under(self, node, ancestor):
+        """True when `ancestor` is `node` or one of its ancestors."""
+        return self.tin[ancestor] <= self.tin[node] < self.tout[ancestor]
+
+    def subtree(self, node):
+        """Ids of the node and everything under it, a slice of the mapped `order` array."""
+        return self.order[self.tin[node]:self.tout[node]]
+
+    def subtree_size(self, node):
+        return int(self.tout[node] - self.tin[node])
+
+    def children(self, node):
+        # Children start right after the node in the tour, each one skips its own subtree
+        found, position, end = [], self.tin[node] + 1, self.tout[node]
+        while position < end:
+            child = int(self.order[position])
+            found.append(child)
+            position = self.tout[child]
+        return found
+
+    # Relationships
+
+    def related(self, node, reverse=False):
+        """(ids, edge type ids) of the edges leaving `node`, or reaching it with `reverse`."""
+        if reverse:
+            start, stop = self.in_indptr[node], self.in_indptr[node + 1]
+            return self.in_sources[start:stop], self.in_types[start:stop]
+        start, stop = self.out_indptr[node], self.out_indptr[node + 1]
+        return self.out_targets[start:stop], self.out_types[start:stop]
+
+    def reachable(self, node, max_depth=None, reverse=False):
+        """Ids reachable over relationship edges, breadth first, one level per numpy step."""
+        indptr, targets = (self.in_indptr, self.in_sources) if reverse else (self.out_indptr, self.out_targets)
+        seen = {node}
+        frontier = np.array([node], dtype=np.int64)
+        depth = 0
+        while len(frontier) and (max_depth is None or depth < max_depth):
+            starts, stops = indptr[frontier], indptr[frontier + 1]
+            counts = stops - starts
+            if not counts.sum():
+                break
+            positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            found = [int(target) for target in np.unique(targets[positions]) if int(target) not in seen]
+            seen.update(found)
+            frontier = np.array(found, dtype=np.int64)
+            depth += 1
+        seen.discard(node)
+        return np.array(sorted(seen), dtype=np.int64)
+
+    def touches(self, member):
+        """
+        Ids of every resource an IAM member has a role on, directly or by
+        inheritance from a folder, project or organization binding.
+        """
+        resources, _ = self.related(member)
+        if not len(resources):
+            return np.array([], dtype=np.int64)
+        return np.unique(np.concatenate([self.subtree(resource) for resource in resources]))
+
+
+def synthetic_hierarchy(nodes=1000000, folders=1000, projects=10000, members=1000, relationships=200000, seed=0):
+    """
+    One organization, two levels of folders, projects under the folders and
+    resources under the projects; IAM bindings from service accounts and
+    relationships between random resources. Returns a GraphIndex.
+    """
+    rng = np.random.default_rng(seed)
+    resources = nodes - 1 - folders - projects - members
+    top = max(1, folders // 10)
+    names = (["organizations/1"] + ["folders/{}".format(index) for index in range(folders)] +
+             ["projects/{}".format(index) for index in range(projects)] +
+             ["serviceAccount:sa-{}@example.iam.gserviceaccount.com".format(index) for index in range(members)])
+    project_of = rng.integers(0, projects, resources)
+    names += ["//compute.googleapis.com/projects/{}/zones/us-central1-a/instances/vm-{}".format(project, index)
+              for index, project in enumerate(project_of)]
+    types = (["cloudresourcemanager.googleapis.com/Organization"] +
+             ["cloudresourcemanager.googleapis.com/Folder"] * folders +
+             ["cloudresourcemanager.googleapis.com/Project"] * projects + [MEMBER_TYPE] * members +
+             ["compute.googleapis.com/Instance"] * resources)
+
+    folder_start, project_start = 1, 1 + folders
+    member_start, resource_start = project_start + projects, project_start + projects + members
+    parent = np.full(nodes, -1, dtype=np.int64)
+    parent[folder_start:folder_start + top] = 0
+    parent[folder_start + top:project_start] = folder_start + rng.integers(0, top, folders - top)
+    parent[project_start:member_start] = folder_start + rng.integers(0, folders, projects)
+    parent[resource_start:] = project_start + project_of
+
+    # Each service account is bound on a few projects and folders, and relationships link resources
+    bound = np.concatenate([rng.integers(project_start, member_start, members * 3),
+                            rng.integers(folder_start, project_start, members)])
+    sources = np.concatenate([np.tile(np.arange(member_start, resource_start), 4),
+                              rng.integers(resource_start, nodes, relationships)])
+    targets = np.concatenate([bound, rng.integers(resource_start, nodes, relationships)])
+    edge_types = np.concatenate([np.zeros(members * 4, dtype=np.int64), np.ones(relationships, dtype=np.int64)])
+    return GraphIndex.from_arrays(np.array(names, dtype=object), types, parent, sources, targets, edge_types,
+                                  ["roles/editor", "INSTANCE_TO_INSTANCEGROUP"])
+
+
+def _timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def benchmark(nodes=1000000, index_dir="cai_graph_benchmark", repeat=10000, seed=0):
+    started = time.perf_counter()
+    index = synthetic_hierarchy(nodes, seed=seed)
+    print("built {:,} nodes, {:,} edges in {:.2f}s".format(len(index), len(index.out_targets),
+                                                           time.perf_counter() - started))
+    index.save(index_dir)
+    started = time.perf_counter()
+    index = GraphIndex.load(index_dir)
+    print("loaded (memory mapped) in {:.2f} ms".format((time.perf_counter() - started) * 1e3))
+
+    rng = np.random.default_rng(seed + 1)
+    picks = [int(node) for node in rng.integers(0, len(index), repeat)]
+    folder, project = index.node("folders/7"), index.node("projects/7")
+    member = index.node("serviceAccount:sa-7@example.iam.gserviceaccount.com")
+    resource = int(index.subtree(project)[-1])
+    queries = [
+        ("node(name)", lambda: index.node("projects/7")),
+        ("is_under(node, folder)", lambda: index.is_under(picks[0], folder)),
+        ("ancestors(resource)", lambda: index.ancestors(resource)),
+        ("subtree_size(folder)", lambda: index.subtree_size(folder)),
+        ("subtree(folder)", lambda: index.subtree(folder)),
+        ("related(resource)", lambda: index.related(resource)),
+        ("reachable(resource, 2)", lambda: index.reachable(resource, 2)),
+        ("touches(member)", lambda: index.touches(member)),
+    ]
+    for name, query in queries:
+        print("{:<26} {:>10.2f} us".format(name, _timed(query, max(1, repeat // 10))))
+    print("{:<26} {:>10.2f} us".format(
+        "is_under, random pairs", _timed(lambda: [index.is_under(node, folder) for node in picks], 1) / repeat))
+    print("touches(member) covers {:,} resources".format(len(index.touches(member))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Graph index over Cloud Asset Inventory exports.")
+    parser.add_argument("command", choices=["build", "query", "benchmark"])
+    parser.add_argument("--input", action="append", help="NDJSON export file, repeatable.")
+    parser.add_argument("--index", default="cai_index", help="Index directory.")
+    parser.add_argument("--under", help="List everything under this node.")
+    parser.add_argument("--touches", help="List every resource this IAM member has a role on.")
+    parser.add_argument("--related", help="List the relationships of this node.")
+    parser.add_argument("--nodes", type=int, default=1000000)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        index = GraphIndex.from_export(args.input)
+        index.save(args.index)
+        print("{:,} nodes, {:,} edges in {:.2f}s".format(len(index), len(index.out_targets),
+                                                        time.perf_counter() - started))
+    elif args.command == "query":
+        index = GraphIndex.load(args.index)
+        if args.under:
+            nodes = index.subtree(index.node(args.under))
+        elif args.touches:
+            nodes = index.touches(index.node(args.touches))
+        else:
+            targets, types = index.related(index.node(args.related))
+            for target, edge_type in zip(targets, types):
+                print("{}\t{}".format(index.edge_types[edge_type], index.names[target]))
+            return
+        for node in nodes:
+            print("{}\t{}".format(index.asset_type(node) or "", index.names[node]))
+    else:
+        benchmark(args.nodes, os.path.join(args.index, "benchmark"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import json
+
+import numpy as np
+import pytest
+
+import cai_graph
+from cai_graph import GraphIndex, euler_intervals
+
+
+def random_forest(rng, n):
+    """Parents of a random forest, shuffled so children may come before their parents."""
+    parent = np.array([rng.integers(-1, index) if index and rng.random() > 0.1 else -1 for index in range(n)],
+                      dtype=np.int64)
+    shuffle = rng.permutation(n)
+    rank = np.empty(n, dtype=np.int64)
+    rank[shuffle] = np.arange(n)
+    shuffled = np.full(n, -1, dtype=np.int64)
+    shuffled[rank] = np.where(parent >= 0, rank[np.maximum(parent, 0)], -1)
+    return shuffled
+
+
+def walk_ancestors(parent, node):
+    found = {node}
+    while parent[node] >= 0:
+        node = int(parent[node])
+        found.add(node)
+    return found
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_euler_intervals_match_an_ancestor_walk(seed):
+    rng = np.random.default_rng(seed)
+    parent = random_forest(rng, int(rng.integers(1, 60)))
+    n = len(parent)
+
+    tin, tout, order = euler_intervals(parent)
+
+    assert sorted(order) == list(range(n))
+    assert list(tin[order]) == list(range(n))
+    for node in range(n):
+        above = walk_ancestors(parent, node)
+        for ancestor in range(n):
+            assert (tin[ancestor] <= tin[node] < tout[ancestor]) == (ancestor in above)
+        # The subtree slice holds exactly the nodes that have `node` above them
+        assert sorted(order[tin[node]:tout[node]]) == [other for other in range(n)
+                                                        if node in walk_ancestors(parent, other)]
+
+
+def test_euler_intervals_reject_a_cycle():
+    with pytest.raises(ValueError):
+        euler_intervals(np.array([1, 2, 0, -1], dtype=np.int64))
+
+
+@pytest.fixture
+def export(tmp_path):
+    organization, folder, project = "organizations/1", "folders/10", "projects/100"
+    assets = [
+        {"name": "//cloudresourcemanager.googleapis.com/folders/10",
+         "asset_type": "cloudresourcemanager.googleapis.com/Folder", "ancestors": [folder, organization],
+         "iam_policy": {"bindings": [{"role": "roles/viewer", "members": ["user:ana@example.com"]}]}},
+        {"name": "//cloudresourcemanager.googleapis.com/projects/my-project",
+         "assetType": "cloudresourcemanager.googleapis.com/Project", "ancestors": [project, folder, organization]},
+        {"name": "//compute.googleapis.com/projects/my-project/zones/us-central1-a/instances/vm-1",
+         "asset_type": "compute.googleapis.com/Instance", "ancestors": [project, folder, organization],
+         "related_asset": {"asset": "//compute.googleapis.com/projects/my-project/zones/us-central1-a/disks/d-1",
+                           "asset_type": "compute.googleapis.com/Disk", "ancestors": [project, folder, organization],
+                           "relationship_type": "INSTANCE_TO_DISK"}},
+        {"name": "//storage.googleapis.com/bucket-1", "asset_type": "storage.googleapis.com/Bucket",
+         "ancestors": ["projects/200", organization],
+         "iam_policy": {"bindings": [{"role": "roles/storage.admin", "members": ["user:bo@example.com"]}]}},
+    ]
+    path = tmp_path / "export.json"
+    path.write_text("".join(json.dumps(asset) + "\n" for asset in assets))
+    return str(path)
+
+
+def names(index, ids):
+    return sorted(index.names[int(node)] for node in ids)
+
+
+def test_export_hierarchy_and_bindings(export):
+    index = GraphIndex.from_export([export])
+    vm = index.node("//compute.googleapis.com/projects/my-project/zones/us-central1-a/instances/vm-1")
+    folder, project = index.node("folders/10"), index.node("projects/100")
+
+    assert index.asset_type(project) == "cloudresourcemanager.googleapis.com/Project"
+    assert names(index, index.ancestors(vm)) == ["folders/10", "organizations/1", "projects/100"]
+    assert index.is_under(vm, folder) and not index.is_under(folder, vm)
+    assert not index.is_under(index.node("//storage.googleapis.com/bucket-1"), folder)
+    assert names(index, index.children(folder)) == ["projects/100"]
+    assert index.subtree_size(project) == 3
+    targets, types = index.related(vm)
+    assert names(index, targets) == ["//compute.googleapis.com/projects/my-project/zones/us-central1-a/disks/d-1"]
+    assert [index.edge_types[edge_type] for edge_type in types] == ["INSTANCE_TO_DISK"]
+    # A folder binding reaches everything under the folder
+    assert names(index, index.touches(index.node("user:ana@example.com"))) == names(index, index.subtree(folder))
+    with pytest.raises(KeyError):
+        index.node("projects/missing")
+
+
+def test_saved_index_answers_the_same(tmp_path):
+    index = cai_graph.synthetic_hierarchy(nodes=2000, folders=20, projects=100, members=10, relationships=300)
+    loaded = GraphIndex.load(index.save(str(tmp_path / "index")))
+    member = loaded.node("serviceAccount:sa-3@example.iam.gserviceaccount.com")
+    folder = loaded.node("folders/7")
+
+    assert len(loaded) == len(index)
+    assert list(loaded.subtree(folder)) == list(index.subtree(folder))
+    assert list(loaded.touches(member)) == list(index.touches(member))
+    assert list(loaded.reachable(member, max_depth=1)) == sorted(set(int(node) for node in loaded.related(member)[0]))
@@ -0,0 +1,279 @@
+import argparse
+import mmap
+import os
+import stat
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+################################################
+# Fast line and record reading
+################################################
+#
+# The `readline(10)` loop in python_learning.py makes one Python call per 10
+# bytes. The helpers here memory map the file (or read it in large buffers
+# when it can't be mapped, e.g. a pipe or a /proc file) and hand out whole
+# blocks, lines or fixed-size records, as memoryview slices of the mapping
+# where possible so nothing is copied.
+#
+# Whole-block scans (iter_blocks, count_lines) run at memory speed. Handing out
+# one Python object per line is bound by creating those objects, about as fast
+# as `for line in file`, so keep per-line work for when it is really needed.
+#
+#   for block in iter_blocks("big.log"):          # blocks that end on a newline
+#   for line in iter_lines("big.log"):            # bytes, without the newline
+#   for line in iter_lines("big.log", views=True):  # memoryview, zero copy
+#   for record in iter_records("data.bin", 64):   # memoryview of 64 bytes
+#   parallel("big.log", count_lines, workers=8)   # one line-aligned range per process
+#
+#   python line_reader.py benchmark --size-mb 1024
+#
+
+# Bytes handed out per block, and read per call when the file is not mapped
+BUFFER_SIZE = 1024 * 1024
+
+NEWLINE = b"\n"
+
+
+def mappable(path):
+    """
+    Whether the file can be memory mapped: a regular file with a size. Pipes
+    and devices are not regular, /proc files are but report a size of 0.
+    """
+    status = os.stat(path)
+    return stat.S_ISREG(status.st_mode) and status.st_size > 0
+
+
+def map_file(path):
+    """
+    Read-only memoryview of the whole file. The file is unmapped once the last
+    view on it (slices included) is garbage collected, so lines and records
+    handed out stay valid for as long as they are kept. Files that can't be
+    mapped (see mappable) are read into memory instead.
+    """
+    with open(path, "rb") as file_descriptor:
+        if not mappable(path):
+            return memoryview(file_descriptor.read())
+        return memoryview(mmap.mmap(file_descriptor.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def _block_end(mapping, start, stop, block_size):
+    end = start + block_size
+    if end >= stop:
+        return stop
+    newline = mapping.rfind(NEWLINE, start, end)
+    if newline == -1:
+        # One line longer than the block, extend to its end
+        newline = mapping.find(NEWLINE, end, stop)
+    return stop if newline == -1 else newline + 1
+
+
+def iter_blocks(path, block_size=BUFFER_SIZE, start=0, stop=None, use_mmap=True):
+    """
+    Yield blocks of about `block_size` bytes that end on a newline (the last one
+    may not). With mmap the blocks are memoryview slices of the mapping and stay
+    mapped as long as they are referenced; otherwise, or when the file can't be
+    mapped, they are bytes.
+    """
+    if not use_mmap or not mappable(path):
+        yield from _read_blocks(path, block_size, start, stop)
+        return
+    view = map_file(path)
+    stop = len(view) if stop is None else min(stop, len(view))
+    while start < stop:
+        end = _block_end(view.obj, start, stop, block_size)
+        yield view[start:end]
+        start = end
+
+
+def _read_blocks(path, block_size, start, stop):
+    # Large reads, the partial line at the end of each read is carried over
+    with open(path, "rb", buffering=0) as file_descriptor:
+        if start:
+            file_descriptor.seek(start)
+        remaining = None if stop is None else stop - start
+        carry = b""
+        while remaining is None or remaining > 0:
+            data = file_descriptor.read(block_size if remaining is None else min(block_size, remaining))
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            data = carry + data
+            newline = data.rfind(NEWLINE)
+            if newline == -1:
+                carry = data
+                continue
+            carry = data[newline + 1:]
+            yield data[:newline + 1]
+        if carry:
+            yield carry
+
+
+def iter_lines(path, views=False, block_size=BUFFER_SIZE, start=0, stop=None):
+    """
+    Yield every line without its newline. Lines are bytes, split a block at a
+    time; with `views` they are zero-copy memoryview slices of the mapping.
+    """
+    if views:
+        return _iter_line_views(path, start, stop)
+    # chain() hands the lines out from C, without a generator step per line
+    return chain.from_iterable(map(_split_block, iter_blocks(path, block_size, start, stop)))
+
+
+def _split_block(block):
+    lines = block.tobytes().split(NEWLINE) if isinstance(block, memoryview) else block.split(NEWLINE)
+    if not lines[-1]:
+        # The block ended with a newline
+        lines.pop()
+    return lines
+
+
+def _iter_line_views(path, start, stop):
+    if not mappable(path):
+        # Views of the blocks read, they end on a newline
+        for block in _read_blocks(path, BUFFER_SIZE, start, stop):
+            yield from _line_views(memoryview(block), 0, len(block))
+        return
+    view = map_file(path)
+    yield from _line_views(view, start, len(view) if stop is None else min(stop, len(view)))
+
+
+def _line_views(view, start, stop):
+    find = view.obj.find
+    while start < stop:
+        newline = find(NEWLINE, start, stop)
+        end = stop if newline == -1 else newline
+        yield view[start:end]
+        start = end + 1
+
+
+def iter_records(path, record_size, start=0, stop=None):
+    """Yield fixed-size records as memoryview slices of the mapping, records [start, stop)."""
+    view = map_file(path)
+    if len(view) % record_size:
+        raise ValueError("{} is {} bytes, not a multiple of {} byte records".format(path, len(view), record_size))
+    records = len(view) // record_size
+    stop = records if stop is None else min(stop, records)
+    for offset in range(start * record_size, stop * record_size, record_size):
+        yield view[offset:offset + record_size]
+
+
+def line_ranges(path, parts):
+    """Split the file in up to `parts` (start, stop) byte ranges that begin at the start of a line."""
+    if not stat.S_ISREG(os.stat(path).st_mode):
+        raise ValueError("{} is not a regular file, it can't be split in ranges".format(path))
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    bounds = [0]
+    mapping = map_file(path).obj
+    for part in range(1, parts):
+        newline = mapping.find(NEWLINE, max(size * part // parts, bounds[-1]))
+        if newline == -1 or newline + 1 >= size:
+            break
+        if newline + 1 > bounds[-1]:
+            bounds.append(newline + 1)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parallel(path, func, workers=None, parts=None):
+    """
+    Run `func(path, start, stop)` over line-aligned ranges of the file in a
+    process pool, results in file order. `func` must be picklable (module level).
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = line_ranges(path, parts or workers)
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(func, [path] * len(ranges), *zip(*ranges))) if ranges else []
+
+
+def count_lines(path, start=0, stop=None, block_size=BUFFER_SIZE):
+    """Lines in [start, stop), a last line without a newline counts too."""
+    lines = 0
+    last = NEWLINE
+    for block in iter_blocks(path, block_size, start, stop):
+        data = block.tobytes() if isinstance(block, memoryview) else block
+        lines += data.count(NEWLINE)
+        last = data[-1:]
+    return lines + (last != NEWLINE)
+
+
+################################################
+# Benchmark against the readline(10) loop
+################################################
+
+
+def drain(iterable):
+    # Consumes an iterable from C, so only the reader itself is measured
+    deque(iterable, maxlen=0)
+
+
+def readline_loop(path, limit=None):
+    # The pattern from python_learning.py, stops after `limit` bytes
+    read = 0
+    with open(path, "r") as file_descriptor:
+        line = file_descriptor.readline(10)
+        while line and (limit is None or read < limit):
+            read += len(line)
+            line = file_descriptor.readline(10)
+    return read
+
+
+def write_sample(path, size, line_length=100):
+    """Whole lines only, `size` is rounded down to a multiple of `line_length`."""
+    size -= size % line_length
+    line = (b"x" * (line_length - 1)) + NEWLINE
+    chunk = line * (BUFFER_SIZE // line_length)
+    with open(path, "wb") as file_descriptor:
+        written = 0
+        while written < size:
+            file_descriptor.write(chunk[:size - written])
+            written += min(len(chunk), size - written)
+    return size
+
+
+def benchmark(size_mb, readline_mb, workers):
+    path = os.path.join(tempfile.mkdtemp(), "sample.log")
+    size = size_mb * 1024 * 1024
+    size = write_sample(path, size)
+
+    def run(name, fn, scanned=size):
+        started = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - started
+        print("{:<28} {:>8.2f}s {:>10.1f} MB/s".format(name, seconds, scanned / seconds / 1024 / 1024))
+
+    def for_line():
+        with open(path, "rb") as file_descriptor:
+            drain(file_descriptor)
+
+    print("{} MB file, 100 byte lines".format(size_mb))
+    readline_bytes = min(size, readline_mb * 1024 * 1024)
+    run("readline(10) loop", lambda: readline_loop(path, readline_bytes), readline_bytes)
+    run("for line in file", for_line)
+    run("iter_lines", lambda: drain(iter_lines(path)))
+    run("iter_lines(views=True)", lambda: drain(iter_lines(path, views=True)))
+    run("iter_records(100)", lambda: drain(iter_records(path, 100)))
+    run("count_lines", lambda: count_lines(path))
+    run("parallel count_lines ({})".format(workers), lambda: sum(parallel(path, count_lines, workers)))
+
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the line reader against the readline(10) loop.")
+    parser.add_argument("command", choices=["benchmark"])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--readline-mb", type=int, default=16, help="Bytes scanned by the slow readline loop.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    benchmark(args.size_mb, args.readline_mb, args.workers)
+
+
+if __name__ == "__main__":
+    main()
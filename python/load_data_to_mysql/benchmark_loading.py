@@ -0,0 +1,104 @@
+import argparse
+import csv
+import json
+import sys
+
+import loading
+
+#
+# Benchmark harness for loading.py.
+#
+# Loads the same synthetic rows with every method (`executemany`, multi-row
+# INSERT and `LOAD DATA LOCAL INFILE`) at several batch sizes into a scratch
+# copy of the customers table, and writes one result row per run with the
+# throughput and the time spent in each phase (connect, read, serialize,
+# execute, commit). Run it against a local MySQL or MariaDB server that has
+# `local_infile=1`:
+#
+#   python benchmark_loading.py --host 127.0.0.1 --user root --password secret --database test \
+#       --rows 200000 --batch-sizes 100,1000,10000,50000 --output results.csv
+#
+
+METHODS = ("executemany", "insert", "load-data")
+BENCH_TABLE = "customers_bench"
+
+
+def reset_table(connection, table=BENCH_TABLE):
+    cursor = connection.cursor()
+    cursor.execute(loading.CREATE_TABLE_SQL)
+    cursor.execute("DROP TABLE IF EXISTS {}".format(table))
+    cursor.execute("CREATE TABLE {} LIKE {}".format(table, loading.TABLE))
+    cursor.close()
+
+
+def run_once(config, method, batch_size, rows, commit_every):
+    """Load `rows` synthetic rows in a fresh table, returns the LoadStats summary."""
+    stats = loading.LoadStats(keep_batches=False)
+    connection = loading.connect(config, stats, allow_local_infile=True)
+    try:
+        reset_table(connection)
+        stats = loading.stream_load(connection, loading.generate_rows(rows), method=method,
+                                    chunk_rows=batch_size, commit_every=commit_every,
+                                    table=BENCH_TABLE, stats=stats)
+    finally:
+        connection.close()
+    return stats.summary()
+
+
+def run_matrix(config, methods, batch_sizes, rows, commit_every, repeat=1):
+    results = []
+    for method in methods:
+        for batch_size in batch_sizes:
+            for attempt in range(repeat):
+                summary = run_once(config, method, batch_size, rows, commit_every)
+                result = dict({"method": method, "batch_size": batch_size, "attempt": attempt}, **summary)
+                print("{method:<12} batch {batch_size:>6}: {rows_per_second:>12,.0f} rows/s "
+                      "(execute {execute_s:.2f}s, serialize {serialize_s:.2f}s, commit {commit_s:.2f}s)".format(**result),
+                      file=sys.stderr)
+                results.append(result)
+    return results
+
+
+def write_results(results, output=None, fmt="json"):
+    """Write the comparison table as JSON or CSV to `output` (stdout by default)."""
+    stream = open(output, "w", newline="") if output else sys.stdout
+    try:
+        if fmt == "csv":
+            writer = csv.DictWriter(stream, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+        else:
+            json.dump(results, stream, indent=2)
+            stream.write("\n")
+    finally:
+        if output:
+            stream.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare MySQL load methods and batch sizes.")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows loaded per run.")
+    parser.add_argument("--methods", default=",".join(METHODS))
+    parser.add_argument("--batch-sizes", default="100,1000,10000")
+    parser.add_argument("--commit-every", type=int, default=loading.DEFAULT_COMMIT_EVERY)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per method and batch size.")
+    parser.add_argument("--output", help="Result file, stdout when not given.")
+    parser.add_argument("--format", choices=["json", "csv"],
+                        help="Output format, guessed from --output's extension, JSON by default.")
+    loading.add_connection_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format or ("csv" if args.output and args.output.endswith(".csv") else "json")
+    results = run_matrix(loading.connection_config(args),
+                         [method.strip() for method in args.methods.split(",")],
+                         [int(size) for size in args.batch_sizes.split(",")],
+                         args.rows, args.commit_every, args.repeat)
+    write_results(results, args.output, fmt)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import argparse
+import csv
+import queue
+import random
+import threading
+import time
+
+import loading
+
+#
+# CDC workload generator for the Datastream MySQL-to-BigQuery examples.
+#
+# Produces a mix of INSERT, UPDATE and DELETE operations on the `customers`
+# table at a target rate. The rate limiter is open loop: operations are
+# scheduled at fixed (or Poisson) arrival times whether or not the previous
+# ones have finished, so a slow server shows up as growing latency and backlog
+# instead of silently lowering the offered load.
+#
+# Every change runs in its own transaction and is written to a change log with
+# its sequence number, the scheduled time and the commit timestamp. The commit
+# timestamp is this client's wall clock once COMMIT has returned, not the
+# server's, so the clock `replicated_at` is taken from has to be kept in sync
+# with it (NTP) for the latencies to hold. Updates and deletes that find no row
+# are not logged, and changes that fail are counted and reported. Inserted
+# and updated rows carry the sequence number in `address` ("cdc <seq>"), so the
+# replicated rows can be joined back to the log to compute end-to-end latency:
+#
+#   python cdc_workload.py --rate 500 --duration 300 --connections 8 --log changes.csv
+#   python cdc_workload.py --report changes.csv --replicated replicated.csv
+#
+# `replicated.csv` needs the columns `seq` (or `id` for deletes) and
+# `replicated_at` (epoch seconds) taken from the destination.
+#
+
+DEFAULT_MIX = "insert=0.5,update=0.4,delete=0.1"
+
+LOG_FIELDS = ["seq", "op", "id", "connection", "scheduled_at", "started_at", "committed_at"]
+
+# How many existing ids are sampled from the table at start for updates and deletes.
+ID_SAMPLE = 100000
+
+
+def parse_mix(text):
+    """Parse `insert=0.5,update=0.4,delete=0.1` into normalized weights."""
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip().lower()
+        if op not in ("insert", "update", "delete"):
+            raise ValueError("Unknown operation in mix: {}".format(op))
+        mix[op] = float(weight)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("The operation mix needs a positive weight")
+    return {op: weight / total for op, weight in mix.items()}
+
+
+class WorkerErrors:
+    """Changes that failed, counted across the workers, the first few messages are kept."""
+
+    KEEP = 5
+
+    def __init__(self):
+        self.count = 0
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def add(self, name, seq, error):
+        with self._lock:
+            self.count += 1
+            if len(self.messages) < self.KEEP:
+                self.messages.append("{} seq {}: {!r}".format(name, seq, error))
+
+
+class IdPool:
+    """Ids known to exist, shared by the workers for updates and deletes."""
+
+    def __init__(self, ids=()):
+        self._ids = list(ids)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, row_id):
+        with self._lock:
+            self._ids.append(row_id)
+
+    def pick(self, rng):
+        with self._lock:
+            return rng.choice(self._ids) if self._ids else None
+
+    def take(self, rng):
+        """Remove and return a random id (swap with the last one, O(1))."""
+        with self._lock:
+            if not self._ids:
+                return None
+            i = rng.randrange(len(self._ids))
+            self._ids[i], self._ids[-1] = self._ids[-1], self._ids[i]
+            return self._ids.pop()
+
+
+def schedule(rate, duration, mix, poisson=False, seed=None):
+    """
+    Yield (seq, op, scheduled_at offset in seconds) for an open-loop run.
+    Arrivals are evenly spaced, or exponentially distributed with `poisson`.
+    """
+    rng = random.Random(seed)
+    ops, weights = list(mix), list(mix.values())
+    offset, seq = 0.0, 0
+    while offset < duration:
+        yield seq, rng.choices(ops, weights)[0], offset
+        seq += 1
+        offset += rng.expovariate(rate) if poisson else 1.0 / rate
+
+
+def apply_change(cursor, op, seq, ids, rng):
+    """
+    Run one change, returns the id it touched. None when there was nothing to
+    update or delete, or the row was already gone (deleted by someone else).
+    """
+    if op == "insert":
+        cursor.execute("INSERT INTO customers (name, address) VALUES (%s, %s)",
+                       ("cdc-{}".format(seq), "cdc {}".format(seq)))
+        return cursor.lastrowid
+    if op == "update":
+        row_id = ids.pick(rng)
+        if row_id is not None:
+            cursor.execute("UPDATE customers SET address = %s WHERE id = %s", ("cdc {}".format(seq), row_id))
+    else:
+        row_id = ids.take(rng)
+        if row_id is not None:
+            cursor.execute("DELETE FROM customers WHERE id = %s", (row_id,))
+    # A change that touched no row replicates nothing, it must not be logged
+    return row_id if row_id is not None and cursor.rowcount > 0 else None
+
+
+def worker(name, config, work, changes, ids, started, seed, errors):
+    # One connection per worker, every change is committed on its own.
+    # Failures are counted in `errors`, a failed change is rolled back and the worker goes on.
+    rng = random.Random(seed)
+    try:
+        connection = loading.connect(config)
+    except Exception as error:
+        # The other workers take the work
+        errors.add(name, None, error)
+        return
+    cursor = connection.cursor()
+    try:
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            seq, op, offset = item
+            began = time.time()
+            try:
+                row_id = apply_change(cursor, op, seq, ids, rng)
+                connection.commit()
+            except Exception as error:
+                errors.add(name, seq, error)
+                try:
+                    connection.rollback()
+                except Exception:
+                    pass
+                continue
+            committed = time.time()
+            if op == "insert":
+                ids.add(row_id)
+            if row_id is not None:
+                changes.put({"seq": seq, "op": op, "id": row_id, "connection": name,
+                             "scheduled_at": started + offset, "started_at": began,
+                             "committed_at": committed})
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def log_writer(path, changes):
+    with open(path, "w", newline="") as file_descriptor:
+        writer = csv.DictWriter(file_descriptor, fieldnames=LOG_FIELDS)
+        writer.writeheader()
+        while True:
+            change = changes.get()
+            if change is None:
+                return
+            writer.writerow(change)
+
+
+def load_ids(config, limit=ID_SAMPLE):
+    connection = loading.connect(config)
+    cursor = connection.cursor()
+    cursor.execute(loading.CREATE_TABLE_SQL)
+    cursor.execute("SELECT id FROM customers ORDER BY id DESC LIMIT %s", (limit,))
+    ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    connection.close()
+    return ids
+
+
+def run(config, rate, duration, mix, connections=4, log_path="changes.csv", poisson=False, seed=None):
+    """
+    Drive the workload, returns a summary dict with offered/achieved rates,
+    backlog, failed changes and the ones left unprocessed (no worker connected).
+    """
+    ids = IdPool(load_ids(config))
+    errors = WorkerErrors()
+    work, changes = queue.Queue(), queue.Queue()
+    writer = threading.Thread(target=log_writer, args=(log_path, changes), daemon=True)
+    writer.start()
+
+    started = time.time()
+    clock = time.perf_counter()
+    workers = [threading.Thread(target=worker, name="cdc-{}".format(i),
+                                args=("cdc-{}".format(i), config, work, changes, ids, started,
+                                      None if seed is None else seed + i, errors),
+                                daemon=True)
+               for i in range(connections)]
+    for thread in workers:
+        thread.start()
+
+    # Open loop: enqueue each operation at its scheduled time, never wait for the workers.
+    scheduled, max_backlog = 0, 0
+    for seq, op, offset in schedule(rate, duration, mix, poisson, seed):
+        delay = offset - (time.perf_counter() - clock)
+        if delay > 0:
+            time.sleep(delay)
+        work.put((seq, op, offset))
+        scheduled += 1
+        max_backlog = max(max_backlog, work.qsize())
+
+    for _ in workers:
+        work.put(None)
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - clock
+    changes.put(None)
+    writer.join()
+    # Work left behind when workers failed to connect, their stop markers aside
+    unprocessed = 0
+    while not work.empty():
+        unprocessed += work.get() is not None
+
+    return {"scheduled": scheduled, "offered_rate": rate, "achieved_rate": scheduled / elapsed,
+            "elapsed": elapsed, "max_backlog": max_backlog, "errors": errors.count,
+            "error_messages": errors.messages, "unprocessed": unprocessed}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def latency_report(log_path, replicated_path, percentiles=(50, 90, 95, 99, 99.9)):
+    """
+    Join the change log with the replicated rows and compute end-to-end latency percentiles.
+    Inserts and updates are matched on `seq`, deletes on `id`.
+    """
+    replicated_seq, replicated_id = {}, {}
+    with open(replicated_path, newline="") as file_descriptor:
+        for row in csv.DictReader(file_descriptor):
+            at = float(row["replicated_at"])
+            if row.get("seq"):
+                replicated_seq[int(row["seq"])] = at
+            if row.get("id"):
+                replicated_id[int(row["id"])] = at
+
+    latencies, missing = [], 0
+    with open(log_path, newline="") as file_descriptor:
+        for change in csv.DictReader(file_descriptor):
+            if change["op"] == "delete":
+                at = replicated_id.get(int(change["id"]))
+            else:
+                at = replicated_seq.get(int(change["seq"]))
+            if at is None:
+                missing += 1
+            else:
+                latencies.append(at - float(change["committed_at"]))
+
+    latencies.sort()
+    report = {"matched": len(latencies), "missing": missing}
+    for pct in percentiles:
+        report["p{}".format(pct)] = percentile(latencies, pct)
+    report["max"] = latencies[-1] if latencies else None
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a CDC workload on the customers table.")
+    parser.add_argument("--rate", type=float, default=100.0, help="Target operations per second.")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weights of insert/update/delete.")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times.")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--log", default="changes.csv", help="Change log with commit timestamps.")
+    parser.add_argument("--report", metavar="LOG", help="Compute latency percentiles for a change log.")
+    parser.add_argument("--replicated", help="CSV with seq/id and replicated_at, used with --report.")
+    loading.add_connection_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.report:
+        report = latency_report(args.report, args.replicated)
+        for key, value in report.items():
+            print("{}: {}".format(key, value))
+        return report
+
+    summary = run(loading.connection_config(args), args.rate, args.duration, parse_mix(args.mix),
+                  connections=args.connections, log_path=args.log, poisson=args.poisson, seed=args.seed)
+    print("{scheduled} changes in {elapsed:.2f}s, offered {offered_rate:,.0f}/s, "
+          "achieved {achieved_rate:,.0f}/s, max backlog {max_backlog}".format(**summary))
+    if summary["errors"] or summary["unprocessed"]:
+        print("{errors} changes failed, {unprocessed} never ran".format(**summary))
+        for message in summary["error_messages"]:
+            print("  ", message)
+    print("Change log written to", args.log)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import abc
+import argparse
+import hashlib
+import sqlite3
+import time
+
+import loading
+
+#
+# Chunked checksum comparison of the `customers` table on the Datastream source
+# and on a replica of it.
+#
+# Both sides are walked in primary key chunks with keyset pagination (`id > last
+# ORDER BY id LIMIT n`, never OFFSET from the start of the table). For every
+# chunk each server computes COUNT(*) and the BIT_XOR of a 64-bit hash of every
+# row, so only those two numbers cross the network. Chunks whose checksums
+# differ are split into `fanout` smaller chunks and compared again, down to
+# chunks of `leaf_rows` rows, where the per-row hashes are fetched to name the
+# ids that are missing, extra or different on the replica.
+#
+# The replica can be another MySQL database or a SQLite file (a local copy of a
+# replicated table, for example). Rows are hashed on the text form of their
+# columns, MD5 of `id#name#address` with NULL as `\N`, the same on both engines.
+#
+#   python consistency_check.py --host 127.0.0.1 --replica-host 127.0.0.1 --replica-database replica
+#   python consistency_check.py --host 127.0.0.1 --replica-sqlite customers.db --chunk-rows 50000
+#
+
+DEFAULT_CHUNK_ROWS = 10000
+DEFAULT_FANOUT = 16
+DEFAULT_LEAF_ROWS = 16
+# Keys listed per query when one side of a chunk is empty
+KEY_PAGE_ROWS = 10000
+KEY = "id"
+
+NULL = "\\N"
+SEPARATOR = "#"
+MASK = (1 << 64) - 1
+
+
+def row_hash(text):
+    """First 8 bytes of the MD5 of the row text, signed like a SQLite integer."""
+    return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+class BitXor:
+    """BIT_XOR aggregate for SQLite."""
+
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= value
+
+    def finalize(self):
+        return self.value
+
+
+class CheckStats:
+    def __init__(self):
+        self.chunks = 0
+        self.queries = 0
+        self.rows_fetched = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def report(self):
+        return "{} chunks compared, {} queries, {} row hashes fetched, ~{:,} bytes received in {:.2f}s".format(
+            self.chunks, self.queries, self.rows_fetched, self.bytes, self.elapsed)
+
+
+class Side(abc.ABC):
+    """
+    One copy of the table. `placeholder`, `row_text` and `row_hash_sql` are
+    what differs between engines; the queries are the same.
+    """
+
+    placeholder = "%s"
+
+    def __init__(self, connection, table=loading.TABLE, columns=loading.COLUMNS, key=KEY, stats=None):
+        self.connection = connection
+        self.table = table
+        self.columns = columns
+        self.key = key
+        self.stats = stats or CheckStats()
+
+    @abc.abstractmethod
+    def row_text(self):
+        """SQL expression of the text a row is hashed on."""
+
+    @abc.abstractmethod
+    def row_hash_sql(self):
+        """SQL expression of the 64-bit row hash."""
+
+    def _where(self, low, high):
+        # (low, high], None is unbounded
+        conditions, params = [], []
+        if low is not None:
+            conditions.append("{} > {}".format(self.key, self.placeholder))
+            params.append(low)
+        if high is not None:
+            conditions.append("{} <= {}".format(self.key, self.placeholder))
+            params.append(high)
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def _query(self, sql, params):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        self.stats.queries += 1
+        # Every value received is an 8 byte integer
+        self.stats.bytes += sum(8 * len(row) for row in rows)
+        return rows
+
+    def checksum(self, low, high):
+        """(rows, xor of the row hashes) of the chunk (low, high]."""
+        where, params = self._where(low, high)
+        count, checksum = self._query("SELECT COUNT(*), BIT_XOR({}) FROM {}{}".format(
+            self.row_hash_sql(), self.table, where), params)[0]
+        return count, (int(checksum or 0) & MASK)
+
+    def next_bound(self, low, high, rows):
+        """The key `rows` rows after `low` (or the last one before `high`), None when the range is empty."""
+        where, params = self._where(low, high)
+        result = self._query("SELECT MAX({key}) FROM (SELECT {key} FROM {table}{where} ORDER BY {key} LIMIT {rows}) "
+                             "AS chunk".format(key=self.key, table=self.table, where=where, rows=int(rows)), params)
+        return result[0][0]
+
+    def row_hashes(self, low, high):
+        """{key: row hash} of the chunk (low, high]."""
+        where, params = self._where(low, high)
+        rows = self._query("SELECT {}, {} FROM {}{}".format(self.key, self.row_hash_sql(), self.table, where), params)
+        self.stats.rows_fetched += len(rows)
+        return {key: int(value) & MASK for key, value in rows}
+
+    def keys(self, low, high, page_rows=KEY_PAGE_ROWS):
+        """Yield the keys of the chunk (low, high] in order, `page_rows` per query."""
+        while True:
+            where, params = self._where(low, high)
+            rows = self._query("SELECT {key} FROM {table}{where} ORDER BY {key} LIMIT {rows}".format(
+                key=self.key, table=self.table, where=where, rows=int(page_rows)), params)
+            self.stats.rows_fetched += len(rows)
+            for (key,) in rows:
+                yield key
+            if len(rows) < page_rows:
+                return
+            low = rows[-1][0]
+
+
+class MySQLSide(Side):
+    def row_text(self):
+        return "CONCAT_WS('{}', {})".format(SEPARATOR, ", ".join(
+            "COALESCE({}, '{}')".format(column, NULL.replace("\\", "\\\\")) for column in (self.key,) + self.columns))
+
+    def row_hash_sql(self):
+        return "CAST(CONV(LEFT(MD5({}), 16), 16, 10) AS UNSIGNED)".format(self.row_text())
+
+
+class SQLiteSide(Side):
+    placeholder = "?"
+
+    def __init__(self, connection, *args, **kwargs):
+        Side.__init__(self, connection, *args, **kwargs)
+        connection.create_function("row_hash", 1, row_hash, deterministic=True)
+        connection.create_aggregate("BIT_XOR", 1, BitXor)
+
+    def row_text(self):
+        return " || '{}' || ".format(SEPARATOR).join(
+            "COALESCE(CAST({} AS TEXT), '{}')".format(column, NULL) for column in (self.key,) + self.columns)
+
+    def row_hash_sql(self):
+        return "row_hash({})".format(self.row_text())
+
+
+class Differences:
+    def __init__(self):
+        self.missing = []
+        self.extra = []
+        self.changed = []
+
+    def __bool__(self):
+        return bool(self.missing or self.extra or self.changed)
+
+    def report(self):
+        return "{} missing on the replica, {} extra, {} different".format(
+            len(self.missing), len(self.extra), len(self.changed))
+
+
+def compare_rows(source, replica, low, high, differences):
+    source_rows, replica_rows = source.row_hashes(low, high), replica.row_hashes(low, high)
+    for key, value in source_rows.items():
+        if key not in replica_rows:
+            differences.missing.append(key)
+        elif replica_rows[key] != value:
+            differences.changed.append(key)
+    differences.extra.extend(key for key in replica_rows if key not in source_rows)
+
+
+def compare_chunk(source, replica, low, high, differences, fanout=DEFAULT_FANOUT, leaf_rows=DEFAULT_LEAF_ROWS):
+    """Compare (low, high], splitting it up while the checksums differ."""
+    source.stats.chunks += 1
+    source_sum, replica_sum = source.checksum(low, high), replica.checksum(low, high)
+    if source_sum == replica_sum:
+        return
+    if not source_sum[0] or not replica_sum[0]:
+        # One side has no rows here, all of the other's are missing or extra, no need to split
+        side, found = (source, differences.missing) if source_sum[0] else (replica, differences.extra)
+        found.extend(side.keys(low, high))
+        return
+    rows = max(source_sum[0], replica_sum[0])
+    if rows <= leaf_rows:
+        compare_rows(source, replica, low, high, differences)
+        return
+    # Split on the keys of the side holding more rows, the other may have none at all
+    splitter = source if source_sum[0] >= replica_sum[0] else replica
+    step = -(-rows // fanout)
+    start = low
+    while True:
+        bound = splitter.next_bound(start, high, step)
+        if bound is None:
+            # The splitter has no keys left, the other side may still have some
+            compare_chunk(source, replica, start, high, differences, fanout, leaf_rows)
+            return
+        compare_chunk(source, replica, start, bound, differences, fanout, leaf_rows)
+        if high is not None and bound >= high:
+            return
+        start = bound
+
+
+def compare_tables(source, replica, chunk_rows=DEFAULT_CHUNK_ROWS, fanout=DEFAULT_FANOUT,
+                   leaf_rows=DEFAULT_LEAF_ROWS):
+    """
+    Walk the source in chunks of `chunk_rows` rows and compare each with the
+    same key range of the replica. Returns the Differences found.
+    """
+    if chunk_rows < 1 or leaf_rows < 1:
+        raise ValueError("chunk_rows and leaf_rows must be at least 1")
+    if fanout < 2:
+        # A single sub-chunk is the chunk itself, splitting would never end
+        raise ValueError("A differing chunk must be split in at least 2, not {}".format(fanout))
+    differences = Differences()
+    low = None
+    while True:
+        high = source.next_bound(low, None, chunk_rows)
+        # Past the last source key the rest of the replica is one open chunk
+        compare_chunk(source, replica, low, high, differences, fanout, leaf_rows)
+        if high is None:
+            break
+        low = high
+    return differences
+
+
+def sqlite_side(path, stats, table=loading.TABLE):
+    return SQLiteSide(sqlite3.connect(path), table, stats=stats)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Compare the customers table on the source and a replica.")
+    parser.add_argument("--table", default=loading.TABLE)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--fanout", type=int, default=DEFAULT_FANOUT, help="Sub-chunks a differing chunk is split in.")
+    parser.add_argument("--leaf-rows", type=int, default=DEFAULT_LEAF_ROWS,
+                        help="Chunks this small are compared row by row.")
+    parser.add_argument("--source-sqlite", help="Read the source from this SQLite file instead of MySQL.")
+    parser.add_argument("--replica-sqlite", help="Read the replica from this SQLite file instead of MySQL.")
+    loading.add_connection_args(parser)
+    # Replica connection, each setting defaults to the source one
+    for name in ("host", "port", "user", "password", "database"):
+        parser.add_argument("--replica-{}".format(name), type=int if name == "port" else str)
+    return parser
+
+
+def parse_args(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.fanout < 2:
+        parser.error("--fanout must be at least 2")
+    if args.chunk_rows < 1 or args.leaf_rows < 1:
+        parser.error("--chunk-rows and --leaf-rows must be at least 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stats = CheckStats()
+    source_config = loading.connection_config(args)
+    replica_config = {name: getattr(args, "replica_" + name) or value for name, value in source_config.items()}
+
+    if args.source_sqlite:
+        source = sqlite_side(args.source_sqlite, stats, args.table)
+    else:
+        source = MySQLSide(loading.connect(source_config), args.table, stats=stats)
+    if args.replica_sqlite:
+        replica = sqlite_side(args.replica_sqlite, stats, args.table)
+    else:
+        replica = MySQLSide(loading.connect(replica_config), args.table, stats=stats)
+
+    differences = compare_tables(source, replica, args.chunk_rows, args.fanout, args.leaf_rows)
+    source.connection.close()
+    replica.connection.close()
+
+    for label, keys in (("missing", differences.missing), ("extra", differences.extra),
+                        ("changed", differences.changed)):
+        for key in keys:
+            print("{} {}".format(label, key))
+    print(differences.report())
+    print(stats.report())
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
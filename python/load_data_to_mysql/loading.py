@@ -1,24 +1,48 @@
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import os
+import tempfile
+import time
+
 import mysql.connector
 
-# Connect to the MySQL database
-mydb = mysql.connector.connect(
-    host="database_ip_address",
-    user="datastream",
-    password="password_goes_here",
-    database="datastream-src-database"
-)
+#
+# Streaming loader for the `customers` table used as the Datastream source.
+#
+# Rows are read from a CSV or NDJSON file in chunks (the file is never loaded
+# as a whole), sent as multi-row INSERT statements sized to fit within the
+# server's `max_allowed_packet` (or as `LOAD DATA LOCAL INFILE` per chunk) and
+# committed every N rows instead of once at the end.
+#
+# Examples:
+#   python loading.py                                   # the five sample rows
+#   python loading.py --input customers.csv --commit-every 100000
+#   python loading.py --input customers.ndjson --method load-data
+#   python loading.py --generate 1000000 --host 127.0.0.1 --password secret
+#
 
-mycursor = mydb.cursor()
+# Connection defaults, can be overridden with environment variables or flags.
+DB_CONFIG = {
+    "host": os.environ.get("MYSQL_HOST", "database_ip_address"),
+    "port": int(os.environ.get("MYSQL_PORT", "3306")),
+    "user": os.environ.get("MYSQL_USER", "datastream"),
+    "password": os.environ.get("MYSQL_PASSWORD", "password_goes_here"),
+    "database": os.environ.get("MYSQL_DATABASE", "datastream-src-database"),
+}
 
-# Create a new table 'customers' if it doesn't exist
-mycursor.execute(
-    "CREATE TABLE IF NOT EXISTS customers (id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(255), address VARCHAR(255))")
+TABLE = "customers"
+COLUMNS = ("name", "address")
 
-# SQL query for inserting data
-sql = "INSERT INTO customers (name, address) VALUES (%s, %s)"
+# Create a new table 'customers' if it doesn't exist
+CREATE_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS customers "
+    "(id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(255), address VARCHAR(255))")
 
-# Data to be inserted
-vals = [
+# Data inserted when no input file is given
+SAMPLE_ROWS = [
     ("John", "Highway 21"),
     ("Jane", "Lowstreet 4"),
     ("Mary", "Apple st 652"),
@@ -26,11 +50,434 @@ vals = [
     ("Sandy", "Ocean blvd 2")
 ]
 
-# Insert multiple records into the 'customers' table
-mycursor.executemany(sql, vals)
+# Rows read from the input per chunk, and rows per transaction.
+DEFAULT_CHUNK_ROWS = 10000
+DEFAULT_COMMIT_EVERY = 100000
+
+# Only fill this share of `max_allowed_packet`, escaping can grow the values.
+PACKET_HEADROOM = 0.75
+
+
+# Phases timed by LoadStats. `read` is parsing the input, `serialize` is
+# building the statement or TSV file, and `execute` covers the driver escaping
+# the parameters, the network round trip and the server executing it.
+PHASES = ("connect", "read", "serialize", "execute", "commit")
+
+
+class LoadStats:
+    """Running counters and per-phase timings for a load, used for the rows/s report."""
+
+    def __init__(self, keep_batches=True):
+        self.rows = 0
+        self.bytes = 0
+        self.statements = 0
+        self.commits = 0
+        # Rows affected by upsert merges (1 per insert, 2 per update, 0 when unchanged)
+        self.changed = 0
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        # One dict per statement sent: method, rows, bytes, serialize and execute seconds
+        self.batches = [] if keep_batches else None
+        self.started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def timed(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] += time.perf_counter() - started
+
+    def record_batch(self, method, rows, size, serialize, execute):
+        self.statements += 1
+        self.bytes += size
+        self.timings["serialize"] += serialize
+        self.timings["execute"] += execute
+        if self.batches is not None:
+            self.batches.append({"method": method, "rows": rows, "bytes": size,
+                                 "serialize_s": serialize, "execute_s": execute})
+
+    def summary(self):
+        """Totals as a flat dict, the benchmark harness writes these out."""
+        summary = {"rows": self.rows, "bytes": self.bytes, "statements": self.statements,
+                   "commits": self.commits, "elapsed_s": self.elapsed,
+                   "rows_per_second": self.rows_per_second}
+        summary.update(("{}_s".format(phase), seconds) for phase, seconds in self.timings.items())
+        return summary
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        return "{rows} rows, {statements} statements, {commits} commits in {elapsed:.2f}s ({rate:,.0f} rows/s; {phases})".format(
+            rows=self.rows, statements=self.statements, commits=self.commits,
+            elapsed=self.elapsed, rate=self.rows_per_second,
+            phases=", ".join("{} {:.2f}s".format(phase, seconds) for phase, seconds in self.timings.items()))
+
+
+def detect_format(path):
+    """Guess the input format from the file extension."""
+    return "ndjson" if path.endswith((".ndjson", ".jsonl", ".json")) else "csv"
+
+
+def read_rows(path, columns=COLUMNS, fmt=None):
+    """
+    Yield one tuple per input record, in `columns` order.
+    CSV files must have a header row naming the columns, NDJSON files hold one object per line.
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, newline="", encoding="utf-8") as file_descriptor:
+        if fmt == "csv":
+            for record in csv.DictReader(file_descriptor):
+                yield tuple(record.get(column) for column in columns)
+        elif fmt == "ndjson":
+            for line in file_descriptor:
+                if line.strip():
+                    record = json.loads(line)
+                    yield tuple(record.get(column) for column in columns)
+        else:
+            raise ValueError("Unsupported input format: {}".format(fmt))
+
+
+def generate_rows(count, start=0):
+    """Synthetic customers, handy for benchmarking without an input file."""
+    for i in range(start, start + count):
+        yield ("customer-{}".format(i), "{} Synthetic street".format(i))
+
+
+def chunked(rows, size):
+    """Split an iterable of rows into lists of at most `size` rows."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def connect(config=None, stats=None, **overrides):
+    """Open a connection, autocommit is off so we control the commit points."""
+    settings = dict(DB_CONFIG, **(config or {}))
+    settings.update(overrides)
+    with stats.timed("connect") if stats else contextlib.nullcontext():
+        return mysql.connector.connect(autocommit=False, **settings)
+
+
+def get_max_allowed_packet(cursor):
+    cursor.execute("SELECT @@max_allowed_packet")
+    return int(cursor.fetchone()[0])
+
+
+def estimate_row_bytes(row):
+    """Approximate size of one `(%s, %s, ...)` group once the values are quoted."""
+    size = 2 + len(row)
+    for value in row:
+        size += 4 if value is None else len(str(value).encode("utf-8")) + 2
+    return size
+
+
+def insert_prefix(table=TABLE, columns=COLUMNS):
+    return "INSERT INTO {} ({}) VALUES ".format(table, ", ".join(columns))
+
+
+def multi_row_batches(rows, max_bytes, max_rows=None, prefix_bytes=0):
+    """
+    Group rows so that each multi-row INSERT stays below `max_bytes`, yields (rows, estimated bytes).
+    A row larger than the budget on its own is still sent as a single-row statement.
+    """
+    batch, size = [], prefix_bytes
+    for row in rows:
+        row_bytes = estimate_row_bytes(row)
+        if batch and (size + row_bytes > max_bytes or (max_rows and len(batch) >= max_rows)):
+            yield batch, size
+            batch, size = [], prefix_bytes
+        batch.append(row)
+        size += row_bytes
+    if batch:
+        yield batch, size
+
+
+def build_multi_row_insert(rows, table=TABLE, columns=COLUMNS):
+    """Return the SQL and flat parameter list for one multi-row INSERT."""
+    group = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    sql = insert_prefix(table, columns) + ", ".join([group] * len(rows))
+    params = [value for row in rows for value in row]
+    return sql, params
+
+
+def insert_chunk(cursor, rows, max_bytes, table=TABLE, columns=COLUMNS, stats=None):
+    """Send one chunk as as few multi-row INSERTs as the packet size allows."""
+    prefix_bytes = len(insert_prefix(table, columns))
+    started = time.perf_counter()
+    for batch, size in multi_row_batches(rows, max_bytes, prefix_bytes=prefix_bytes):
+        sql, params = build_multi_row_insert(batch, table, columns)
+        built = time.perf_counter()
+        cursor.execute(sql, params)
+        done = time.perf_counter()
+        if stats:
+            stats.record_batch("insert", len(batch), size, built - started, done - built)
+        started = time.perf_counter()
+
+
+def executemany_chunk(cursor, rows, table=TABLE, columns=COLUMNS, stats=None):
+    """Send one chunk with the driver's `executemany`, the baseline the benchmark compares against."""
+    started = time.perf_counter()
+    sql = insert_prefix(table, columns) + "(" + ", ".join(["%s"] * len(columns)) + ")"
+    size = len(sql) + sum(estimate_row_bytes(row) for row in rows)
+    built = time.perf_counter()
+    cursor.executemany(sql, rows)
+    if stats:
+        stats.record_batch("executemany", len(rows), size, built - started, time.perf_counter() - built)
+
+
+def load_data_chunk(cursor, rows, table=TABLE, columns=COLUMNS, stats=None):
+    """
+    Send one chunk with `LOAD DATA LOCAL INFILE` through a temporary TSV file.
+    Needs `local_infile=1` on the server and `allow_local_infile=True` on the connection.
+    """
+    started = time.perf_counter()
+    with tempfile.NamedTemporaryFile("w", suffix=".tsv", encoding="utf-8", newline="", delete=False) as tmp:
+        for row in rows:
+            tmp.write("\t".join(escape_tsv(value) for value in row))
+            tmp.write("\n")
+    try:
+        size = os.path.getsize(tmp.name)
+        built = time.perf_counter()
+        cursor.execute(
+            "LOAD DATA LOCAL INFILE %s INTO TABLE {} CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({})".format(
+                table, ", ".join(columns)),
+            (tmp.name,))
+        if stats:
+            stats.record_batch("load-data", len(rows), size, built - started, time.perf_counter() - built)
+    finally:
+        os.unlink(tmp.name)
+
+
+def escape_tsv(value):
+    """Escape a value for the default `LOAD DATA` TSV format, NULL is `\\N`."""
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def send_chunk(cursor, rows, method, max_bytes, table=TABLE, columns=COLUMNS, stats=None):
+    if method == "insert":
+        insert_chunk(cursor, rows, max_bytes, table, columns, stats)
+    elif method == "executemany":
+        executemany_chunk(cursor, rows, table, columns, stats)
+    elif method == "load-data":
+        load_data_chunk(cursor, rows, table, columns, stats)
+    else:
+        raise ValueError("Unsupported load method: {}".format(method))
+
+
+def ensure_unique_key(cursor, key, table=TABLE):
+    """
+    Make sure `table` has a unique index on exactly the `key` columns, the merge relies on it.
+    Adding the index fails if the table already holds duplicates for that key.
+    """
+    cursor.execute(
+        "SELECT index_name, GROUP_CONCAT(column_name ORDER BY seq_in_index) "
+        "FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND non_unique = 0 "
+        "GROUP BY index_name", (table,))
+    wanted = ",".join(key)
+    if any(columns == wanted for _, columns in cursor.fetchall()):
+        return False
+    cursor.execute("ALTER TABLE {} ADD UNIQUE KEY uk_{}_{} ({})".format(
+        table, table, "_".join(key), ", ".join(key)))
+    return True
+
+
+def create_staging_table(cursor, table=TABLE, columns=COLUMNS):
+    """A session-private staging table with the same column types and no indexes."""
+    stage = "{}_stage".format(table)
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS {}".format(stage))
+    cursor.execute("CREATE TEMPORARY TABLE {} AS SELECT {} FROM {} LIMIT 0".format(
+        stage, ", ".join(columns), table))
+    return stage
+
+
+def build_merge_sql(table, stage, columns, key):
+    """
+    One set-based statement that merges the staging table into `table`.
+    Rows that already exist with the same values are filtered out by the
+    anti-join, so unchanged data is neither written nor locked; the rest is
+    inserted, or updated in place when the natural key already exists.
+    """
+    values = [column for column in columns if column not in key]
+    join = " AND ".join(["t.{0} = s.{0}".format(column) for column in key] +
+                        ["t.{0} <=> s.{0}".format(column) for column in values])
+    updates = ", ".join("{0} = s.{0}".format(column) for column in values) or "{0} = s.{0}".format(key[0])
+    return ("INSERT INTO {table} ({columns}) "
+            "SELECT {selected} FROM {stage} AS s LEFT JOIN {table} AS t ON {join} "
+            "WHERE t.{first} IS NULL "
+            "ON DUPLICATE KEY UPDATE {updates}").format(
+        table=table, stage=stage, columns=", ".join(columns),
+        selected=", ".join("s.{}".format(column) for column in columns),
+        join=join, first=key[0], updates=updates)
+
+
+def stream_load(connection, rows, method="insert", chunk_rows=DEFAULT_CHUNK_ROWS,
+                commit_every=DEFAULT_COMMIT_EVERY, table=TABLE, columns=COLUMNS,
+                progress_every=None, stats=None, mode="append", key=None):
+    """
+    Load `rows` (any iterable of tuples) chunk by chunk, committing every `commit_every` rows.
+    With `mode="upsert"` each chunk goes through a staging table and is merged on the natural `key`.
+    Returns the LoadStats of the run.
+    """
+    if mode == "upsert" and not key:
+        raise ValueError("Upsert mode needs the natural key columns to merge on")
+    stats = stats or LoadStats()
+    cursor = connection.cursor()
+    max_bytes = int(get_max_allowed_packet(cursor) * PACKET_HEADROOM)
+    uncommitted = 0
+    next_progress = progress_every
+
+    target = table
+    if mode == "upsert":
+        target = create_staging_table(cursor, table, columns)
+    elif mode != "append":
+        raise ValueError("Unsupported load mode: {}".format(mode))
+
+    chunks = chunked(rows, chunk_rows)
+    while True:
+        with stats.timed("read"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+
+        if mode == "upsert":
+            with stats.timed("execute"):
+                cursor.execute("DELETE FROM {}".format(target))
+        send_chunk(cursor, chunk, method, max_bytes, target, columns, stats)
+        if mode == "upsert":
+            with stats.timed("execute"):
+                cursor.execute(build_merge_sql(table, target, columns, key))
+            stats.statements += 2
+            stats.changed += cursor.rowcount
+
+        stats.rows += len(chunk)
+        uncommitted += len(chunk)
+        if uncommitted >= commit_every:
+            with stats.timed("commit"):
+                connection.commit()
+            stats.commits += 1
+            uncommitted = 0
+
+        if next_progress and stats.rows >= next_progress:
+            print("progress:", stats.report())
+            next_progress += progress_every
+
+    if uncommitted:
+        with stats.timed("commit"):
+            connection.commit()
+        stats.commits += 1
+    cursor.close()
+    return stats
+
+
+def build_parser(description="Stream rows into the customers table."):
+    parser = argparse.ArgumentParser(description=description)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--input", help="CSV (with header) or NDJSON file to load.")
+    source.add_argument("--generate", type=int, help="Load this many synthetic rows instead of a file.")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Input format, guessed from the extension by default.")
+    parser.add_argument("--method", choices=["insert", "executemany", "load-data"], default="insert")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--commit-every", type=int, default=DEFAULT_COMMIT_EVERY)
+    parser.add_argument("--progress-every", type=int, default=1000000)
+    parser.add_argument("--mode", choices=["append", "upsert"], default="append",
+                        help="upsert merges every chunk on --key, so re-loads are idempotent.")
+    parser.add_argument("--key", help="Comma separated natural key columns, required by --mode upsert.")
+    add_connection_args(parser)
+    return parser
+
+
+def add_connection_args(parser):
+    parser.add_argument("--host", default=DB_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=DB_CONFIG["port"])
+    parser.add_argument("--user", default=DB_CONFIG["user"])
+    parser.add_argument("--password", default=DB_CONFIG["password"])
+    parser.add_argument("--database", default=DB_CONFIG["database"])
+    return parser
+
+
+def upsert_key(parser, args):
+    """
+    The --key columns as a tuple, None outside of upsert mode. There is no
+    default key, upsert adds a unique index on it so it has to be chosen.
+    """
+    if args.mode != "upsert":
+        if args.key:
+            parser.error("--key only applies to --mode upsert")
+        return None
+    key = tuple(column.strip() for column in (args.key or "").split(",") if column.strip())
+    if not key:
+        parser.error("--mode upsert needs --key, the natural key columns to merge on")
+    unknown = [column for column in key if column not in COLUMNS]
+    if unknown:
+        parser.error("--key columns must be loaded columns ({}), not {}".format(
+            ", ".join(COLUMNS), ", ".join(unknown)))
+    return key
+
+
+def parse_args(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    args.key = upsert_key(parser, args)
+    return args
+
+
+def prepare_table(cursor, mode="append", key=None, table=TABLE):
+    """Create the table and, for upsert mode, the unique index on `key` the merge relies on."""
+    cursor.execute(CREATE_TABLE_SQL)
+    if mode == "upsert" and ensure_unique_key(cursor, key, table):
+        print("Added a unique key on", ", ".join(key))
+
+
+def connection_config(args):
+    return {"host": args.host, "port": args.port, "user": args.user,
+            "password": args.password, "database": args.database}
+
+
+def input_rows(args):
+    if args.input:
+        return read_rows(args.input, fmt=args.format)
+    if args.generate:
+        return generate_rows(args.generate)
+    return iter(SAMPLE_ROWS)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Connect to the MySQL database
+    stats = LoadStats(keep_batches=False)
+    mydb = connect(connection_config(args), stats, allow_local_infile=args.method == "load-data")
+
+    mycursor = mydb.cursor()
+    prepare_table(mycursor, args.mode, args.key)
+    mycursor.close()
+
+    stats = stream_load(mydb, input_rows(args), method=args.method, chunk_rows=args.chunk_rows,
+                        commit_every=args.commit_every, progress_every=args.progress_every,
+                        mode=args.mode, key=args.key, stats=stats)
+    mydb.close()
+
+    # Print the number of records inserted and the throughput
+    if args.mode == "upsert":
+        print(stats.rows, "records merged,", stats.changed, "rows affected.")
+    else:
+        print(stats.rows, "records inserted.")
+    print(stats.report())
+    return stats
 
-# Commit the transaction
-mydb.commit()
 
-# Print the number of records inserted
-print(mycursor.rowcount, "records inserted.")
+if __name__ == "__main__":
+    main()
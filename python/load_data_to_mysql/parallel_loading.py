@@ -0,0 +1,265 @@
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from mysql.connector import pooling
+
+import loading
+
+#
+# Parallel mode for loading.py.
+#
+# The input is split into partitions (byte ranges aligned on line boundaries
+# for files, index ranges for `--generate`). Each partition is loaded by a
+# worker with its own pooled connection and its own transaction, so a failed
+# partition is rolled back on its own and can be retried later with
+# `--resume`, without redoing the partitions that were already committed.
+#
+# Examples:
+#   python parallel_loading.py --input customers.csv --workers 8
+#   python parallel_loading.py --generate 10000000 --workers 16 --executor process
+#   python parallel_loading.py --input customers.csv --workers 8 --resume load_manifest.json
+#
+
+# mysql.connector does not allow bigger pools than this.
+MAX_POOL_SIZE = pooling.CNX_POOL_MAXSIZE
+
+# Per-process pool, set by the worker initializer (or by parallel_load for threads).
+_pool = None
+
+
+def make_pool(config, size, name="loader"):
+    """A connection pool with autocommit off, one connection per worker."""
+    settings = dict(loading.DB_CONFIG, **(config or {}))
+    return pooling.MySQLConnectionPool(
+        pool_name=name, pool_size=min(size, MAX_POOL_SIZE), autocommit=False, **settings)
+
+
+def _init_process_worker(config):
+    # Every process gets a pool of its own, connections can't be shared across processes.
+    global _pool
+    _pool = make_pool(config, 1, name="loader-{}".format(os.getpid()))
+
+
+def split_file(path, partitions):
+    """Split a file into `partitions` byte ranges, `read_partition` aligns them on line boundaries."""
+    size = os.path.getsize(path)
+    step = max(1, -(-size // partitions))
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+
+def split_count(count, partitions):
+    """Split `count` synthetic rows into `partitions` (start, end) index ranges."""
+    step = max(1, -(-count // partitions))
+    return [(start, min(start + step, count)) for start in range(0, count, step)]
+
+
+def read_partition(path, start, end, columns=loading.COLUMNS, fmt=None):
+    """
+    Yield the rows of every line that starts inside [start, end).
+    The line that straddles `start` belongs to the previous partition. CSV
+    fields must not contain embedded newlines for the split to be valid.
+    """
+    fmt = fmt or loading.detect_format(path)
+    with open(path, "rb") as file_descriptor:
+        header = None
+        if fmt == "csv":
+            header = next(csv.reader([file_descriptor.readline().decode("utf-8")]))
+        if start > 0:
+            file_descriptor.seek(start - 1)
+            file_descriptor.readline()
+        if file_descriptor.tell() < start:
+            file_descriptor.seek(start)
+
+        while file_descriptor.tell() < end:
+            line = file_descriptor.readline()
+            if not line:
+                break
+            text = line.decode("utf-8")
+            if not text.strip():
+                continue
+            if fmt == "csv":
+                record = dict(zip(header, next(csv.reader([text]))))
+            else:
+                record = json.loads(text)
+            yield tuple(record.get(column) for column in columns)
+
+
+def partition_rows(spec, columns=loading.COLUMNS):
+    if spec["source"] == "generate":
+        return loading.generate_rows(spec["end"] - spec["start"], start=spec["start"])
+    return read_partition(spec["path"], spec["start"], spec["end"], columns, spec.get("format"))
+
+
+def load_partition(spec, method="insert", chunk_rows=loading.DEFAULT_CHUNK_ROWS, progress_every=None,
+                   mode="append", key=None):
+    """
+    Load one partition in a single transaction on a pooled connection, merged
+    on `key` through the connection's own staging table with `mode="upsert"`.
+    Errors, including failing to get a connection, are caught and reported in
+    the result, the transaction is rolled back.
+    """
+    result = dict(spec, worker="{}/{}".format(os.getpid(), threading.current_thread().name),
+                  rows=0, seconds=0.0, status="failed", error=None)
+    started = time.perf_counter()
+    connection = None
+    try:
+        connection = _pool.get_connection()
+        stats = loading.stream_load(connection, partition_rows(spec), method=method, chunk_rows=chunk_rows,
+                                    commit_every=float("inf"), progress_every=progress_every, mode=mode, key=key)
+        result.update(rows=stats.rows, status="done")
+    except Exception as error:
+        result["error"] = repr(error)
+        if connection is not None:
+            try:
+                connection.rollback()
+            except Exception as rollback_error:
+                result["error"] += "; rollback failed: {!r}".format(rollback_error)
+    finally:
+        if connection is not None:
+            # Returns the connection to the pool
+            connection.close()
+        result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def plan_partitions(args, partitions):
+    if args.input:
+        ranges = split_file(args.input, partitions)
+        base = {"source": "file", "path": args.input, "format": args.format}
+    else:
+        ranges = split_count(args.generate or 0, partitions)
+        base = {"source": "generate"}
+    return [dict(base, index=i, start=start, end=end) for i, (start, end) in enumerate(ranges)]
+
+
+def pending_from_manifest(path):
+    """Partitions from a previous run that did not finish."""
+    with open(path) as file_descriptor:
+        manifest = json.load(file_descriptor)
+    return [{key: value for key, value in partition.items()
+             if key in ("index", "source", "path", "format", "start", "end")}
+            for partition in manifest["partitions"] if partition["status"] != "done"]
+
+
+def parallel_load(specs, config=None, workers=4, executor="thread", method="insert",
+                  chunk_rows=loading.DEFAULT_CHUNK_ROWS, progress_every=None, manifest=None, previous=None,
+                  mode="append", key=None):
+    """
+    Load the partitions with `workers` threads or processes, returns one result per partition.
+    With `manifest` the manifest is rewritten as every partition finishes, so a
+    run that dies midway can still be resumed.
+    """
+    global _pool
+    if executor == "thread":
+        # The threads share one pool, which can't hold more than MAX_POOL_SIZE connections
+        workers = min(workers, MAX_POOL_SIZE)
+        _pool = make_pool(config, workers)
+        pool_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="loader")
+    else:
+        pool_executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker,
+                                            initargs=(config,))
+
+    results = []
+    if manifest:
+        # Every partition is listed as pending first, so one that never ran is resumed too
+        previous = list(previous or []) + [dict(spec, status="pending", rows=0) for spec in specs]
+        write_manifest(manifest, [], previous)
+    with pool_executor:
+        futures = [pool_executor.submit(load_partition, spec, method, chunk_rows, progress_every, mode, key)
+                   for spec in specs]
+        for future in as_completed(futures):
+            result = future.result()
+            print("partition {index}: {status}, {rows} rows in {seconds:.2f}s by {worker}".format(**result))
+            results.append(result)
+            if manifest:
+                write_manifest(manifest, results, previous)
+    return sorted(results, key=lambda result: result["index"])
+
+
+def worker_stats(results):
+    """Rows, busy seconds and rows/s per worker."""
+    workers = {}
+    for result in results:
+        stats = workers.setdefault(result["worker"], {"partitions": 0, "rows": 0, "seconds": 0.0})
+        stats["partitions"] += 1
+        stats["rows"] += result["rows"]
+        stats["seconds"] += result["seconds"]
+    for stats in workers.values():
+        stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+    return workers
+
+
+def write_manifest(path, results, previous=None):
+    """Record the status of every partition, merged with the ones already done in a previous run."""
+    partitions = {partition["index"]: partition for partition in (previous or [])}
+    partitions.update({result["index"]: result for result in results})
+    # Written aside and renamed, a crash never leaves a truncated manifest
+    with open(path + ".tmp", "w") as file_descriptor:
+        json.dump({"partitions": [partitions[index] for index in sorted(partitions)]}, file_descriptor, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def parse_args(argv=None):
+    parser = loading.build_parser("Load rows into the customers table with parallel workers.")
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() or 4, MAX_POOL_SIZE),
+                        help="Degree of parallelism (threads or processes), at most {} threads.".format(
+                            MAX_POOL_SIZE))
+    parser.add_argument("--partitions", type=int,
+                        help="Number of partitions, one transaction each. Defaults to 4 x workers.")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--manifest", default="load_manifest.json",
+                        help="Where the status of every partition is written.")
+    parser.add_argument("--resume", help="Manifest of a previous run, only its unfinished partitions are loaded.")
+    # Every partition is one transaction, that is what makes --resume safe
+    parser.set_defaults(commit_every=None, progress_every=None)
+    args = parser.parse_args(argv)
+    if args.commit_every is not None:
+        parser.error("--commit-every is not supported, every partition is committed as one transaction")
+    args.key = loading.upsert_key(parser, args)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = loading.connection_config(args)
+    if args.method == "load-data":
+        config["allow_local_infile"] = True
+
+    # Create the table and the upsert key once, before the workers start
+    mydb = loading.connect(config)
+    mycursor = mydb.cursor()
+    loading.prepare_table(mycursor, args.mode, args.key)
+    mycursor.close()
+    mydb.close()
+
+    previous = None
+    if args.resume:
+        with open(args.resume) as file_descriptor:
+            previous = json.load(file_descriptor)["partitions"]
+        specs = pending_from_manifest(args.resume)
+    else:
+        specs = plan_partitions(args, args.partitions or args.workers * 4)
+
+    started = time.perf_counter()
+    results = parallel_load(specs, config, workers=args.workers, executor=args.executor, method=args.method,
+                            chunk_rows=args.chunk_rows, progress_every=args.progress_every,
+                            manifest=args.manifest, previous=previous, mode=args.mode, key=args.key)
+    elapsed = time.perf_counter() - started
+
+    rows = sum(result["rows"] for result in results if result["status"] == "done")
+    failed = [result["index"] for result in results if result["status"] != "done"]
+    for worker, stats in sorted(worker_stats(results).items()):
+        print("worker {}: {partitions} partitions, {rows} rows, {rows_per_second:,.0f} rows/s".format(worker, **stats))
+    print("{} rows in {:.2f}s ({:,.0f} rows/s) with {} workers".format(
+        rows, elapsed, rows / elapsed if elapsed else 0.0, args.workers))
+    if failed:
+        print("Failed partitions {}, re-run with --resume {}".format(failed, args.manifest))
+    return results
+
+
+if __name__ == "__main__":
+    main()
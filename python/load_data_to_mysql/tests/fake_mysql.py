@@ -0,0 +1,76 @@
+class FakeCursor(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+        self.lastrowid = None
+        self.results = []
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append((sql, params))
+        if self.connection.fail_on and self.connection.fail_on in sql:
+            raise RuntimeError("fake failure on {}".format(self.connection.fail_on))
+        self.rowcount = self.connection.rowcount
+        self.connection.last_id += 1
+        self.lastrowid = self.connection.last_id
+        self.results = [(4194304,)] if "@@max_allowed_packet" in sql else []
+
+    def executemany(self, sql, seq_params):
+        for params in seq_params:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self.results[0] if self.results else None
+
+    def fetchall(self):
+        return list(self.results)
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+    """
+    Records the statements sent through mysql.connector's connection API.
+    `fail_on` makes any statement containing it raise, `rowcount` is what every
+    statement reports as affected rows.
+    """
+
+    def __init__(self, fail_on=None, rowcount=1, fail_rollback=False):
+        self.statements = []
+        self.fail_on = fail_on
+        self.rowcount = rowcount
+        self.fail_rollback = fail_rollback
+        self.last_id = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.fail_rollback:
+            raise RuntimeError("fake rollback failure")
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(object):
+    """Stands in for MySQLConnectionPool, hands out FakeConnections made by `factory`."""
+
+    def __init__(self, factory=FakeConnection, error=None):
+        self.factory = factory
+        self.error = error
+        self.connections = []
+
+    def get_connection(self):
+        if self.error:
+            raise self.error
+        connection = self.factory()
+        self.connections.append(connection)
+        return connection
@@ -0,0 +1,49 @@
+import csv
+import json
+
+import benchmark_loading
+import loading
+from fake_mysql import FakeConnection
+
+
+def test_stats_time_every_phase_and_record_batches():
+    connection = FakeConnection()
+    stats = loading.LoadStats()
+
+    loading.stream_load(connection, loading.generate_rows(30), method="executemany", chunk_rows=10,
+                        commit_every=20, stats=stats)
+    summary = stats.summary()
+
+    assert [batch["rows"] for batch in stats.batches] == [10, 10, 10]
+    assert {batch["method"] for batch in stats.batches} == {"executemany"}
+    assert summary["rows"] == 30 and summary["statements"] == 3 and summary["commits"] == 2
+    assert summary["bytes"] == sum(batch["bytes"] for batch in stats.batches)
+    assert all("{}_s".format(phase) in summary for phase in loading.PHASES)
+
+
+def test_run_matrix_loads_every_method_and_batch_size(monkeypatch, tmp_path):
+    connections = []
+
+    def connect(config, stats=None, **overrides):
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(loading, "connect", connect)
+
+    results = benchmark_loading.run_matrix({}, ["executemany", "insert"], [5, 50], rows=100, commit_every=1000)
+
+    assert [(result["method"], result["batch_size"]) for result in results] == [
+        ("executemany", 5), ("executemany", 50), ("insert", 5), ("insert", 50)]
+    assert all(result["rows"] == 100 for result in results)
+    # Every run starts from a fresh scratch table and closes its connection
+    assert all("DROP TABLE IF EXISTS customers_bench" in [sql for sql, _ in connection.statements]
+               for connection in connections)
+    assert all(connection.closed for connection in connections)
+
+    output = str(tmp_path / "results.csv")
+    benchmark_loading.write_results(results, output, "csv")
+    with open(output, newline="") as file_descriptor:
+        assert [row["method"] for row in csv.DictReader(file_descriptor)] == [result["method"] for result in results]
+    benchmark_loading.write_results(results, str(tmp_path / "results.json"))
+    with open(str(tmp_path / "results.json")) as file_descriptor:
+        assert len(json.load(file_descriptor)) == 4
@@ -0,0 +1,62 @@
+import csv
+import queue
+import random
+
+import cdc_workload
+import loading
+from cdc_workload import IdPool, WorkerErrors, apply_change
+from fake_mysql import FakeConnection
+
+
+def test_changes_that_touch_no_row_are_not_logged():
+    rng = random.Random(0)
+    cursor = FakeConnection(rowcount=0).cursor()
+
+    assert apply_change(cursor, "update", 1, IdPool([7]), rng) is None
+    assert apply_change(cursor, "delete", 2, IdPool([7]), rng) is None
+    assert apply_change(cursor, "delete", 3, IdPool(), rng) is None
+    assert apply_change(FakeConnection(rowcount=1).cursor(), "update", 4, IdPool([7]), rng) == 7
+
+
+def test_worker_counts_failures_and_keeps_going(monkeypatch):
+    connection = FakeConnection(fail_on="DELETE")
+    monkeypatch.setattr(loading, "connect", lambda config: connection)
+    work, changes, errors = queue.Queue(), queue.Queue(), WorkerErrors()
+    for item in [(0, "insert", 0.0), (1, "delete", 0.1), (2, "insert", 0.2), None]:
+        work.put(item)
+
+    cdc_workload.worker("cdc-0", {}, work, changes, IdPool([5]), 0.0, 0, errors)
+
+    assert errors.count == 1
+    assert "seq 1" in errors.messages[0]
+    assert connection.rollbacks == 1
+    assert [changes.get()["seq"] for _ in range(changes.qsize())] == [0, 2]
+    assert connection.closed
+
+
+def test_run_reports_errors_and_unprocessed_work(monkeypatch, tmp_path):
+    connected = []
+
+    def connect(config):
+        # The loader of the ids and the first worker connect, the second worker can't
+        if len(connected) == 2:
+            raise RuntimeError("too many connections")
+        connected.append(FakeConnection(fail_on="DELETE"))
+        return connected[-1]
+
+    monkeypatch.setattr(loading, "connect", connect)
+    log = str(tmp_path / "changes.csv")
+
+    summary = cdc_workload.run({}, rate=200, duration=0.1, mix={"insert": 0.5, "delete": 0.5}, connections=2,
+                               log_path=log, seed=1)
+
+    with open(log, newline="") as file_descriptor:
+        logged = list(csv.DictReader(file_descriptor))
+    assert summary["errors"] >= 2
+    assert any("too many connections" in message for message in summary["error_messages"])
+    assert summary["unprocessed"] == 0
+    assert {change["op"] for change in logged} == {"insert"}
+    # Every insert ran on the worker that did connect
+    inserts = [op for _, op, _ in cdc_workload.schedule(200, 0.1, {"insert": 0.5, "delete": 0.5}, seed=1)
+               if op == "insert"]
+    assert len(logged) == len(inserts)
@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+import consistency_check
+from consistency_check import CheckStats, Side, SQLiteSide, compare_tables
+
+
+def table(rows):
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, address TEXT)")
+    connection.executemany("INSERT INTO customers VALUES (?, ?, ?)", rows)
+    return connection
+
+
+def customers(ids):
+    return [(row_id, "customer-{}".format(row_id), "{} street".format(row_id)) for row_id in ids]
+
+
+def compare(source_rows, replica_rows, **options):
+    stats = CheckStats()
+    source, replica = SQLiteSide(table(source_rows), stats=stats), SQLiteSide(table(replica_rows), stats=stats)
+    return compare_tables(source, replica, **options), stats
+
+
+def test_identical_tables_take_one_query_per_chunk_and_side():
+    differences, stats = compare(customers(range(1, 1001)), customers(range(1, 1001)), chunk_rows=250)
+
+    assert not differences
+    # next_bound and a checksum on both sides per chunk, plus the open chunk past the end
+    assert stats.queries == 5 + 5 * 2
+    assert stats.rows_fetched == 0
+
+
+def test_missing_extra_and_changed_rows_are_named():
+    source = customers(range(1, 2001))
+    replica = [row for row in customers(range(1, 2001)) if row[0] not in (5, 1500)] + customers([2500, 3000])
+    replica[100] = (replica[100][0], replica[100][1], "moved")
+    replica[1200] = (replica[1200][0], None, replica[1200][2])
+
+    differences, stats = compare(source, replica, chunk_rows=500, fanout=4, leaf_rows=8)
+
+    assert sorted(differences.missing) == [5, 1500]
+    assert sorted(differences.extra) == [2500, 3000]
+    assert sorted(differences.changed) == [replica[100][0], replica[1200][0]]
+    # Only the leaf chunks around the differences are fetched row by row
+    assert stats.rows_fetched < 100
+
+
+@pytest.mark.parametrize("source_ids, replica_ids", [(range(1, 5001), ()), ((), range(1, 5001))])
+def test_an_empty_side_lists_the_other_without_splitting(source_ids, replica_ids):
+    differences, stats = compare(customers(source_ids), customers(replica_ids), chunk_rows=1000)
+
+    assert sorted(differences.missing + differences.extra) == list(range(1, 5001))
+    assert bool(differences.missing) == bool(source_ids)
+    assert stats.queries < 30
+
+
+def test_side_needs_the_engine_specific_sql():
+    with pytest.raises(TypeError):
+        Side(table([]))
+
+
+@pytest.mark.parametrize("options", [{"fanout": 1}, {"leaf_rows": 0}, {"chunk_rows": 0}])
+def test_split_options_that_would_never_end_are_rejected(options):
+    with pytest.raises(ValueError):
+        compare(customers(range(1, 11)), customers(range(2, 11)), **options)
+    flag = "--" + next(iter(options)).replace("_", "-")
+    with pytest.raises(SystemExit):
+        consistency_check.parse_args([flag, str(next(iter(options.values())))])
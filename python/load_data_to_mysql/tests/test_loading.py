@@ -0,0 +1,99 @@
+import pytest
+
+import loading
+from fake_mysql import FakeConnection
+
+
+def test_merge_sql_skips_unchanged_rows_and_updates_on_the_key():
+    sql = loading.build_merge_sql("customers", "customers_stage", ("name", "address"), ("name",))
+
+    assert sql == ("INSERT INTO customers (name, address) "
+                   "SELECT s.name, s.address FROM customers_stage AS s LEFT JOIN customers AS t "
+                   "ON t.name = s.name AND t.address <=> s.address "
+                   "WHERE t.name IS NULL "
+                   "ON DUPLICATE KEY UPDATE address = s.address")
+
+
+def test_merge_sql_with_every_column_in_the_key():
+    sql = loading.build_merge_sql("customers", "customers_stage", ("name", "address"), ("name", "address"))
+
+    assert "ON t.name = s.name AND t.address = s.address " in sql
+    # Nothing left to update, the no-op assignment keeps the statement valid
+    assert sql.endswith("ON DUPLICATE KEY UPDATE name = s.name")
+
+
+def test_staging_table_is_a_fresh_empty_copy_of_the_columns():
+    connection = FakeConnection()
+
+    stage = loading.create_staging_table(connection.cursor(), "customers", ("name", "address"))
+
+    assert stage == "customers_stage"
+    assert [sql for sql, _ in connection.statements] == [
+        "DROP TEMPORARY TABLE IF EXISTS customers_stage",
+        "CREATE TEMPORARY TABLE customers_stage AS SELECT name, address FROM customers LIMIT 0",
+    ]
+
+
+def test_upsert_merges_every_chunk_through_the_staging_table():
+    connection = FakeConnection(rowcount=2)
+
+    stats = loading.stream_load(connection, loading.generate_rows(5), chunk_rows=2, mode="upsert", key=("name",))
+
+    statements = [sql for sql, _ in connection.statements]
+    assert sum(sql.startswith("DELETE FROM customers_stage") for sql in statements) == 3
+    assert sum(sql.startswith("INSERT INTO customers_stage") for sql in statements) == 3
+    assert sum(sql.startswith("INSERT INTO customers (") for sql in statements) == 3
+    assert stats.rows == 5
+    assert stats.changed == 6
+
+
+def test_upsert_needs_a_key():
+    with pytest.raises(ValueError):
+        loading.stream_load(FakeConnection(), loading.generate_rows(1), mode="upsert")
+    with pytest.raises(SystemExit):
+        loading.parse_args(["--mode", "upsert"])
+    with pytest.raises(SystemExit):
+        loading.parse_args(["--key", "name"])
+    with pytest.raises(SystemExit):
+        loading.parse_args(["--mode", "upsert", "--key", "id"])
+    assert loading.parse_args(["--mode", "upsert", "--key", "name, address"]).key == ("name", "address")
+
+
+def test_rows_are_read_from_csv_and_ndjson(tmp_path):
+    csv_path = tmp_path / "customers.csv"
+    csv_path.write_text("address,name\nHighway 21,John\n,Jane\n")
+    ndjson_path = tmp_path / "customers.ndjson"
+    ndjson_path.write_text('{"name": "John", "address": "Highway 21"}\n\n{"name": "Jane"}\n')
+
+    expected = [("John", "Highway 21"), ("Jane", "")]
+    assert list(loading.read_rows(str(csv_path))) == expected
+    assert list(loading.read_rows(str(ndjson_path))) == [("John", "Highway 21"), ("Jane", None)]
+
+
+def test_batches_stay_under_the_packet_budget():
+    rows = [("customer-{:03d}".format(i), "x" * 50) for i in range(100)]
+    row_bytes = loading.estimate_row_bytes(rows[0])
+
+    batches = list(loading.multi_row_batches(rows, max_bytes=10 * row_bytes + 20, prefix_bytes=20))
+
+    assert [len(batch) for batch, _ in batches] == [10] * 10
+    assert all(size <= 10 * row_bytes + 20 for _, size in batches)
+    # A row larger than the budget still goes out on its own
+    assert [len(batch) for batch, _ in loading.multi_row_batches(rows[:2], max_bytes=1)] == [1, 1]
+
+
+def test_stream_load_commits_every_n_rows():
+    connection = FakeConnection()
+
+    stats = loading.stream_load(connection, loading.generate_rows(25), chunk_rows=10, commit_every=10)
+
+    inserts = [(sql, params) for sql, params in connection.statements if sql.startswith("INSERT")]
+    assert stats.rows == 25
+    # One multi-row INSERT per chunk, the chunks fit in the packet
+    assert [len(params) // 2 for _, params in inserts] == [10, 10, 5]
+    assert connection.commits == stats.commits == 3
+
+
+def test_load_data_values_are_escaped():
+    assert loading.escape_tsv(None) == "\\N"
+    assert loading.escape_tsv("a\tb\nc\\d") == "a\\tb\\nc\\\\d"
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+from mysql.connector import errors
+
+import parallel_loading
+from fake_mysql import FakeConnection, FakePool
+
+
+def specs(count, rows=10):
+    return [{"source": "generate", "index": index, "start": index * rows, "end": (index + 1) * rows}
+            for index in range(count)]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+    sizes = []
+
+    def make_pool(config, size, name="loader"):
+        sizes.append(size)
+        return pool
+
+    monkeypatch.setattr(parallel_loading, "make_pool", make_pool)
+    pool.sizes = sizes
+    return pool
+
+
+def test_a_pool_error_fails_only_the_partition(pool):
+    pool.error = errors.PoolError("pool exhausted")
+    parallel_loading._pool = pool
+
+    result = parallel_loading.load_partition(specs(1)[0])
+
+    assert result["status"] == "failed"
+    assert "pool exhausted" in result["error"]
+
+
+def test_a_failed_rollback_is_reported(pool):
+    pool.factory = lambda: FakeConnection(fail_on="INSERT", fail_rollback=True)
+    parallel_loading._pool = pool
+
+    result = parallel_loading.load_partition(specs(1)[0])
+
+    assert result["status"] == "failed"
+    assert "rollback failed" in result["error"]
+    assert pool.connections[0].closed
+
+
+def test_manifest_is_written_as_partitions_finish(pool, tmp_path, monkeypatch):
+    manifest = str(tmp_path / "manifest.json")
+    seen = []
+    load_partition = parallel_loading.load_partition
+
+    def checking_load(spec, *args):
+        # Every partition is in the manifest before any of them runs
+        with open(manifest) as file_descriptor:
+            seen.append(len(json.load(file_descriptor)["partitions"]))
+        return load_partition(spec, *args)
+
+    monkeypatch.setattr(parallel_loading, "load_partition", checking_load)
+    results = parallel_loading.parallel_load(specs(4), workers=100, manifest=manifest)
+
+    assert seen == [4, 4, 4, 4]
+    assert [result["status"] for result in results] == ["done"] * 4
+    with open(manifest) as file_descriptor:
+        assert [partition["status"] for partition in json.load(file_descriptor)["partitions"]] == ["done"] * 4
+    # The threads share one pool, it can't be larger than mysql.connector allows
+    assert pool.sizes == [parallel_loading.MAX_POOL_SIZE]
+
+
+def test_unfinished_partitions_are_resumed(tmp_path):
+    manifest = str(tmp_path / "manifest.json")
+    parallel_loading.write_manifest(manifest, [dict(specs(2)[0], status="done", rows=10)],
+                                    [dict(spec, status="pending", rows=0) for spec in specs(2)])
+
+    assert [spec["index"] for spec in parallel_loading.pending_from_manifest(manifest)] == [1]
+
+
+def test_commit_every_is_rejected():
+    with pytest.raises(SystemExit):
+        parallel_loading.parse_args(["--generate", "10", "--commit-every", "5"])
+
+
+def test_partitions_are_upserted_on_the_key(pool):
+    parallel_loading._pool = pool
+
+    result = parallel_loading.load_partition(specs(1)[0], mode="upsert", key=("name",))
+
+    assert result["status"] == "done"
+    statements = [sql for sql, _ in pool.connections[0].statements]
+    assert any(sql.startswith("CREATE TEMPORARY TABLE customers_stage") for sql in statements)
+    assert any(sql.startswith("INSERT INTO customers (name, address) SELECT") for sql in statements)
+
+
+def test_upsert_without_a_key_is_rejected():
+    with pytest.raises(SystemExit):
+        parallel_loading.parse_args(["--mode", "upsert"])
+    assert parallel_loading.parse_args(["--mode", "upsert", "--key", "name"]).key == ("name",)
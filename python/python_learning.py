@@ -496,6 +496,8 @@ finally:
 ###############################################
 # readline(size)
 ###############################################
+# Fine for a small file, one call per 10 bytes is slow on large ones,
+# see line_reader.py for mmap and large-buffer readers.
 try:
     with open("foo.txt", "r+") as file_descriptor:
         # get the first line.
@@ -0,0 +1,75 @@
+import os
+import threading
+
+import pytest
+
+from line_reader import count_lines, iter_blocks, iter_lines, iter_records, line_ranges, mappable
+
+LINES = [b"first", b"", b"x" * 5000, b"last without a newline"]
+DATA = b"\n".join(LINES)
+
+
+@pytest.fixture
+def regular(tmp_path):
+    path = str(tmp_path / "lines.txt")
+    with open(path, "wb") as file_descriptor:
+        file_descriptor.write(DATA)
+    return path
+
+
+@pytest.fixture
+def fifo(tmp_path):
+    """Makes named pipes that a thread writes DATA to once, when they are read."""
+    threads = []
+
+    def make(name, read=True):
+        path = str(tmp_path / name)
+        os.mkfifo(path)
+        if not read:
+            return path
+
+        def feed():
+            # Blocks until a reader opens the pipe
+            with open(path, "wb") as file_descriptor:
+                file_descriptor.write(DATA)
+
+        threads.append(threading.Thread(target=feed, daemon=True))
+        threads[-1].start()
+        return path
+
+    yield make
+    for thread in threads:
+        thread.join(5)
+
+
+def test_regular_file_is_mapped(regular):
+    assert mappable(regular)
+    assert list(iter_lines(regular, block_size=64)) == LINES
+    assert [view.tobytes() for view in iter_lines(regular, views=True)] == LINES
+    assert count_lines(regular) == 4
+
+
+def test_pipes_are_read_instead_of_mapped(fifo):
+    assert not mappable(fifo("mode", read=False))
+    assert list(iter_lines(fifo("lines"), block_size=64)) == LINES
+    assert [view.tobytes() for view in iter_lines(fifo("views"), views=True)] == LINES
+    assert b"".join(bytes(block) for block in iter_blocks(fifo("blocks"), block_size=64)) == DATA
+    assert count_lines(fifo("count")) == 4
+    assert [record.tobytes() for record in iter_records(fifo("records"), len(DATA))] == [DATA]
+    with pytest.raises(ValueError):
+        line_ranges(fifo("ranges", read=False), 4)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc")
+def test_proc_files_report_no_size_but_have_lines():
+    assert not mappable("/proc/self/status")
+    lines = list(iter_lines("/proc/self/status"))
+    assert any(line.startswith(b"Name:") for line in lines)
+
+
+def test_empty_file_has_no_lines(tmp_path):
+    path = str(tmp_path / "empty")
+    open(path, "wb").close()
+    assert list(iter_lines(path)) == []
+    assert list(iter_lines(path, views=True)) == []
+    assert count_lines(path) == 0
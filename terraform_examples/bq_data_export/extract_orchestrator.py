@@ -0,0 +1,284 @@
+import argparse
+import datetime
+import json
+import os
+import time
+import uuid
+
+#
+# Runs many BigQuery extract jobs at once, one per table or per table partition.
+#
+# `extract.sh` runs a single `bq extract` into one CSV file, which is limited to
+# 1 GB per file and is extracted serially. Here every extract writes to a
+# wildcard URI, so BigQuery shards the output over as many files as it needs,
+# the default format is Parquet with SNAPPY compression, and up to
+# `max_concurrent` jobs run at the same time. Running jobs are polled together
+# with one jobs.list call per round instead of one jobs.get call per job.
+#
+#   python extract_orchestrator.py --table my-project.my_dataset.events \
+#       --start 2024-01-01 --end 2024-01-31 --bucket gs://my-bq-export-bucket/extract
+#
+# With --fake-root the jobs run against FakeJobClient, which writes the shards
+# under a local directory standing in for the bucket:
+#
+#   python extract_orchestrator.py --table p.d.t --start 2024-01-01 --end 2024-01-03 \
+#       --bucket gs://bucket/extract --fake-root /tmp/buckets
+#
+
+# Destination format -> (file extension, default compression)
+FORMATS = {
+    "PARQUET": (".parquet", "SNAPPY"),
+    "AVRO": (".avro", "SNAPPY"),
+    "NEWLINE_DELIMITED_JSON": (".json.gz", "GZIP"),
+    "CSV": (".csv.gz", "GZIP"),
+}
+
+DEFAULT_FORMAT = "PARQUET"
+MAX_CONCURRENT = 8
+POLL_INTERVAL = 5.0
+
+# Job states as reported by BigQuery
+PENDING, RUNNING, DONE = "PENDING", "RUNNING", "DONE"
+
+
+class ExtractSpec(object):
+    """One extract: a table, optionally one of its partitions ("YYYYMMDD"), to a destination prefix."""
+
+    def __init__(self, table, destination, partition=None, destination_format=DEFAULT_FORMAT, compression=None):
+        if destination_format not in FORMATS:
+            raise ValueError("Unsupported destination format {}, use one of {}".format(
+                destination_format, ", ".join(FORMATS)))
+        self.table = table
+        self.destination = destination.rstrip("/")
+        self.partition = partition
+        self.destination_format = destination_format
+        self.compression = compression or FORMATS[destination_format][1]
+
+    @property
+    def source(self):
+        # Partition decorator, extracts a single partition of the table
+        return "{}${}".format(self.table, self.partition) if self.partition else self.table
+
+    @property
+    def destination_uri(self):
+        """Wildcard URI, BigQuery replaces `*` with a shard number per output file."""
+        extension = FORMATS[self.destination_format][0]
+        if self.destination_format in ("PARQUET", "AVRO") and self.compression not in (None, "NONE"):
+            extension = "." + self.compression.lower() + extension
+        return "{}/{}/{}/part-*{}".format(self.destination, self.table.replace(":", "."),
+                                          self.partition or "all", extension)
+
+    def __repr__(self):
+        return "ExtractSpec({!r} -> {!r})".format(self.source, self.destination_uri)
+
+
+def partitions_between(start, end):
+    """Daily partition ids from `start` to `end` (dates or "YYYY-MM-DD"), both included."""
+    start, end = [datetime.date.fromisoformat(day) if isinstance(day, str) else day for day in (start, end)]
+    return [(start + datetime.timedelta(days=offset)).strftime("%Y%m%d") for offset in range((end - start).days + 1)]
+
+
+def plan_extracts(tables, destination, start=None, end=None, destination_format=DEFAULT_FORMAT, compression=None):
+    """One ExtractSpec per table, or per table and day when a date range is given."""
+    partitions = partitions_between(start, end) if start and end else [None]
+    return [ExtractSpec(table, destination, partition, destination_format, compression)
+            for table in tables for partition in partitions]
+
+
+class BigQueryJobClient(object):
+    """Starts extract jobs and polls their states with google-cloud-bigquery."""
+
+    def __init__(self, project=None, location=None, client=None):
+        if client is None:
+            from google.cloud import bigquery
+            client = bigquery.Client(project=project, location=location)
+        self.client = client
+        self.location = location
+        self.started_at = None
+
+    def start(self, spec, job_id):
+        from google.cloud import bigquery
+
+        if self.started_at is None:
+            self.started_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+        config = bigquery.ExtractJobConfig(destination_format=spec.destination_format, compression=spec.compression)
+        self.client.extract_table(spec.source, spec.destination_uri, job_id=job_id, job_config=config,
+                                  location=self.location)
+        return job_id
+
+    def poll(self, job_ids):
+        """{job_id: (state, error message or None)} for the given jobs, from one listing of recent jobs."""
+        wanted = set(job_ids)
+        states = {}
+        for job in self.client.list_jobs(min_creation_time=self.started_at, all_users=False):
+            if job.job_id in wanted:
+                error = job.error_result.get("message") if job.error_result else None
+                states[job.job_id] = (job.state, error)
+        # Jobs created a moment ago may not be listed yet, they count as pending
+        return {job_id: states.get(job_id, (PENDING, None)) for job_id in job_ids}
+
+
+class FakeJobClient(object):
+    """
+    Stands in for BigQuery in tests and dry runs. `gs://bucket/path` maps to
+    `<root>/bucket/path`; a job is DONE `duration` seconds after it started and
+    then writes `rows[table]` as NDJSON shards of `shard_rows` rows (whatever the
+    destination format). Tables in `fail` end with an error.
+    """
+
+    def __init__(self, root, rows=None, duration=0.0, shard_rows=1000, fail=(), clock=time.monotonic):
+        self.root = root
+        self.rows = rows or {}
+        self.duration = duration
+        self.shard_rows = shard_rows
+        self.fail = set(fail)
+        self.clock = clock
+        self.jobs = {}
+        self.polls = 0
+        self.max_running = 0
+
+    def local_path(self, uri):
+        return os.path.join(self.root, uri[len("gs://"):]) if uri.startswith("gs://") else uri
+
+    def start(self, spec, job_id):
+        self.jobs[job_id] = {"spec": spec, "started": self.clock(), "state": RUNNING}
+        running = sum(1 for job in self.jobs.values() if job["state"] == RUNNING)
+        self.max_running = max(self.max_running, running)
+        return job_id
+
+    def poll(self, job_ids):
+        self.polls += 1
+        states = {}
+        for job_id in job_ids:
+            job = self.jobs[job_id]
+            if job["state"] == RUNNING and self.clock() - job["started"] >= self.duration:
+                job["state"] = DONE
+                if job["spec"].table in self.fail:
+                    job["error"] = "Fake failure extracting {}".format(job["spec"].source)
+                else:
+                    self._write_shards(job["spec"])
+            states[job_id] = (job["state"], job.get("error"))
+        return states
+
+    def _write_shards(self, spec):
+        rows = self.rows.get(spec.source, self.rows.get(spec.table, []))
+        pattern = self.local_path(spec.destination_uri)
+        os.makedirs(os.path.dirname(pattern), exist_ok=True)
+        for shard, start in enumerate(range(0, max(len(rows), 1), self.shard_rows)):
+            with open(pattern.replace("*", "{:012d}".format(shard)), "w") as file_descriptor:
+                for row in rows[start:start + self.shard_rows]:
+                    file_descriptor.write(json.dumps(row) + "\n")
+
+
+class ExtractResult(object):
+    def __init__(self, spec, job_id):
+        self.spec = spec
+        self.job_id = job_id
+        self.state = PENDING
+        self.error = None
+        self.attempts = 1
+        self.started = time.monotonic()
+        self.seconds = None
+
+    @property
+    def ok(self):
+        return self.state == DONE and self.error is None
+
+    def as_dict(self):
+        return {"source": self.spec.source, "destination_uri": self.spec.destination_uri, "job_id": self.job_id,
+                "state": self.state, "error": self.error, "attempts": self.attempts, "seconds": self.seconds}
+
+
+def run_extracts(specs, client, max_concurrent=MAX_CONCURRENT, poll_interval=POLL_INTERVAL, retries=1,
+                 job_prefix="extract", sleep=time.sleep):
+    """
+    Run every spec with at most `max_concurrent` jobs at a time, polling all
+    running jobs in one call per round. Failed jobs, and jobs that could not be
+    started, are retried up to `retries` times. Returns one ExtractResult per
+    spec, in spec order.
+    """
+    queue = list(reversed(specs))
+    running = {}
+    results = []
+    while queue or running:
+        while queue and len(running) < max_concurrent:
+            spec = queue.pop()
+            result = ExtractResult(spec, None)
+            results.append(result)
+            if _start(client, result, job_prefix, retries):
+                running[result.job_id] = result
+        if not running:
+            continue
+
+        # Nothing finishes the moment it starts, wait before every poll
+        sleep(poll_interval)
+        for job_id, (state, error) in client.poll(list(running)).items():
+            result = running[job_id]
+            result.state = state
+            if state != DONE:
+                continue
+            del running[job_id]
+            if error and result.attempts <= retries:
+                result.attempts += 1
+                result.state = PENDING
+                if _start(client, result, job_prefix, retries):
+                    running[result.job_id] = result
+                continue
+            result.error = error
+            result.seconds = time.monotonic() - result.started
+    return results
+
+
+def _start(client, result, job_prefix, retries):
+    """
+    Start the job of `result`, False when it could not be started within the
+    retries left; the result is then DONE with the error.
+    """
+    while True:
+        # BigQuery job ids are unique per project, a retry needs a new one
+        result.job_id = "{}_{}".format(job_prefix, uuid.uuid4().hex)
+        try:
+            client.start(result.spec, result.job_id)
+            return True
+        except Exception as error:
+            if result.attempts > retries:
+                result.state = DONE
+                result.error = "Could not start the job: {}".format(error)
+                result.seconds = time.monotonic() - result.started
+                return False
+            result.attempts += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run BigQuery extract jobs in parallel.")
+    parser.add_argument("--table", action="append", required=True, help="project.dataset.table, repeatable.")
+    parser.add_argument("--bucket", required=True, help="Destination prefix, e.g. gs://bucket/extract")
+    parser.add_argument("--start", help="First day partition to extract (YYYY-MM-DD).")
+    parser.add_argument("--end", help="Last day partition to extract (YYYY-MM-DD).")
+    parser.add_argument("--format", default=DEFAULT_FORMAT, choices=sorted(FORMATS))
+    parser.add_argument("--compression", help="Defaults to SNAPPY for Parquet/Avro and GZIP otherwise.")
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT)
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--retries", type=int, default=1)
+    parser.add_argument("--project")
+    parser.add_argument("--location")
+    parser.add_argument("--fake-root", help="Use FakeJobClient writing under this directory.")
+    args = parser.parse_args()
+
+    specs = plan_extracts(args.table, args.bucket, args.start, args.end, args.format, args.compression)
+    if args.fake_root:
+        client = FakeJobClient(args.fake_root, duration=0.1)
+    else:
+        client = BigQueryJobClient(args.project, args.location)
+
+    started = time.monotonic()
+    results = run_extracts(specs, client, args.max_concurrent, args.poll_interval, args.retries)
+    for result in results:
+        print(json.dumps(result.as_dict()))
+    failed = [result for result in results if not result.ok]
+    print("{} extracts, {} failed, {:.1f}s".format(len(results), len(failed), time.monotonic() - started))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
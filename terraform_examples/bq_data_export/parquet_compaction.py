@@ -0,0 +1,417 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+#
+# Compaction and scanning of the daily Parquet exports written by export.sql.
+#
+# `EXPORT DATA` writes many small SNAPPY files into one directory per
+# backup_date (<root>/<YYYY-MM-DD>/*.parquet). `compact` rewrites each date
+# directory into a few large files with row groups of `row_group_rows` rows,
+# optionally sorted on a column so the row group min/max statistics are tight.
+# `scan` streams record batches across date directories, skips dates outside
+# the range by directory name, skips row groups whose min/max statistics rule
+# out the filters, and reads only the requested columns.
+#
+#   python parquet_compaction.py compact --root /data/exports --sort-by id
+#   python parquet_compaction.py scan --root /data/exports --start 2024-01-01 --end 2024-01-07 \
+#       --columns id,amount --filter "id >= 1000" --filter "id < 2000"
+#   python parquet_compaction.py benchmark --dates 7 --files-per-date 500
+#
+
+ROW_GROUP_ROWS = 1000000
+FILE_ROWS = 10000000
+COMPRESSION = "snappy"
+COMPACTED_PREFIX = "compacted-"
+# Lists the files a compaction retires and adds, kept until the retired files are deleted
+MANIFEST = "_compaction.json"
+# Seconds the retired files stay after a swap, for scans that listed them before it
+RETIRED_GRACE = 3600
+
+OPERATORS = {
+    "==": pc.equal, "!=": pc.not_equal, "<": pc.less, "<=": pc.less_equal,
+    ">": pc.greater, ">=": pc.greater_equal, "in": None,
+}
+
+
+def date_dirs(root, start=None, end=None):
+    """(date, path) of every YYYY-MM-DD directory under `root` within [start, end], sorted."""
+    found = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        try:
+            day = datetime.date.fromisoformat(name)
+        except ValueError:
+            continue
+        if os.path.isdir(path) and (start is None or day >= start) and (end is None or day <= end):
+            found.append((day, path))
+    return found
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as file_descriptor:
+            return json.load(file_descriptor)
+    except FileNotFoundError:
+        return None
+
+
+def parquet_files(directory):
+    """
+    The Parquet files of a directory. While a compaction swaps files, its
+    manifest decides: the retired files until every added one is in place,
+    the added ones from then on.
+    """
+    names = set(os.listdir(directory))
+    hidden = set()
+    manifest = _read_manifest(directory)
+    if manifest:
+        hidden = set(manifest["retired"] if names.issuperset(manifest["added"]) else manifest["added"])
+    return sorted(os.path.join(directory, name) for name in names if name.endswith(".parquet") and name not in hidden)
+
+
+def _staged(directory, name):
+    # Not a .parquet name, readers never pick it up
+    return os.path.join(directory, "." + name + ".tmp")
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as file_descriptor:
+        json.dump(manifest, file_descriptor)
+    os.replace(path + ".tmp", path)
+
+
+def _finish_swap(directory, manifest):
+    """Rename the added files in place and record when; the retired files stay, hidden by the manifest."""
+    for name in manifest["added"]:
+        if os.path.exists(_staged(directory, name)):
+            os.replace(_staged(directory, name), os.path.join(directory, name))
+    _write_manifest(directory, dict(manifest, swapped_at=time.time()))
+
+
+def recover_dir(directory, grace=RETIRED_GRACE):
+    """
+    Finish a compaction that stopped midway and delete the files the last one
+    retired once they are `grace` seconds old. Once a manifest is written every
+    added file exists, staged or renamed, so the swap is completed; staged files
+    without a manifest are from a run that stopped earlier. Returns False while
+    retired files are still within their grace period.
+    """
+    manifest = _read_manifest(directory)
+    if manifest and "swapped_at" not in manifest:
+        _finish_swap(directory, manifest)
+        manifest = _read_manifest(directory)
+    for name in os.listdir(directory):
+        if name.startswith("." + COMPACTED_PREFIX) and name.endswith(".tmp"):
+            os.remove(os.path.join(directory, name))
+    if not manifest:
+        return True
+    if time.time() - manifest["swapped_at"] < grace:
+        return False
+    for name in manifest["retired"]:
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+    os.remove(os.path.join(directory, MANIFEST))
+    return True
+
+
+def unified_schema(sources):
+    """
+    One schema for all `sources`: columns missing from some files are added,
+    types are promoted where Arrow can (int32 to int64, int to float).
+    ValueError when a column has incompatible types in different files.
+    """
+    try:
+        return pa.unify_schemas([pq.read_schema(source) for source in sources], promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as error:
+        raise ValueError("Can't compact {}, its files have incompatible schemas: {}".format(
+            os.path.dirname(sources[0]), error))
+
+
+def _conform(batch, schema):
+    # `batch` with the columns of `schema`, in its order and types, missing ones null
+    names = batch.schema.names
+    columns = [batch.column(names.index(field.name)).cast(field.type) if field.name in names
+               else pa.nulls(batch.num_rows, field.type) for field in schema]
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def compact_dir(directory, row_group_rows=ROW_GROUP_ROWS, file_rows=FILE_ROWS, sort_by=None,
+                compression=COMPRESSION, grace=RETIRED_GRACE):
+    """
+    Rewrite the Parquet files of one directory into files of up to `file_rows`
+    rows, under the union of their schemas. Without `sort_by` the files are
+    streamed batch by batch; with it one directory is read into memory to be
+    sorted.
+
+    The new files are staged under hidden names in the same directory. A
+    manifest of the retired and added files is then written atomically and the
+    staged files are renamed in place one by one. parquet_files follows the
+    manifest, so a scan lists either the old or the new files, and recover_dir
+    completes a swap that was interrupted. The retired files are only deleted
+    by a later compaction at least `grace` seconds after the swap, so a scan
+    that listed them before the swap can still read them; a directory whose
+    retired files are younger than that is left as it is. Only compacted
+    Parquet files are deleted, other files (_SUCCESS) stay.
+    Returns (files before, files after).
+    """
+    if not recover_dir(directory, grace):
+        files = len(parquet_files(directory))
+        return files, files
+    sources = parquet_files(directory)
+    if not sources:
+        return 0, 0
+    schema = unified_schema(sources)
+    taken = set(os.listdir(directory))
+    names = ("{}{:05d}.parquet".format(COMPACTED_PREFIX, index) for index in itertools.count())
+    names = (name for name in names if name not in taken)
+
+    if sort_by:
+        table = pa.Table.from_batches([_conform(batch, schema) for source in sources
+                                       for batch in pq.read_table(source).to_batches()], schema=schema)
+        batches = table.sort_by(sort_by).to_batches(max_chunksize=row_group_rows)
+    else:
+        batches = (_conform(batch, schema) for source in sources
+                   for batch in pq.ParquetFile(source).iter_batches(batch_size=row_group_rows))
+
+    written, writer, rows_in_file = [], None, 0
+    for row_group in _row_groups(batches, row_group_rows):
+        if writer is None or rows_in_file >= file_rows:
+            if writer is not None:
+                writer.close()
+            name = next(names)
+            writer = pq.ParquetWriter(_staged(directory, name), schema, compression=compression)
+            written.append(name)
+            rows_in_file = 0
+        writer.write_table(row_group, row_group_size=row_group_rows)
+        rows_in_file += row_group.num_rows
+    if writer is not None:
+        writer.close()
+
+    manifest = {"retired": [os.path.basename(source) for source in sources], "added": written}
+    _write_manifest(directory, manifest)
+    _finish_swap(directory, manifest)
+    return len(sources), len(written)
+
+
+def _row_groups(batches, rows):
+    # Every write is a row group of its own, so small batches are gathered first
+    pending, pending_rows = [], 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows >= rows:
+            yield pa.Table.from_batches(pending)
+            pending, pending_rows = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending)
+
+
+def compact(root, start=None, end=None, workers=None, **options):
+    """Compact every date directory in range, one directory per worker process."""
+    directories = [path for _, path in date_dirs(root, start, end)]
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {path: pool.submit(compact_dir, path, **options) for path in directories}
+        return {path: future.result() for path, future in futures.items()}
+
+
+def parse_filter(text):
+    """'column op value' -> (column, op, value), value parsed as a number or a comma separated list for `in`."""
+    column, op, value = text.split(None, 2)
+    if op not in OPERATORS:
+        raise ValueError("Unsupported operator {} in {!r}, use one of {}".format(op, text, " ".join(OPERATORS)))
+
+    def literal(item):
+        item = item.strip().strip("'\"")
+        for cast in (int, float):
+            try:
+                return cast(item)
+            except ValueError:
+                pass
+        return item
+
+    return column, op, [literal(item) for item in value.split(",")] if op == "in" else literal(value)
+
+
+def _may_match(statistics, op, value):
+    """False when the row group min/max prove no row can match."""
+    if statistics is None or not statistics.has_min_max:
+        return True
+    low, high = statistics.min, statistics.max
+    try:
+        if op == "==":
+            return low <= value <= high
+        if op == "in":
+            return any(low <= item <= high for item in value)
+        if op == "<":
+            return low < value
+        if op == "<=":
+            return low <= value
+        if op == ">":
+            return high > value
+        if op == ">=":
+            return high >= value
+    except TypeError:
+        # Statistics of a type the literal doesn't compare with, keep the row group
+        return True
+    return True
+
+
+def _mask(batch, filters):
+    mask = None
+    for column, op, value in filters:
+        values = batch.column(batch.schema.get_field_index(column))
+        if op == "in":
+            condition = pc.is_in(values, value_set=pa.array(value))
+        else:
+            condition = OPERATORS[op](values, value)
+        mask = condition if mask is None else pc.and_(mask, condition)
+    return mask
+
+
+class ScanStats(object):
+    def __init__(self):
+        self.dates = 0
+        self.files = 0
+        self.row_groups = 0
+        self.row_groups_read = 0
+        self.rows = 0
+
+    def __repr__(self):
+        return ("ScanStats(dates={}, files={}, row_groups={}, row_groups_read={}, rows={})".format(
+            self.dates, self.files, self.row_groups, self.row_groups_read, self.rows))
+
+
+def scan(root, columns=None, filters=(), start=None, end=None, batch_size=65536, stats=None):
+    """
+    Yield record batches with `columns` (all when None) of the rows matching
+    every (column, op, value) filter, across the date directories in range.
+    """
+    stats = stats if stats is not None else ScanStats()
+    filters = list(filters)
+    filter_columns = [column for column, _, _ in filters]
+    for _, directory in date_dirs(root, start, end):
+        stats.dates += 1
+        for path in parquet_files(directory):
+            parquet_file = pq.ParquetFile(path)
+            stats.files += 1
+            metadata = parquet_file.metadata
+            # Statistics are per leaf column, found by their dotted path
+            paths = [metadata.schema.column(index).path for index in range(metadata.num_columns)]
+            positions = {name: paths.index(name) for name in filter_columns}
+            wanted = []
+            for index in range(metadata.num_row_groups):
+                row_group = metadata.row_group(index)
+                stats.row_groups += 1
+                if all(_may_match(row_group.column(positions[column]).statistics, op, value)
+                       for column, op, value in filters):
+                    wanted.append(index)
+            if not wanted:
+                continue
+            stats.row_groups_read += len(wanted)
+            read_columns = None if columns is None else list(dict.fromkeys(list(columns) + filter_columns))
+            for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=wanted, columns=read_columns):
+                if filters:
+                    batch = batch.filter(_mask(batch, filters))
+                if columns is not None:
+                    batch = batch.select(columns)
+                if batch.num_rows:
+                    stats.rows += batch.num_rows
+                    yield batch
+
+
+def write_sample(root, dates, files_per_date, rows_per_file, first_date=datetime.date(2024, 1, 1)):
+    """Many small SNAPPY files per date, like EXPORT DATA writes them. Ids grow with time."""
+    next_id = 0
+    for day in range(dates):
+        date = first_date + datetime.timedelta(days=day)
+        directory = os.path.join(root, date.isoformat())
+        os.makedirs(directory, exist_ok=True)
+        for shard in range(files_per_date):
+            ids = pa.array(range(next_id, next_id + rows_per_file), type=pa.int64())
+            table = pa.table({"id": ids, "user": pc.cast(pc.bit_wise_and(ids, 1023), pa.int32()),
+                              "amount": pc.multiply(pc.cast(pc.bit_wise_and(ids, 4095), pa.float64()), 0.25),
+                              "note": pa.array(["row"] * rows_per_file)})
+            pq.write_table(table, os.path.join(directory, "{:012d}.parquet".format(shard)), compression="snappy")
+            next_id += rows_per_file
+    return next_id
+
+
+def benchmark(dates, files_per_date, rows_per_file, workers=None):
+    root = tempfile.mkdtemp()
+    total = write_sample(root, dates, files_per_date, rows_per_file)
+    # A narrow id range in the middle of the data and two columns
+    low = total // 2
+    filters = [("id", ">=", low), ("id", "<", low + rows_per_file * 10)]
+
+    def run(name):
+        stats = ScanStats()
+        started = time.perf_counter()
+        rows = sum(batch.num_rows for batch in scan(root, ["id", "amount"], filters, stats=stats))
+        print("{:<10} {:>8.3f}s {:>8} files opened {:>8} of {:>8} row groups read {:>10,} rows".format(
+            name, time.perf_counter() - started, stats.files, stats.row_groups_read, stats.row_groups, rows))
+
+    print("{} dates x {} files x {} rows".format(dates, files_per_date, rows_per_file))
+    run("before")
+    started = time.perf_counter()
+    compact(root, workers=workers, row_group_rows=min(ROW_GROUP_ROWS, rows_per_file * 10))
+    print("compacted in {:.2f}s".format(time.perf_counter() - started))
+    run("after")
+    shutil.rmtree(root)
+
+
+def _date(text):
+    return datetime.date.fromisoformat(text) if text else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact and scan daily Parquet exports.")
+    parser.add_argument("command", choices=["compact", "scan", "benchmark"])
+    parser.add_argument("--root", help="Directory holding one YYYY-MM-DD directory per backup_date.")
+    parser.add_argument("--start", type=_date)
+    parser.add_argument("--end", type=_date)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--row-group-rows", type=int, default=ROW_GROUP_ROWS)
+    parser.add_argument("--file-rows", type=int, default=FILE_ROWS)
+    parser.add_argument("--sort-by", help="Sort each date on this column while compacting.")
+    parser.add_argument("--compression", default=COMPRESSION)
+    parser.add_argument("--grace", type=float, default=RETIRED_GRACE,
+                        help="Seconds the files retired by a compaction are kept for running scans.")
+    parser.add_argument("--columns", help="Comma separated columns to read, all by default.")
+    parser.add_argument("--filter", action="append", default=[], help="'column op value', repeatable.")
+    parser.add_argument("--dates", type=int, default=7)
+    parser.add_argument("--files-per-date", type=int, default=500)
+    parser.add_argument("--rows-per-file", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        results = compact(args.root, args.start, args.end, args.workers, row_group_rows=args.row_group_rows,
+                          file_rows=args.file_rows, sort_by=args.sort_by, compression=args.compression,
+                          grace=args.grace)
+        for path, (before, after) in results.items():
+            print("{}: {} files -> {}".format(path, before, after))
+    elif args.command == "scan":
+        stats = ScanStats()
+        columns = args.columns.split(",") if args.columns else None
+        for batch in scan(args.root, columns, [parse_filter(text) for text in args.filter], args.start, args.end,
+                          stats=stats):
+            for row in batch.to_pylist():
+                print(json.dumps(row, default=str))
+        print(stats)
+    else:
+        benchmark(args.dates, args.files_per_date, args.rows_per_file, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import glob
+import json
+import os
+from unittest.mock import Mock
+
+import pytest
+
+import extract_orchestrator
+from extract_orchestrator import (DONE, ExtractSpec, FakeJobClient, BigQueryJobClient, plan_extracts,
+                                  run_extracts)
+
+
+class FakeClock(object):
+    """Time that only moves when the orchestrator sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_plan_extracts_uses_partitions_and_wildcard_uris():
+    specs = plan_extracts(["p.d.events"], "gs://bucket/extract/", "2024-02-28", "2024-03-01")
+
+    assert [spec.source for spec in specs] == ["p.d.events$20240228", "p.d.events$20240229", "p.d.events$20240301"]
+    assert specs[0].destination_uri == "gs://bucket/extract/p.d.events/20240228/part-*.snappy.parquet"
+    assert specs[0].compression == "SNAPPY"
+
+
+def test_extract_spec_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        ExtractSpec("p.d.t", "gs://bucket", destination_format="XML")
+
+
+def test_run_extracts_caps_concurrency_and_writes_shards(tmp_path):
+    clock = FakeClock()
+    rows = {"p.d.t": [{"id": i} for i in range(2500)]}
+    client = FakeJobClient(str(tmp_path), rows=rows, duration=3, clock=clock)
+    specs = plan_extracts(["p.d.t"], "gs://bucket/extract", "2024-01-01", "2024-01-10")
+
+    results = run_extracts(specs, client, max_concurrent=4, poll_interval=1, sleep=clock.sleep)
+
+    assert all(result.ok for result in results)
+    assert [result.spec for result in results] == specs
+    assert client.max_running == 4
+    # One poll per round for all running jobs, not one call per job
+    assert client.polls == clock.now
+    shards = sorted(glob.glob(os.path.join(str(tmp_path), "bucket/extract/p.d.t/20240101/part-*.snappy.parquet")))
+    assert [os.path.basename(shard) for shard in shards] == [
+        "part-000000000000.snappy.parquet", "part-000000000001.snappy.parquet", "part-000000000002.snappy.parquet"]
+    with open(shards[-1]) as file_descriptor:
+        assert [json.loads(line)["id"] for line in file_descriptor] == list(range(2000, 2500))
+
+
+def test_run_extracts_retries_then_reports_failures(tmp_path):
+    clock = FakeClock()
+    client = FakeJobClient(str(tmp_path), duration=1, fail={"p.d.broken"}, clock=clock)
+    specs = plan_extracts(["p.d.ok", "p.d.broken"], "gs://bucket/extract")
+
+    results = run_extracts(specs, client, max_concurrent=2, poll_interval=1, retries=2, sleep=clock.sleep)
+
+    ok, broken = results
+    assert ok.ok and ok.attempts == 1
+    assert not broken.ok
+    assert broken.state == DONE
+    assert broken.attempts == 3
+    assert "p.d.broken" in broken.error
+
+
+def test_jobs_that_cannot_start_are_retried_then_reported(tmp_path):
+    clock = FakeClock()
+    client = FakeJobClient(str(tmp_path), duration=1, clock=clock)
+    start = client.start
+    refused = []
+
+    def flaky_start(spec, job_id):
+        # p.d.flaky is refused once, p.d.refused every time
+        if spec.table == "p.d.refused" or (spec.table == "p.d.flaky" and spec.table not in refused):
+            refused.append(spec.table)
+            raise RuntimeError("jobs.insert failed for {}".format(spec.table))
+        return start(spec, job_id)
+
+    client.start = flaky_start
+    specs = plan_extracts(["p.d.refused", "p.d.flaky", "p.d.ok"], "gs://bucket/extract")
+
+    results = run_extracts(specs, client, max_concurrent=2, poll_interval=1, retries=1, sleep=clock.sleep)
+
+    refused_result, flaky, ok = results
+    assert not refused_result.ok and refused_result.state == DONE and refused_result.attempts == 2
+    assert "jobs.insert failed for p.d.refused" in refused_result.error
+    assert flaky.ok and flaky.attempts == 2
+    assert ok.ok and ok.attempts == 1
+
+
+def test_bigquery_client_polls_with_one_listing():
+    job = Mock(job_id="a", state="DONE", error_result={"message": "boom"})
+    other = Mock(job_id="someone-else", state="RUNNING", error_result=None)
+    bigquery = Mock()
+    bigquery.list_jobs.return_value = [job, other]
+    client = BigQueryJobClient(client=bigquery)
+
+    states = client.poll(["a", "b"])
+
+    assert states == {"a": ("DONE", "boom"), "b": (extract_orchestrator.PENDING, None)}
+    assert bigquery.list_jobs.call_count == 1
@@ -0,0 +1,166 @@
+import datetime
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import parquet_compaction
+from parquet_compaction import (MANIFEST, ScanStats, compact, compact_dir, parquet_files, parse_filter, recover_dir,
+                                scan, write_sample)
+
+
+@pytest.fixture
+def exports(tmp_path):
+    # 3 days x 4 files x 50 rows, ids 0..599 in date order
+    write_sample(str(tmp_path), 3, 4, 50)
+    return str(tmp_path)
+
+
+def all_ids(root, **kwargs):
+    return sorted(value for batch in scan(root, ["id"], **kwargs) for value in batch.column(0).to_pylist())
+
+
+def listed(directory):
+    return [os.path.basename(path) for path in parquet_files(directory)]
+
+
+def test_compact_merges_files_and_keeps_rows(exports):
+    before = all_ids(exports)
+
+    results = compact(exports, workers=1, row_group_rows=100)
+
+    assert sorted(results.values()) == [(4, 1)] * 3
+    assert all_ids(exports) == before
+    directory = os.path.join(exports, "2024-01-02")
+    assert listed(directory) == ["compacted-00000.parquet"]
+    metadata = pq.ParquetFile(os.path.join(directory, "compacted-00000.parquet")).metadata
+    assert [metadata.row_group(index).num_rows for index in range(metadata.num_row_groups)] == [100, 100]
+
+
+def test_compact_splits_large_directories(exports):
+    compact(exports, workers=1, row_group_rows=50, file_rows=100, sort_by="id")
+
+    assert listed(os.path.join(exports, "2024-01-01")) == ["compacted-00000.parquet", "compacted-00001.parquet"]
+
+
+def test_compact_keeps_other_files_and_can_run_again(exports):
+    directory = os.path.join(exports, "2024-01-01")
+    open(os.path.join(directory, "_SUCCESS"), "w").close()
+    before = all_ids(exports)
+
+    compact_dir(directory, row_group_rows=50, file_rows=100, grace=0)
+    # The second run deletes the 4 original files and retires compacted-00000/00001,
+    # its files must not overwrite them
+    assert compact_dir(directory, row_group_rows=200, grace=0) == (2, 1)
+
+    assert sorted(os.listdir(directory)) == [
+        "_SUCCESS", MANIFEST, "compacted-00000.parquet", "compacted-00001.parquet", "compacted-00002.parquet"]
+    assert listed(directory) == ["compacted-00002.parquet"]
+    assert all_ids(exports) == before
+
+
+def test_retired_files_outlive_the_swap_for_running_scans(exports):
+    directory = os.path.join(exports, "2024-01-01")
+    old = parquet_files(directory)
+
+    compact_dir(directory, row_group_rows=200)
+
+    # A scan that listed the old files before the swap can still read them
+    assert sum(pq.read_table(path).num_rows for path in old) == 200
+    assert listed(directory) == ["compacted-00000.parquet"]
+    # Within the grace period the directory is left as it is
+    assert compact_dir(directory, row_group_rows=200) == (1, 1)
+    assert all(os.path.exists(path) for path in old)
+
+    assert recover_dir(directory, grace=0)
+    assert sorted(os.listdir(directory)) == ["compacted-00000.parquet"]
+
+
+def test_files_with_different_schemas_are_compacted_under_their_union(tmp_path):
+    directory = str(tmp_path / "2024-01-01")
+    os.makedirs(directory)
+    pq.write_table(pa.table({"id": pa.array([1, 2], pa.int32())}), os.path.join(directory, "a.parquet"))
+    pq.write_table(pa.table({"id": pa.array([3], pa.int64()), "note": ["new column"]}),
+                   os.path.join(directory, "b.parquet"))
+
+    for sort_by in (None, "id"):
+        compact_dir(directory, sort_by=sort_by, grace=0)
+
+        table = pq.read_table(os.path.join(directory, listed(directory)[0]))
+        assert table.schema.field("id").type == pa.int64()
+        assert sorted(table.to_pylist(), key=lambda row: row["id"]) == [
+            {"id": 1, "note": None}, {"id": 2, "note": None}, {"id": 3, "note": "new column"}]
+
+
+def test_files_with_incompatible_schemas_are_rejected(tmp_path):
+    directory = str(tmp_path / "2024-01-01")
+    os.makedirs(directory)
+    pq.write_table(pa.table({"id": [1]}), os.path.join(directory, "a.parquet"))
+    pq.write_table(pa.table({"id": ["one"]}), os.path.join(directory, "b.parquet"))
+
+    with pytest.raises(ValueError, match="incompatible schemas"):
+        compact_dir(directory)
+    assert listed(directory) == ["a.parquet", "b.parquet"]
+
+
+def test_an_interrupted_swap_shows_the_old_files_until_recovered(exports, monkeypatch):
+    directory = os.path.join(exports, "2024-01-01")
+    before = all_ids(exports)
+    finish_swap = parquet_compaction._finish_swap
+
+    def crash_after_one_rename(directory, manifest):
+        staged = parquet_compaction._staged(directory, manifest["added"][0])
+        os.replace(staged, os.path.join(directory, manifest["added"][0]))
+        raise OSError("crashed mid swap")
+
+    monkeypatch.setattr(parquet_compaction, "_finish_swap", crash_after_one_rename)
+    with pytest.raises(OSError):
+        compact_dir(directory, row_group_rows=50, file_rows=100)
+
+    # One new file is in place next to the four old ones, the manifest hides it
+    assert len([name for name in os.listdir(directory) if name.endswith(".parquet")]) == 5
+    assert all_ids(exports) == before
+
+    monkeypatch.setattr(parquet_compaction, "_finish_swap", finish_swap)
+    recover_dir(directory)
+
+    assert listed(directory) == ["compacted-00000.parquet", "compacted-00001.parquet"]
+    assert all_ids(exports) == before
+
+
+def test_scan_projects_filters_and_prunes_row_groups(exports):
+    compact(exports, workers=1, row_group_rows=50)
+    stats = ScanStats()
+
+    batches = list(scan(exports, ["amount"], [("id", ">=", 260), ("id", "<", 270)], stats=stats))
+
+    assert [batch.schema.names for batch in batches] == [["amount"]]
+    assert sum(batch.num_rows for batch in batches) == 10
+    assert stats.files == 3
+    assert stats.row_groups == 12
+    assert stats.row_groups_read == 1
+
+
+def test_scan_skips_dates_out_of_range(exports):
+    stats = ScanStats()
+
+    ids = all_ids(exports, start=datetime.date(2024, 1, 2), end=datetime.date(2024, 1, 2), stats=stats)
+
+    assert ids == list(range(200, 400))
+    assert stats.dates == 1
+    assert stats.files == 4
+
+
+def test_scan_in_filter(exports):
+    ids = all_ids(exports, filters=[parse_filter("id in 3, 250,599")])
+
+    assert ids == [3, 250, 599]
+
+
+def test_parse_filter():
+    assert parse_filter("id >= 10") == ("id", ">=", 10)
+    assert parse_filter("amount < 2.5") == ("amount", "<", 2.5)
+    assert parse_filter("note == 'row'") == ("note", "==", "row")
+    with pytest.raises(ValueError):
+        parse_filter("id ~ 3")